@@ -1,18 +1,129 @@
 import os
 import json
+import gzip
+import base64
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
-import boto3
-from boto3.dynamodb.conditions import Key
+import botocore.session
+from botocore.config import Config
+
+from history import HISTORY_RANGES, LakeReader, TooManyFiles, parse_history_range
+from metrics import Metrics, sampled
+from minute_blocks import BLOCK_CHUNK_SECONDS, block_key, chunk_start, unpack_block
+
+try:
+    import numpy as np
+except ImportError:  # not in the base Lambda runtime; provided by a layer
+    np = None
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
 
 
 EASTERN_TZ = ZoneInfo("America/New_York")
 
 DDB_INTRADAY_TABLE = os.environ["DDB_INTRADAY_TABLE"]
-
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(DDB_INTRADAY_TABLE)
+# Rollup series the worker maintains under partition key "<symbol>#<seconds>"
+DDB_ROLLUP_SECONDS = [
+    int(s) for s in os.environ.get("DDB_ROLLUP_SECONDS", "1800,3600").split(",") if s.strip()
+]
+
+# Read the minute series from packed hourly blocks (see minute_blocks.py);
+# anything older than the first block is still read from per-minute items
+DDB_MINUTE_BLOCKS = os.environ.get("DDB_MINUTE_BLOCKS", "0") == "1"
+# Upper bound on items held by the warm-container cache (LRU across series)
+READ_CACHE_MAX_ITEMS = int(os.environ.get("READ_CACHE_MAX_ITEMS", "100000"))
+# symbols=A,B,C requests: max symbols per call and parallel queries
+READ_MAX_SYMBOLS = int(os.environ.get("READ_MAX_SYMBOLS", "25"))
+READ_QUERY_CONCURRENCY = int(os.environ.get("READ_QUERY_CONCURRENCY", "8"))
+# Long ranges can be split into adjacent ts segments queried concurrently:
+# one per READ_SEGMENT_ITEMS items the range can hold at one item per series
+# step (market hours fill about a fifth of that), at most READ_SEGMENT_MAX.
+# Off by default (1 segment): bench_segmented_query shows no gain once the
+# ts/price projection is on, routed 1W/1M ranges read rollups, and segments
+# would compete with the QUERY_POOL fan-out for connections
+READ_SEGMENT_ITEMS = int(os.environ.get("READ_SEGMENT_ITEMS", "2000"))
+READ_SEGMENT_MAX = int(os.environ.get("READ_SEGMENT_MAX", "1"))
+
+# Responses smaller than this are sent uncompressed
+READ_COMPRESS_MIN_BYTES = int(os.environ.get("READ_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+RESPONSE_FORMATS = ("points", "columns", "compact")
+
+# Parquet lake for ranges past the DynamoDB TTL (see history.py), e.g.
+# "s3://<bucket>"; history ranges are rejected when unset
+LAKE_URI = os.environ.get("LAKE_URI", "")
+LAKE_READ_CONCURRENCY = int(os.environ.get("LAKE_READ_CONCURRENCY", "16"))
+# Most files one history request may open; a range with more (days not yet
+# compacted) gets a 400 instead of running into the Lambda timeout
+LAKE_MAX_FILES = int(os.environ.get("LAKE_MAX_FILES", "2000"))
+
+
+# Stage timings and counters, one CloudWatch EMF line per invocation (see
+# metrics.py). Debug lines are logged for a LOG_SAMPLE_RATE share of requests.
+METRICS = Metrics("read_prices")
+_log_detail = True
+
+
+QUERY_POOL = ThreadPoolExecutor(max_workers=READ_QUERY_CONCURRENCY, thread_name_prefix="query")
+# Segments get their own pool: query_dynamodb() runs on QUERY_POOL threads
+# for symbols=... requests, and waiting there on its own pool can deadlock
+SEGMENT_POOL = ThreadPoolExecutor(max_workers=READ_SEGMENT_MAX, thread_name_prefix="segment")
+
+# Attributes read when a request doesn't ask for candles
+PRICE_ATTRIBUTES = ("ts", "price")
+
+# Low-level botocore client, created on first use: no boto3 / s3transfer
+# import and no resource model at init, and items are decoded by
+# from_attribute() instead of TypeDeserializer. Clients are thread-safe, so
+# the query pool shares it.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = botocore.session.get_session().create_client(
+                    "dynamodb",
+                    config=Config(max_pool_connections=max(10, READ_QUERY_CONCURRENCY + READ_SEGMENT_MAX)),
+                )
+    return _client
+
+
+def from_attribute(value: dict):
+    """
+    Plain Python value for a DynamoDB AttributeValue: numbers as int or
+    float (callers convert with int()/float() anyway), binary as bytes.
+    """
+    kind, v = next(iter(value.items()))
+    if kind == "N":
+        return int(v) if v.lstrip("-").isdigit() else float(v)
+    if kind in ("S", "B", "BOOL"):
+        return v
+    if kind == "NULL":
+        return None
+    if kind == "M":
+        return {k: from_attribute(x) for k, x in v.items()}
+    if kind == "L":
+        return [from_attribute(x) for x in v]
+    if kind in ("SS", "BS"):
+        return set(v)
+    if kind == "NS":
+        return {from_attribute({"N": x}) for x in v}
+    raise ValueError(f"unsupported attribute type {kind}")
 
 
 def log(msg: str) -> None:
@@ -20,10 +131,42 @@ def log(msg: str) -> None:
     print(f"[{now}] {msg}", flush=True)
 
 
+def debug(msg: str) -> None:
+    # Per-request detail, only for sampled requests
+    if _log_detail:
+        log(msg)
+
+
+_lake = None
+
+
+def get_lake() -> LakeReader:
+    # Built on first use so DynamoDB-only containers never import pyarrow
+    global _lake
+    if _lake is None:
+        _lake = LakeReader(LAKE_URI, max_workers=LAKE_READ_CONCURRENCY, log=debug, max_files=LAKE_MAX_FILES)
+    return _lake
+
+
+def series_key(symbol: str, bucket_seconds: int) -> str:
+    return f"{symbol}#{bucket_seconds}"
+
+
+def pick_series(bucket_seconds: int) -> int:
+    """
+    Coarsest stored series (60 = raw minutes) whose buckets divide evenly
+    into bucket_seconds.
+    """
+    candidates = [60] + [s for s in DDB_ROLLUP_SECONDS if bucket_seconds % s == 0]
+    return max(candidates)
+
+
 def parse_range(range_str: str):
     """
-    Map range string to (start_dt, end_dt, bucket_seconds) in Eastern time.
-    bucket_seconds controls how we aggregate points for 1W / 1M.
+    Map range string to (start_dt, end_dt, bucket_seconds, series_seconds)
+    in Eastern time.
+    bucket_seconds controls how we aggregate points for 1W / 1M;
+    series_seconds is the stored series to read them from.
     """
     now = datetime.now(EASTERN_TZ)
 
@@ -39,124 +182,795 @@ def parse_range(range_str: str):
     else:
         raise ValueError("Unsupported range")
 
-    log(f"parse_range: range={range_str}, start={start}, end={now}, bucket_seconds={bucket_seconds}")
-    return start, now, bucket_seconds
+    series_seconds = pick_series(bucket_seconds)
+
+    debug(f"parse_range: range={range_str}, start={start}, end={now}, "
+          f"bucket_seconds={bucket_seconds}, series_seconds={series_seconds}")
+    return start, now, bucket_seconds, series_seconds
+
+
+def query_series(
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    series_seconds: int,
+    attributes: tuple[str, ...] | None = None,
+):
+    """
+    Query the stored series closest to the requested granularity.
+    Rollups only exist from the time the worker started writing them, so any
+    part of the range before the first rollup bucket is filled from the
+    minute series.
+    """
+    if series_seconds == 60:
+        return query_minutes(symbol, start_dt, end_dt, attributes)
+
+    # Include the bucket that start_dt falls into
+    start_ts = int(start_dt.timestamp())
+    rollup_start = start_ts - start_ts % series_seconds
+    items = query_dynamodb(
+        series_key(symbol, series_seconds),
+        datetime.fromtimestamp(rollup_start, EASTERN_TZ),
+        end_dt,
+        series_seconds,
+        attributes,
+    )
+
+    first_ts = int(items[0]["ts"]) if items else int(end_dt.timestamp()) + 1
+    if first_ts > rollup_start:
+        older = query_minutes(symbol, start_dt, datetime.fromtimestamp(first_ts - 1, EASTERN_TZ), attributes)
+        items = older + items
+
+    return items
 
 
-def query_dynamodb(symbol: str, start_dt: datetime, end_dt: datetime):
+def query_blocks(symbol: str, start_dt: datetime, end_dt: datetime):
     """
-    Query DynamoDB for all minute points for (symbol, ts between start/end).
+    Read the packed block chunks covering start/end and decode them into
+    minute items (ts, price and OHLCV fields) within the range.
     """
     start_ts = int(start_dt.timestamp())
     end_ts = int(end_dt.timestamp())
+    first_chunk = datetime.fromtimestamp(chunk_start(start_ts), EASTERN_TZ)
 
-    log(f"query_dynamodb: symbol={symbol}, start_ts={start_ts}, end_ts={end_ts}")
+    items = []
+    for block in query_dynamodb(block_key(symbol), first_chunk, end_dt, BLOCK_CHUNK_SECONDS):
+        for bar in unpack_block(int(block["ts"]), block["blk"]):
+            if start_ts <= bar["ts"] <= end_ts:
+                bar["price"] = bar["close"]
+                items.append(bar)
+    return items
+
+
+def query_minutes(
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    attributes: tuple[str, ...] | None = None,
+):
+    """
+    Minute items for symbol between start/end, from block chunks when
+    DDB_MINUTE_BLOCKS is on, else from per-minute items. During migration
+    the part of the range before the first block minute comes from items.
+    Blocks are always read whole, so `attributes` only applies to items.
+    """
+    if not DDB_MINUTE_BLOCKS:
+        return query_dynamodb(symbol, start_dt, end_dt, 60, attributes)
+
+    items = query_blocks(symbol, start_dt, end_dt)
+
+    first_ts = items[0]["ts"] if items else int(end_dt.timestamp()) + 1
+    if first_ts > int(start_dt.timestamp()):
+        older = query_dynamodb(
+            symbol, start_dt, datetime.fromtimestamp(first_ts - 1, EASTERN_TZ), 60, attributes
+        )
+        items = older + items
+
+    return items
+
+
+def segment_bounds(start_ts: int, end_ts: int, step_seconds: int) -> list[tuple[int, int]]:
+    """
+    Split [start_ts, end_ts] into adjacent inclusive ts ranges, one per
+    READ_SEGMENT_ITEMS items the range can hold at one item per
+    step_seconds, at most READ_SEGMENT_MAX.
+    """
+    span = end_ts - start_ts + 1
+    if span <= 1:
+        return [(start_ts, end_ts)]
+    k = -(-span // (step_seconds * READ_SEGMENT_ITEMS))
+    k = max(1, min(k, READ_SEGMENT_MAX, span))
+    edges = [start_ts + span * i // k for i in range(k + 1)]
+    return [(edges[i], edges[i + 1] - 1) for i in range(k)]
+
+
+def query_segment(params: dict, start_ts: int, end_ts: int) -> list[dict]:
+    """
+    All items of one ts segment, following LastEvaluatedKey page by page.
+    """
+    params = {
+        **params,
+        "ExpressionAttributeValues": {
+            **params["ExpressionAttributeValues"],
+            ":start": {"N": str(start_ts)},
+            ":end": {"N": str(end_ts)},
+        },
+    }
 
     items = []
     exclusive_start_key = None
 
     while True:
+        start = time.perf_counter()
         if exclusive_start_key:
-            resp = table.query(
-                KeyConditionExpression=Key("symbol").eq(symbol) & Key("ts").between(start_ts, end_ts),
-                ExclusiveStartKey=exclusive_start_key,
-                ScanIndexForward=True,
-            )
+            resp = get_client().query(**params, ExclusiveStartKey=exclusive_start_key)
         else:
-            resp = table.query(
-                KeyConditionExpression=Key("symbol").eq(symbol) & Key("ts").between(start_ts, end_ts),
-                ScanIndexForward=True,
-            )
+            resp = get_client().query(**params)
 
         batch = resp.get("Items", [])
-        items.extend(batch)
+        items.extend({k: from_attribute(v) for k, v in item.items()} for item in batch)
+        METRICS.observe("ddb_query_page_ms", (time.perf_counter() - start) * 1000)
+        METRICS.incr("ddb_query_pages")
+        METRICS.incr("ddb_items_read", len(batch))
 
         exclusive_start_key = resp.get("LastEvaluatedKey")
         if not exclusive_start_key:
             break
 
-    log(f"query_dynamodb: got {len(items)} items for symbol={symbol}")
     return items
 
 
-def build_points(items, bucket_seconds: int):
+def query_dynamodb(
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    step_seconds: int = 60,
+    attributes: tuple[str, ...] | None = None,
+):
+    """
+    Query DynamoDB for all points for (symbol, ts between start/end).
+    `symbol` is the partition key: a plain symbol for minute items or
+    "<symbol>#<seconds>" for a rollup series, with `step_seconds` the
+    spacing of its items.
+    Pages follow each other, so a long range is split into segments
+    (segment_bounds()) that page concurrently and are joined in ts order.
+    `attributes` limits the attributes read (ProjectionExpression); None
+    reads whole items.
+    """
+    start_ts = int(start_dt.timestamp())
+    end_ts = int(end_dt.timestamp())
+    segments = segment_bounds(start_ts, end_ts, step_seconds)
+
+    debug(f"query_dynamodb: symbol={symbol}, start_ts={start_ts}, end_ts={end_ts}, "
+          f"segments={len(segments)}")
+
+    params = {
+        "TableName": DDB_INTRADAY_TABLE,
+        "KeyConditionExpression": "#symbol = :symbol AND #ts BETWEEN :start AND :end",
+        "ExpressionAttributeNames": {"#symbol": "symbol", "#ts": "ts"},
+        "ExpressionAttributeValues": {":symbol": {"S": symbol}},
+        "ScanIndexForward": True,
+    }
+    if attributes:
+        params["ExpressionAttributeNames"].update({f"#{a}": a for a in attributes})
+        params["ProjectionExpression"] = ", ".join(f"#{a}" for a in attributes)
+
+    METRICS.incr("ddb_query_segments", len(segments))
+    if len(segments) == 1:
+        items = query_segment(params, *segments[0])
+    else:
+        parts = SEGMENT_POOL.map(lambda bounds: query_segment(params, *bounds), segments)
+        items = [item for part in parts for item in part]
+
+    debug(f"query_dynamodb: got {len(items)} items for symbol={symbol}")
+    return items
+
+
+############################
+# Warm-container series cache
+############################
+
+@dataclass
+class CachedSeries:
+    start_ts: int  # items cover [start_ts, last item ts]
+    items: list
+
+
+# (symbol, series_seconds, candles) -> CachedSeries, least recently used
+# first; without candles the items only hold PRICE_ATTRIBUTES
+SERIES_CACHE: "OrderedDict[tuple[str, int, bool], CachedSeries]" = OrderedDict()
+CACHE_LOCK = threading.Lock()
+
+
+def cache_size() -> int:
+    return sum(len(entry.items) for entry in SERIES_CACHE.values())
+
+
+def cache_put(key: tuple[str, int, bool], entry: CachedSeries) -> None:
+    with CACHE_LOCK:
+        SERIES_CACHE[key] = entry
+        SERIES_CACHE.move_to_end(key)
+        while len(SERIES_CACHE) > 1 and cache_size() > READ_CACHE_MAX_ITEMS:
+            evicted, _ = SERIES_CACHE.popitem(last=False)
+            debug(f"cache: evicted {evicted}")
+
+
+def cached_query_series(
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    series_seconds: int,
+    candles: bool = False,
+):
+    """
+    query_series() with a per-container cache. Without candles only
+    PRICE_ATTRIBUTES are read.
+    On a hit, only items at or after the cached tail are queried: the tail
+    item itself is re-read because the open rollup bucket is rewritten every
+    minute. Items that fell off the front of the window are trimmed.
+    Returns (items, hit, items_read).
+    """
+    start_ts = int(start_dt.timestamp())
+    if series_seconds != 60:
+        # query_series() includes the bucket that start_dt falls into
+        start_ts -= start_ts % series_seconds
+
+    attributes = None if candles else PRICE_ATTRIBUTES
+    key = (symbol, series_seconds, candles)
+    with CACHE_LOCK:
+        entry = SERIES_CACHE.get(key)
+
+    if entry is None or not entry.items or start_ts < entry.start_ts:
+        items = query_series(symbol, start_dt, end_dt, series_seconds, attributes)
+        cache_put(key, CachedSeries(start_ts=start_ts, items=items))
+        return items, False, len(items)
+
+    tail_dt = datetime.fromtimestamp(int(entry.items[-1]["ts"]), EASTERN_TZ)
+    if series_seconds == 60:
+        fresh = query_minutes(symbol, tail_dt, end_dt, attributes)
+    else:
+        fresh = query_dynamodb(
+            series_key(symbol, series_seconds), tail_dt, end_dt, series_seconds, attributes
+        )
+
+    items = entry.items[:-1] + fresh if fresh else entry.items
+    first = 0
+    while first < len(items) and int(items[first]["ts"]) < start_ts:
+        first += 1
+    items = items[first:]
+
+    cache_put(key, CachedSeries(start_ts=start_ts, items=items))
+    return items, True, len(fresh)
+
+
+def utc_offset_seconds(ts: int) -> int:
+    return int(datetime.fromtimestamp(ts, EASTERN_TZ).utcoffset().total_seconds())
+
+
+def format_offset(offset: int) -> str:
+    sign = "-" if offset < 0 else "+"
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+def utc_offsets(ts):
+    """
+    Eastern UTC offset of each epoch second in a sorted int64 array, looked
+    up once per day; only a day with a DST switch is converted point by
+    point.
+    """
+    offsets = np.empty(len(ts), dtype=np.int64)
+
+    days, starts = np.unique(ts // 86400, return_index=True)
+    ends = np.append(starts[1:], len(ts))
+    for day, lo, hi in zip(days.tolist(), starts.tolist(), ends.tolist()):
+        first = utc_offset_seconds(day * 86400)
+        if first == utc_offset_seconds(day * 86400 + 86399):
+            offsets[lo:hi] = first
+        else:
+            offsets[lo:hi] = [utc_offset_seconds(t) for t in ts[lo:hi].tolist()]
+    return offsets
+
+
+def bucket_start(ts: int, bucket_seconds: int) -> int:
+    """
+    Start of the bucket epoch second `ts` falls into. Daily buckets start
+    at Eastern midnight, not UTC midnight, so a point carries its own
+    trading date; shorter buckets divide an hour and stay aligned under
+    the whole-hour UTC offset.
+    """
+    if bucket_seconds < 86400:
+        return ts - ts % bucket_seconds
+    offset = utc_offset_seconds(ts)
+    local = ts + offset
+    start = local - local % bucket_seconds
+    # The offset at midnight differs from the one at ts on a DST switch day
+    return start - utc_offset_seconds(start - offset)
+
+
+def bucket_starts(ts, bucket_seconds: int):
+    """
+    bucket_start() over a sorted int64 array.
+    """
+    if bucket_seconds < 86400:
+        return ts - ts % bucket_seconds
+    offsets = utc_offsets(ts)
+    local = ts + offsets
+    start = local - local % bucket_seconds
+    return start - utc_offsets(start - offsets)
+
+
+def format_times(bucket_ts) -> list[str]:
+    """
+    Eastern ISO-8601 strings (same as datetime.isoformat()) for a sorted
+    int64 array of epoch seconds, without a datetime per point.
+    """
+    offsets = utc_offsets(bucket_ts)
+    local = (bucket_ts + offsets).astype("datetime64[s]")
+    unique_offsets, inverse = np.unique(offsets, return_inverse=True)
+    suffixes = np.array([format_offset(o) for o in unique_offsets.tolist()])[inverse]
+    return np.char.add(np.datetime_as_string(local, unit="s"), suffixes).tolist()
+
+
+def item_price(item) -> float:
+    return float(item.get("price") or item.get("close"))
+
+
+def item_ohlcv(item) -> tuple[float, float, float, float, int]:
+    """
+    (open, high, low, close, volume) of an item; items written before the
+    worker stored bars only have a price.
+    """
+    price = item_price(item)
+    return (
+        float(item.get("open") or price),
+        float(item.get("high") or price),
+        float(item.get("low") or price),
+        price,
+        int(item.get("volume") or 0),
+    )
+
+
+CANDLE_COLUMNS = ("open", "high", "low", "volume")
+
+
+def bucket_columns_numpy(items, bucket_seconds: int, candles: bool = False) -> dict:
+    """
+    Vectorized bucketing: bucket floor and per-bucket reductions over whole
+    arrays. Returns the NumPy arrays build_columns() returns as lists.
+    """
+    n = len(items)
+    ts = np.fromiter((int(item["ts"]) for item in items), dtype=np.int64, count=n)
+    if candles:
+        bars = np.array([item_ohlcv(item) for item in items], dtype=np.float64).reshape(n, 5)
+    else:
+        bars = np.fromiter((item_price(item) for item in items), dtype=np.float64, count=n)
+
+    # DynamoDB returns items in ts order; only sort if they aren't
+    if n > 1 and not np.all(ts[1:] >= ts[:-1]):
+        order = np.argsort(ts, kind="stable")
+        ts, bars = ts[order], bars[order]
+
+    bucket_ts = bucket_starts(ts, bucket_seconds)
+    # First / last item of each run of equal buckets
+    first = np.append(0, np.flatnonzero(bucket_ts[1:] != bucket_ts[:-1]) + 1)
+    last = np.append(first[1:] - 1, n - 1)
+
+    if not candles:
+        return {"t": bucket_ts[last], "price": bars[last]}
+
+    return {
+        "t": bucket_ts[last],
+        "price": bars[last, 3],
+        "open": bars[first, 0],
+        "high": np.maximum.reduceat(bars[:, 1], first),
+        "low": np.minimum.reduceat(bars[:, 2], first),
+        "volume": np.add.reduceat(bars[:, 4], first).astype(np.int64),
+    }
+
+
+def bucket_columns_python(items, bucket_seconds: int, candles: bool = False) -> dict:
+    # Sort by ts ascending, unless DynamoDB already returned them in order
+    if any(items[i]["ts"] > items[i + 1]["ts"] for i in range(len(items) - 1)):
+        items = sorted(items, key=lambda x: x["ts"])
+
+    buckets = {}
+
+    for item in items:
+        ts = int(item["ts"])
+
+        # Align timestamp to bucket boundary (e.g. minute, 30-min, hour, day)
+        bucket_start_ts = bucket_start(ts, bucket_seconds)
+
+        if not candles:
+            # Since items are sorted ascending, later writes overwrite earlier => last price wins
+            buckets[bucket_start_ts] = item_price(item)
+            continue
+
+        o, h, lo, c, v = item_ohlcv(item)
+        bar = buckets.get(bucket_start_ts)
+        if bar is None:
+            buckets[bucket_start_ts] = [o, h, lo, c, v]
+        else:
+            bar[1] = max(bar[1], h)
+            bar[2] = min(bar[2], lo)
+            bar[3] = c
+            bar[4] += v
+
+    if not candles:
+        return {"t": list(buckets), "price": list(buckets.values())}
+
+    bars = list(buckets.values())
+    return {
+        "t": list(buckets),
+        "price": [bar[3] for bar in bars],
+        "open": [bar[0] for bar in bars],
+        "high": [bar[1] for bar in bars],
+        "low": [bar[2] for bar in bars],
+        "volume": [bar[4] for bar in bars],
+    }
+
+
+def columns_to_points(columns: dict, times: list[str]) -> list[dict]:
+    if "open" not in columns:
+        return [{"t": t, "price": price} for t, price in zip(times, columns["price"])]
+
+    rows = zip(times, columns["open"], columns["high"], columns["low"], columns["price"], columns["volume"])
+    return [
+        {"t": t, "price": c, "open": o, "high": h, "low": lo, "close": c, "volume": v}
+        for t, o, h, lo, c, v in rows
+    ]
+
+
+def build_points_numpy(items, bucket_seconds: int, candles: bool = False):
+    columns = bucket_columns_numpy(items, bucket_seconds, candles)
+    times = format_times(columns["t"])
+    return columns_to_points({k: v.tolist() for k, v in columns.items()}, times)
+
+
+def build_points_python(items, bucket_seconds: int, candles: bool = False):
+    columns = bucket_columns_python(items, bucket_seconds, candles)
+    times = [datetime.fromtimestamp(ts, EASTERN_TZ).isoformat() for ts in columns["t"]]
+    return columns_to_points(columns, times)
+
+
+def build_points(items, bucket_seconds: int, candles: bool = False):
     """
     Convert raw minute items into aggregated points.
     For 1D: bucket_seconds = 60 (1 minute) -> essentially one point per minute.
     For 1W: bucket_seconds = 1800 (30 min).
     For 1M: bucket_seconds = 3600 (1 hour).
-    We use the last price seen in each bucket.
+    We use the last price seen in each bucket. With candles=True each point
+    also carries the bucket's open/high/low/close/volume, merged from the
+    minute (or rollup) bars.
+    Uses the NumPy path when numpy is available.
     """
     if not items:
-        log("build_points: no items, returning empty list")
+        debug("build_points: no items, returning empty list")
         return []
 
-    # Sort by ts ascending
-    items = sorted(items, key=lambda x: x["ts"])
+    with METRICS.timer("build_points_ms"):
+        if np is not None:
+            points = build_points_numpy(items, bucket_seconds, candles)
+        else:
+            points = build_points_python(items, bucket_seconds, candles)
 
-    buckets = {}
+    debug(f"build_points: {len(items)} raw items -> {len(points)} buckets")
+    return points
 
-    for item in items:
-        ts = int(item["ts"])
-        price = float(item.get("price") or item.get("close"))
 
-        # Align timestamp to bucket boundary (e.g. minute, 30-min, hour)
-        bucket_start_ts = ts - (ts % bucket_seconds)
+def build_columns(items, bucket_seconds: int, candles: bool = False) -> dict:
+    """
+    Same buckets as build_points(), as parallel lists keyed by field, with
+    "t" as epoch seconds instead of ISO strings ("price" is the close).
+    """
+    if not items:
+        columns = {"t": [], "price": []}
+        if candles:
+            columns.update((key, []) for key in CANDLE_COLUMNS)
+        return columns
+
+    with METRICS.timer("build_columns_ms"):
+        if np is not None:
+            columns = {k: v.tolist() for k, v in bucket_columns_numpy(items, bucket_seconds, candles).items()}
+        else:
+            columns = bucket_columns_python(items, bucket_seconds, candles)
 
-        # Since items are sorted ascending, later writes overwrite earlier => last price wins
-        buckets[bucket_start_ts] = price
+    debug(f"build_columns: {len(items)} raw items -> {len(columns['t'])} buckets")
+    return columns
 
-    log(f"build_points: {len(items)} raw items -> {len(buckets)} buckets")
 
-    points = [
-        {
-            "t": datetime.fromtimestamp(bucket_ts, EASTERN_TZ).isoformat(),
-            "price": price,
-        }
-        for bucket_ts, price in sorted(buckets.items())
+def compact_columns(columns: dict, step: int) -> dict:
+    """
+    format=compact: replace the "t" column with t0 + step and the runs of
+    consecutive buckets, as [offset from t0 in steps, length]. A trading
+    day of minutes is a single run, so timestamps cost a few bytes per day.
+    Daily buckets keep their "t" column: Eastern days are 23 or 25 hours
+    across a DST switch, so their starts aren't t0 + n * step.
+    """
+    if step >= 86400:
+        return columns
+    ts = columns["t"]
+    runs = []
+    for i, t in enumerate(ts):
+        if i and t == ts[i - 1] + step:
+            runs[-1][1] += 1
+        else:
+            runs.append([(t - ts[0]) // step, 1])
+
+    compact = {"t0": ts[0] if ts else None, "step": step, "runs": runs}
+    compact.update((k, v) for k, v in columns.items() if k != "t")
+    return compact
+
+
+def encode_series(items, bucket_seconds: int, candles: bool = False, fmt: str = "points") -> dict:
+    """
+    Response fields for one series in the requested format:
+      points  - {"points": [{"t": ISO-8601, "price", ...}, ...]} (default)
+      columns - {"t": [epoch s, ...], "price": [...], ...}
+      compact - {"t0", "step", "runs", "price": [...], ...}, see compact_columns()
+                (daily buckets keep "t" as in columns)
+    With candles, columns/compact add open/high/low/volume ("price" is the close).
+    """
+    if fmt == "points":
+        return {"points": build_points(items, bucket_seconds, candles)}
+
+    columns = build_columns(items, bucket_seconds, candles)
+    if fmt == "compact":
+        return compact_columns(columns, bucket_seconds)
+    return columns
+
+
+def load_points(
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    bucket_seconds: int,
+    series_seconds: int,
+    candles: bool = False,
+    fmt: str = "points",
+) -> dict:
+    with METRICS.timer("query_series_ms"):
+        items, hit, items_read = cached_query_series(symbol, start_dt, end_dt, series_seconds, candles)
+    METRICS.incr("cache_hits" if hit else "cache_misses")
+    series = encode_series(items, bucket_seconds, candles, fmt)
+    debug(f"load_points: {len(items)} items as {fmt} for symbol={symbol}, "
+          f"cache={'hit' if hit else 'miss'}, items_read={items_read}")
+    return series
+
+
+def load_many(
+    symbols: list[str],
+    start_dt: datetime,
+    end_dt: datetime,
+    bucket_seconds: int,
+    series_seconds: int,
+    candles: bool = False,
+    fmt: str = "points",
+):
+    """
+    Load several symbols' series in parallel (READ_QUERY_CONCURRENCY).
+    A failure for one symbol is reported in its own `error` field.
+    """
+    def load_one(symbol: str) -> dict:
+        try:
+            series = load_points(symbol, start_dt, end_dt, bucket_seconds, series_seconds, candles, fmt)
+            return {"symbol": symbol, **series}
+        except Exception as e:
+            log(f"load_many: error for symbol={symbol}: {e}")
+            return {"symbol": symbol, **encode_series([], bucket_seconds, candles, fmt), "error": str(e)}
+
+    return list(QUERY_POOL.map(load_one, symbols))
+
+
+def load_history(
+    symbols: list[str],
+    start_dt: datetime,
+    end_dt: datetime,
+    bucket_seconds: int,
+    fmt: str = "points",
+) -> list[dict]:
+    """
+    Read every symbol's series from the Parquet lake in one pass. The lake
+    holds ticks, not bars, so candles are not available for these ranges.
+    """
+    with METRICS.timer("lake_query_ms"):
+        items_by_symbol = get_lake().query(symbols, start_dt, end_dt, bucket_seconds)
+    return [
+        {"symbol": symbol, **encode_series(items_by_symbol[symbol], bucket_seconds, False, fmt)}
+        for symbol in symbols
     ]
 
-    return points
+
+def accepted_encoding(headers: dict) -> str | None:
+    """
+    Pick br or gzip from the request's Accept-Encoding (header names are
+    lowercase with HTTP API payload 2.0, but don't rely on it).
+    """
+    value = next((v for k, v in headers.items() if k.lower() == "accept-encoding"), "") or ""
+
+    accepted = set()
+    for part in value.split(","):
+        name, _, params = part.partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def json_response(status: int, body: dict, headers: dict | None = None):
+    """
+    JSON response, compressed when the client accepts it and the body is
+    at least READ_COMPRESS_MIN_BYTES (API Gateway decodes isBase64Encoded
+    bodies back to bytes).
+    """
+    with METRICS.timer("serialize_ms"):
+        payload = json.dumps(body, separators=(",", ":"))
+    response = {
+        "statusCode": status,
+        "body": payload,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+    }
+
+    encoding = accepted_encoding(headers or {})
+    if encoding is None or len(payload) < READ_COMPRESS_MIN_BYTES:
+        METRICS.incr("response_bytes", len(payload))
+        return response
+
+    with METRICS.timer("compress_ms"):
+        data = payload.encode()
+        if encoding == "br":
+            data = brotli.compress(data, quality=BROTLI_QUALITY)
+        else:
+            data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    METRICS.incr("response_bytes", len(data))
+
+    response["body"] = base64.b64encode(data).decode()
+    response["isBase64Encoded"] = True
+    response["headers"]["Content-Encoding"] = encoding
+    response["headers"]["Vary"] = "Accept-Encoding"
+    return response
 
 
 def handler(event, context):
-    log(f"Incoming event: {json.dumps(event)}")
+    global _log_detail
+    _log_detail = sampled()
+    start = time.perf_counter()
+    response = None
+    try:
+        response = handle(event, context)
+        return response
+    finally:
+        METRICS.observe("request_ms", (time.perf_counter() - start) * 1000)
+        status = response["statusCode"] if response else 500
+        METRICS.incr(f"requests_{status // 100}xx")
+        METRICS.flush()
+
+
+def handle(event, context):
+    if _log_detail:
+        log(f"Incoming event: {json.dumps(event)}")
 
     qs = event.get("queryStringParameters") or {}
     symbol = qs.get("symbol")
+    symbols_param = qs.get("symbols")
     range_str = qs.get("range", "1D")
+    # candles=1: include open/high/low/close/volume per point
+    candles = qs.get("candles") == "1"
+    fmt = qs.get("format", "points")
+    headers = event.get("headers") or {}
+
+    symbols = []
+    if symbols_param:
+        # Keep request order, drop blanks and duplicates
+        symbols = list(dict.fromkeys(s.strip() for s in symbols_param.split(",") if s.strip()))
 
-    if not symbol:
+    if not symbol and not symbols:
         log("handler: missing symbol parameter")
         return {
             "statusCode": 400,
-            "body": json.dumps({"error": "symbol is required"}),
+            "body": json.dumps({"error": "symbol or symbols is required"}),
+        }
+
+    if len(symbols) > READ_MAX_SYMBOLS:
+        log(f"handler: too many symbols ({len(symbols)})")
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": f"at most {READ_MAX_SYMBOLS} symbols per request"}),
+        }
+
+    if fmt not in RESPONSE_FORMATS:
+        log(f"handler: invalid format={fmt}")
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": f"format must be one of {', '.join(RESPONSE_FORMATS)}"}),
         }
 
+    if qs.get("start") or range_str in HISTORY_RANGES:
+        return history_response(qs, symbols or [symbol], bool(symbols), fmt, headers)
+
     try:
-        start_dt, end_dt, bucket_seconds = parse_range(range_str)
+        start_dt, end_dt, bucket_seconds, series_seconds = parse_range(range_str)
     except ValueError:
         log(f"handler: invalid range={range_str}")
         return {
             "statusCode": 400,
-            "body": json.dumps({"error": "range must be one of 1D, 1W, 1M"}),
+            "body": json.dumps({"error": f"range must be one of 1D, 1W, 1M, {', '.join(HISTORY_RANGES)}"}),
         }
 
-    items = query_dynamodb(symbol, start_dt, end_dt)
-    points = build_points(items, bucket_seconds)
-    log(f"handler: returning {len(points)} points for symbol={symbol}, range={range_str}")
+    if symbols:
+        series = load_many(symbols, start_dt, end_dt, bucket_seconds, series_seconds, candles, fmt)
+        debug(f"handler: returning {len(series)} series for range={range_str}")
+        return json_response(200, {"range": range_str, "series": series}, headers)
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps(
-            {
-                "symbol": symbol,
-                "range": range_str,
-                "points": points,
-            }
-        ),
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
+    series = load_points(symbol, start_dt, end_dt, bucket_seconds, series_seconds, candles, fmt)
+    debug(f"handler: returning {fmt} for symbol={symbol}, range={range_str}")
+
+    return json_response(
+        200,
+        {
+            "symbol": symbol,
+            "range": range_str,
+            **series,
         },
-    }
+        headers,
+    )
+
+
+def history_response(qs: dict, symbols: list[str], many: bool, fmt: str, headers: dict):
+    """
+    3M / 6M / 1Y or start=...&end=... (ISO dates or datetimes, Eastern
+    when naive), served from the Parquet lake. 6M / 1Y rely on the nightly
+    compaction: a range over more than LAKE_MAX_FILES files (uncompacted
+    days are ~400 each) is answered with a 400.
+    """
+    if not LAKE_URI:
+        log("handler: history range requested but LAKE_URI is not set")
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "history ranges are not enabled"}),
+        }
+
+    range_str = "custom" if qs.get("start") else qs.get("range")
+    try:
+        start_dt, end_dt, bucket_seconds = parse_history_range(range_str, qs.get("start"), qs.get("end"))
+    except ValueError as e:
+        log(f"handler: invalid history range: {e}")
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": str(e)}),
+        }
+
+    try:
+        series = load_history(symbols, start_dt, end_dt, bucket_seconds, fmt)
+    except TooManyFiles as e:
+        log(f"handler: history range={range_str} too large: {e}")
+        METRICS.incr("lake_too_many_files")
+        return {
+            "statusCode": 400,
+            "body": json.dumps({
+                "error": f"history for this range is not compacted yet ({e.uncompacted_days} day(s) "
+                         f"pending, compacted nightly); try again later or ask for a shorter range",
+                "uncompacted_days": e.uncompacted_days,
+            }),
+        }
+    debug(f"handler: returning {len(series)} lake series for range={range_str}, "
+          f"start={start_dt}, end={end_dt}, bucket_seconds={bucket_seconds}")
+
+    body = {"range": range_str, "start": start_dt.isoformat(), "end": end_dt.isoformat()}
+    if many:
+        return json_response(200, {**body, "series": series}, headers)
+    return json_response(200, {"symbol": symbols[0], **body, **series[0]}, headers)
@@ -0,0 +1,326 @@
+"""
+Long-range price history read from the S3 Parquet lake the worker writes
+(year=YYYY/month=MM/day=DD/*.parquet, Eastern dates, one file per flush).
+
+DynamoDB only keeps INTRADAY_TTL_DAYS of minutes; ranges beyond that (3M,
+6M, 1Y, or an explicit start/end) are served from the lake instead:
+  - partition pruning: only the day directories inside the range are listed
+  - compaction: a day's _manifest.json (see the worker's compact.py) says
+    which files are current, so a compacted day is a few sorted files
+  - projection: only symbol/timestamp/price are read
+  - row-group pruning: row groups whose symbol min/max statistics exclude
+    every requested symbol are skipped (compacted files are sorted by symbol)
+  - streaming downsample: each row group is reduced to the last price per
+    (symbol, bucket) before it is merged, so memory grows with the number
+    of points returned, not with the number of ticks scanned
+
+Every lake range (3M, 6M, 1Y and custom spans) depends on compaction
+having run: an uncompacted day is ~400 flush files per shard, so even 3M
+is ~36k objects, which no 15 s / 256 MB invocation can open. A query that
+would read more than max_files files raises TooManyFiles (the handler
+answers 400, saying the range is not compacted yet) instead of running
+into the Lambda timeout. The nightly compact.py run covers the trailing
+366 days, so the first run after deploy backfills the whole span.
+
+The lake root is a pyarrow.fs URI: "s3://bucket[/prefix]" in Lambda, or a
+local directory laid out like the bucket in tests. pyarrow is only
+imported when a history range is requested (it comes from a layer).
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+EASTERN_TZ = ZoneInfo("America/New_York")
+
+# range -> (lookback, bucket_seconds)
+HISTORY_RANGES = {
+    "3M": (timedelta(days=91), 60 * 60),
+    "6M": (timedelta(days=182), 24 * 60 * 60),
+    "1Y": (timedelta(days=365), 24 * 60 * 60),
+}
+# Custom start/end spans beyond this are rejected
+MAX_SPAN = timedelta(days=366)
+
+COLUMNS = ["symbol", "timestamp", "price"]
+
+# Written by the worker's compact.py
+MANIFEST_NAME = "_manifest.json"
+COMPACTED_PREFIX = "compacted-"
+
+
+class TooManyFiles(ValueError):
+    """
+    The range needs more files than one query may read, because some of
+    its days are not compacted.
+    """
+
+    def __init__(self, files: int, max_files: int, uncompacted_days: int):
+        super().__init__(
+            f"range needs {files} files, more than the {max_files} one request may read; "
+            f"{uncompacted_days} of its days are not compacted yet, ask for a shorter range"
+        )
+        self.files = files
+        self.max_files = max_files
+        self.uncompacted_days = uncompacted_days
+
+
+def pick_bucket(span: timedelta) -> int:
+    """
+    Same granularity steps as the DynamoDB ranges (1D / 1W / 1M / 3M), daily beyond.
+    """
+    if span <= timedelta(days=2):
+        return 60
+    if span <= timedelta(days=14):
+        return 30 * 60
+    if span <= timedelta(days=92):
+        return 60 * 60
+    return 24 * 60 * 60
+
+
+def parse_time(value: str, end: bool = False) -> datetime:
+    """
+    ISO date or datetime; naive values are Eastern. A bare end date covers
+    that whole day.
+    """
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=EASTERN_TZ)
+    if end and len(value) == 10:
+        dt += timedelta(days=1)
+    return dt
+
+
+def parse_history_range(range_str: str | None, start: str | None = None, end: str | None = None):
+    """
+    (start_dt, end_dt, bucket_seconds) for a named history range or a
+    custom start[/end]. Raises ValueError for anything else.
+    """
+    now = datetime.now(EASTERN_TZ)
+
+    if start:
+        start_dt = parse_time(start)
+        end_dt = parse_time(end, end=True) if end else now
+        if start_dt >= end_dt:
+            raise ValueError("start must be before end")
+        if end_dt - start_dt > MAX_SPAN:
+            raise ValueError(f"at most {MAX_SPAN.days} days per request")
+        return start_dt, end_dt, pick_bucket(end_dt - start_dt)
+
+    if range_str not in HISTORY_RANGES:
+        raise ValueError("Unsupported range")
+    lookback, bucket_seconds = HISTORY_RANGES[range_str]
+    return now - lookback, now, bucket_seconds
+
+
+def day_partitions(start_dt: datetime, end_dt: datetime) -> list[str]:
+    """
+    year=/month=/day= prefixes of every Eastern date the range touches.
+    """
+    day = start_dt.astimezone(EASTERN_TZ).date()
+    last = end_dt.astimezone(EASTERN_TZ).date()
+    partitions = []
+    while day <= last:
+        partitions.append(day.strftime("year=%Y/month=%m/day=%d"))
+        day += timedelta(days=1)
+    return partitions
+
+
+class LakeReader:
+    """
+    Query the lake under `root_uri` for several symbols at once; one pass
+    over the partitions serves every symbol of a symbols=... request.
+    """
+
+    def __init__(self, root_uri: str, max_workers: int = 8, log=print, max_files: int = 2000):
+        import pyarrow.fs as pafs
+
+        self.fs, self.root = pafs.FileSystem.from_uri(root_uri)
+        self.max_workers = max_workers
+        self.log = log
+        self.max_files = max_files
+
+    def list_partitions(self, partitions: list[str]) -> dict[str, list[str]]:
+        """
+        Live files of each partition (full paths), listed concurrently.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lake-list") as pool:
+            return dict(zip(partitions, pool.map(self.list_partition, partitions)))
+
+    def list_partition(self, partition: str) -> list[str]:
+        import pyarrow.fs as pafs
+
+        path = f"{self.root}/{partition}"
+        # recursive: a partition may hold shard=N/ subdirectories
+        selector = pafs.FileSelector(path, recursive=True, allow_not_found=True)
+        names = [
+            info.path[len(path) + 1:] for info in self.fs.get_file_info(selector)
+            if info.type == pafs.FileType.File and info.path.endswith(".parquet")
+        ]
+        return [f"{path}/{name}" for name in live_files(names, self.read_manifest(path))]
+
+    def list_files(self, partitions: list[str]) -> list[str]:
+        return sorted(f for files in self.list_partitions(partitions).values() for f in files)
+
+    def read_manifest(self, path: str) -> dict | None:
+        try:
+            with self.fs.open_input_stream(f"{path}/{MANIFEST_NAME}") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def read_file(self, path: str, symbols: list[str], start_ts: int, end_ts: int, bucket_seconds: int):
+        """
+        Last (ts, price) per (symbol, bucket) in one file, as a list of
+        (symbol, bucket, ts, price), plus (row groups read, row groups total).
+        """
+        import pyarrow.parquet as pq
+
+        with self.fs.open_input_file(path) as f:
+            pf = pq.ParquetFile(f)
+            groups = matching_row_groups(pf, symbols)
+            rows = []
+            for i in groups:
+                table = pf.read_row_group(i, columns=COLUMNS)
+                rows.extend(reduce_ticks(table, symbols, start_ts, end_ts, bucket_seconds))
+            return rows, len(groups), pf.metadata.num_row_groups
+
+    def query(self, symbols: list[str], start_dt: datetime, end_dt: datetime, bucket_seconds: int) -> dict:
+        """
+        {symbol: [{"ts": bucket_start, "price": last price}, ...]} ascending,
+        ready for the handler's build_points()/build_columns().
+        """
+        listed = self.list_partitions(day_partitions(start_dt, end_dt))
+        files = sorted(f for day_files in listed.values() for f in day_files)
+        if len(files) > self.max_files:
+            uncompacted = sum(
+                any(not is_compacted(f) for f in day_files) for day_files in listed.values()
+            )
+            raise TooManyFiles(len(files), self.max_files, uncompacted)
+        start_ts, end_ts = int(start_dt.timestamp()), int(end_dt.timestamp())
+
+        last = {symbol: {} for symbol in symbols}
+        groups_read = groups_total = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lake") as pool:
+            results = pool.map(
+                lambda path: self.read_file(path, symbols, start_ts, end_ts, bucket_seconds), files
+            )
+            for rows, read, total in results:
+                groups_read += read
+                groups_total += total
+                for symbol, bucket, ts, price in rows:
+                    buckets = last[symbol]
+                    seen = buckets.get(bucket)
+                    if seen is None or ts >= seen[0]:
+                        buckets[bucket] = (ts, price)
+
+        self.log(f"LakeReader: {len(files)} files, {groups_read}/{groups_total} row groups read "
+                 f"for {len(symbols)} symbol(s)")
+        return {
+            symbol: [{"ts": bucket, "price": price} for bucket, (_, price) in sorted(buckets.items())]
+            for symbol, buckets in last.items()
+        }
+
+
+def is_compacted(path: str) -> bool:
+    return path.rsplit("/", 1)[-1].startswith(COMPACTED_PREFIX)
+
+
+def live_files(names: list[str], manifest: dict | None) -> list[str]:
+    """
+    Drop files a compaction has replaced, and compacted files its manifest
+    doesn't list (written by a run that never finished).
+    """
+    listed = set(manifest["files"]) if manifest else set()
+    replaced = set(manifest["replaces"]) if manifest else set()
+    return [
+        name for name in names
+        if name not in replaced
+        and (not is_compacted(name) or name in listed)
+    ]
+
+
+def matching_row_groups(pf, symbols: list[str]) -> list[int]:
+    """
+    Row groups whose symbol statistics may contain one of `symbols`.
+    Groups without statistics are always read.
+    """
+    column = pf.schema_arrow.get_field_index("symbol")
+    groups = []
+    for i in range(pf.metadata.num_row_groups):
+        stats = pf.metadata.row_group(i).column(column).statistics
+        if stats is None or not stats.has_min_max:
+            groups.append(i)
+        elif any(stats.min <= symbol <= stats.max for symbol in symbols):
+            groups.append(i)
+    return groups
+
+
+def epoch_seconds(timestamps):
+    """
+    Epoch seconds for the lake's ISO-8601 timestamp strings
+    ("2025-10-09T10:00:03.123456-04:00"), vectorized: drop the fraction and
+    the colon in the offset, then strptime with %z.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    compact = pc.binary_join_element_wise(
+        pc.utf8_slice_codeunits(timestamps, 0, 19),
+        pc.utf8_slice_codeunits(timestamps, -6, -3),
+        pc.utf8_slice_codeunits(timestamps, -2),
+        "",
+    )
+    parsed = pc.strptime(compact, format="%Y-%m-%dT%H:%M:%S%z", unit="s")
+    return pc.cast(parsed, pa.int64())
+
+
+def bucket_starts(ts, bucket_seconds: int):
+    """
+    Start (epoch seconds) of the bucket each epoch second in `ts` falls
+    into. Daily buckets start at Eastern midnight, not UTC midnight, so a
+    point carries its own trading date; shorter buckets divide an hour and
+    stay aligned under the whole-hour UTC offset.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if bucket_seconds < 86400:
+        return pc.multiply(pc.divide(ts, bucket_seconds), bucket_seconds)
+    local = pc.cast(ts, pa.timestamp("s", tz=EASTERN_TZ.key))
+    start = pc.floor_temporal(local, multiple=bucket_seconds // 86400, unit="day")
+    return pc.cast(start, pa.int64())
+
+
+def reduce_ticks(table, symbols: list[str], start_ts: int, end_ts: int, bucket_seconds: int) -> list[tuple]:
+    """
+    Filter one row group to the requested symbols and time range and keep
+    only the last tick per (symbol, bucket).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = table.filter(pc.is_in(table["symbol"], value_set=pa.array(symbols)))
+    if table.num_rows == 0:
+        return []
+
+    ts = epoch_seconds(table["timestamp"])
+    bucket = bucket_starts(ts, bucket_seconds)
+    ticks = pa.table({"symbol": table["symbol"], "bucket": bucket, "ts": ts, "price": table["price"]})
+    ticks = ticks.filter(
+        pc.and_(pc.greater_equal(ticks["ts"], start_ts), pc.less_equal(ticks["ts"], end_ts))
+    )
+    if ticks.num_rows == 0:
+        return []
+
+    reduced = (
+        ticks.sort_by([("ts", "ascending")])
+        .group_by(["symbol", "bucket"], use_threads=False)
+        .aggregate([("ts", "max"), ("price", "last")])
+    )
+    return list(zip(
+        reduced["symbol"].to_pylist(),
+        reduced["bucket"].to_pylist(),
+        reduced["ts_max"].to_pylist(),
+        reduced["price_last"].to_pylist(),
+    ))
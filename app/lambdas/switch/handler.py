@@ -1,17 +1,32 @@
 import os
 import json
+import time
 from datetime import datetime, timezone
 
-import boto3
+import botocore.session
 
+from metrics import Metrics
 
-ecs = boto3.client("ecs")
-sns = boto3.client("sns")
 
 CLUSTER = os.environ["ECS_CLUSTER"]
-SERVICE = os.environ["ECS_SERVICE"]
+# Comma-separated when the worker runs as several shard services
+SERVICES = [s.strip() for s in os.environ["ECS_SERVICE"].split(",") if s.strip()]
 TOPIC_ARN = os.environ.get("NOTIFY_TOPIC_ARN")
 
+# One CloudWatch EMF line per invocation (see metrics.py)
+METRICS = Metrics("switch")
+
+# Clients are created on first use with botocore directly (no boto3 /
+# s3transfer import); sns only when a notification is sent
+_session = botocore.session.get_session()
+_clients = {}
+
+
+def client(service: str):
+    if service not in _clients:
+        _clients[service] = _session.create_client(service)
+    return _clients[service]
+
 
 def publish_notification(action: str, desired: int, source: str) -> None:
     if not TOPIC_ARN:
@@ -25,22 +40,36 @@ def publish_notification(action: str, desired: int, source: str) -> None:
         "desiredCount": desired,
         "source": source,
         "cluster": CLUSTER,
-        "service": SERVICE,
+        "services": SERVICES,
         "timestamp": ts,
     }
 
     try:
-        sns.publish(
+        client("sns").publish(
             TopicArn=TOPIC_ARN,
             Subject=subject,  # used for email; ignored for SMS
             Message=json.dumps(message, default=str),
         )
     except Exception as e:
         # Don't break the main logic just because SNS failed
+        METRICS.incr("notify_errors")
         print(f"[WARN] Failed to publish SNS notification: {e}", flush=True)
 
 
 def handler(event, context):
+    start = time.perf_counter()
+    response = None
+    try:
+        response = handle(event, context)
+        return response
+    finally:
+        METRICS.observe("request_ms", (time.perf_counter() - start) * 1000)
+        status = response["statusCode"] if response else 500
+        METRICS.incr(f"requests_{status // 100}xx")
+        METRICS.flush()
+
+
+def handle(event, context):
     # Determine source: scheduler vs API
     source = "api"
     if event.get("source") == "aws.scheduler":
@@ -74,11 +103,14 @@ def handler(event, context):
 
     desired = 1 if action == "on" else 0
 
-    ecs.update_service(
-        cluster=CLUSTER,
-        service=SERVICE,
-        desiredCount=desired,
-    )
+    for service in SERVICES:
+        with METRICS.timer("ecs_update_ms"):
+            client("ecs").update_service(
+                cluster=CLUSTER,
+                service=service,
+                desiredCount=desired,
+            )
+    METRICS.incr(f"switch_{action}")
 
     publish_notification(action, desired, source)
 
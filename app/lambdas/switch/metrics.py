@@ -0,0 +1,177 @@
+"""
+Timing histograms and counters, emitted as CloudWatch Embedded Metric
+Format (EMF) log lines.
+
+Hot paths record into a Metrics registry (observe() / timer() for
+durations in ms, incr() for counts); flush() turns everything recorded
+since the last flush into one JSON line that CloudWatch Logs extracts as
+metrics, and resets. The worker flushes on a schedule, the Lambdas once per
+invocation.
+
+Durations go into log-spaced buckets (BUCKETS_PER_OCTAVE per doubling, so
+percentiles are within ~10%) instead of being kept, so a timer costs the
+same at 10 or 100k samples a minute. A timer is emitted as up to
+EMF_MAX_VALUES values spread over its quantiles, which is what CloudWatch
+computes percentiles from, plus a "histograms" property with the exact
+count, sum and p50/p90/p99/max for Logs Insights.
+
+sampled() is the LOG_SAMPLE_RATE knob for per-request / per-flush debug
+lines, which the metrics make redundant most of the time.
+
+This module is shared by the worker and both Lambdas; keep the copies in
+app/worker, app/lambdas/read_prices and app/lambdas/switch identical
+(.github/workflows/shared-modules.yml fails when they differ).
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "StockPriceTracker")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Share of debug log lines (or requests) that get logged; 1 = all
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+
+BUCKETS_PER_OCTAVE = 4
+# Smallest duration told apart from zero
+MIN_VALUE = 0.001
+# CloudWatch limits per EMF record
+EMF_MAX_VALUES = 100
+EMF_MAX_METRICS = 100
+
+
+def emit_line(line: str) -> None:
+    print(line, flush=True)
+
+
+def sampled(rate: float = LOG_SAMPLE_RATE) -> bool:
+    return rate >= 1 or random.random() < rate
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        index = math.floor(math.log2(max(value, MIN_VALUE)) * BUCKETS_PER_OCTAVE)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantiles(self, qs: list[float]) -> list[float]:
+        """
+        Bucket midpoints at each quantile in `qs` (ascending), capped at max.
+        """
+        out = []
+        ranks = iter(q * self.count for q in qs)
+        rank = next(ranks, None)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            while rank is not None and rank < seen:
+                out.append(min(self.max, 2 ** ((index + 0.5) / BUCKETS_PER_OCTAVE)))
+                rank = next(ranks, None)
+        out.extend(self.max for _ in range(len(qs) - len(out)))
+        return out
+
+    def summary(self) -> dict:
+        p50, p90, p99 = self.quantiles([0.5, 0.9, 0.99])
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "p50": round(p50, 3),
+            "p90": round(p90, 3),
+            "p99": round(p99, 3),
+            "max": round(self.max, 3),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry of timers and counters for one service.
+    `properties` are added to every record (e.g. the shard); only
+    "Service" is a dimension, to keep the metric count down.
+    """
+
+    def __init__(self, service: str, properties: dict | None = None, emit=emit_line,
+                 namespace: str = METRICS_NAMESPACE, enabled: bool = METRICS_ENABLED):
+        self.service = service
+        self.properties = properties or {}
+        self.emit = emit
+        self.namespace = namespace
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.timers: dict[str, Histogram] = {}
+        self.counters: dict[str, float] = {}
+
+    def observe(self, name: str, ms: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            hist = self.timers.get(name)
+            if hist is None:
+                hist = self.timers[name] = Histogram()
+            hist.add(ms)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self) -> dict | None:
+        """
+        Everything since the last call as one EMF record, and reset; None if
+        nothing was recorded.
+        """
+        with self.lock:
+            timers, self.timers = self.timers, {}
+            counters, self.counters = self.counters, {}
+        if not timers and not counters:
+            return None
+
+        record = {"Service": self.service, **self.properties}
+        definitions = []
+        for name, hist in sorted(timers.items()):
+            n = min(hist.count, EMF_MAX_VALUES)
+            record[name] = [round(v, 3) for v in hist.quantiles([(k + 0.5) / n for k in range(n)])]
+            definitions.append({"Name": name, "Unit": "Milliseconds"})
+        for name, value in sorted(counters.items()):
+            record[name] = value
+            definitions.append({"Name": name, "Unit": "Count"})
+        record["histograms"] = {name: hist.summary() for name, hist in sorted(timers.items())}
+
+        record["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": self.namespace,
+                    "Dimensions": [["Service"]],
+                    "Metrics": definitions[i:i + EMF_MAX_METRICS],
+                }
+                for i in range(0, len(definitions), EMF_MAX_METRICS)
+            ],
+        }
+        return record
+
+    def flush(self) -> dict | None:
+        record = self.record()
+        if record is not None:
+            self.emit(json.dumps(record, separators=(",", ":")))
+        return record
@@ -0,0 +1,361 @@
+"""
+Daily compaction of the tick lake.
+
+flush_buffer() writes one small stocks-HH-MM-SS.parquet per minute, so a
+trading day is ~400 objects and every scan pays per-object open and footer
+reads. compact_day() merges a day's files into one (or a few) files sorted
+by symbol and timestamp, written so each row group holds whole symbols and
+its min/max statistics let readers skip the symbols they don't want. The
+day is merged one symbol range at a time (COMPACT_BATCH_ROWS), so memory
+stays bounded however many symbols are tracked.
+
+Swapping is done with a manifest instead of renames (S3 has none):
+
+  1. write compacted-g<generation>-<n>.parquet into the day partition
+  2. write _manifest.json listing those files and every file they replace
+     (one PUT, so readers see either the old or the new manifest)
+  3. delete the replaced files
+
+Readers (read_prices/history.py) skip files the manifest replaces and any
+compacted-* file it doesn't list, so a crash at any step leaves the day
+readable exactly once. Re-running is safe: with nothing new to merge it
+only finishes step 3; files flushed after the last run are merged with
+the current compacted files into the next generation. That makes an
+already compacted (or empty) day cost a manifest read and a listing, so
+the nightly job runs over the trailing year every history range reads
+(--days 366): its first run backfills the lake, and a night that failed
+is picked up by the next one. --from/--to compact an explicit range.
+
+    python compact.py                      # yesterday, s3://$S3_BUCKET
+    python compact.py --days 366           # the year up to yesterday
+    python compact.py --from 2025-06-02 --to 2025-10-08
+    python compact.py --date 2025-10-09 --root /tmp/lake
+"""
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from parquet_sink import ROW_SCHEMA
+
+EASTERN_TZ = ZoneInfo("America/New_York")
+
+MANIFEST_NAME = "_manifest.json"
+COMPACTED_PREFIX = "compacted-"
+
+# Target rows per row group; groups are cut at symbol boundaries, so a
+# group holds at least one whole symbol-day
+COMPACT_ROW_GROUP_ROWS = int(os.environ.get("COMPACT_ROW_GROUP_ROWS", "25000"))
+COMPACT_MAX_FILE_ROWS = int(os.environ.get("COMPACT_MAX_FILE_ROWS", "4000000"))
+# Rows held in memory at once: inputs are read and sorted per symbol range
+# of about this size (a single symbol-day is never split)
+COMPACT_BATCH_ROWS = int(os.environ.get("COMPACT_BATCH_ROWS", "1000000"))
+
+
+def log(msg: str) -> None:
+    now = datetime.now(EASTERN_TZ).isoformat()
+    print(f"[{now}] {msg}", flush=True)
+
+
+@dataclass
+class CompactStats:
+    partition: str
+    inputs: int = 0
+    outputs: list[str] = field(default_factory=list)
+    rows: int = 0
+    row_groups: int = 0
+    batches: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+
+
+def partition_path(root: str, day: date) -> str:
+    return f"{root}/{day.strftime('year=%Y/month=%m/day=%d')}"
+
+
+def is_compacted(name: str) -> bool:
+    return os.path.basename(name).startswith(COMPACTED_PREFIX)
+
+
+def read_manifest(fs, partition: str) -> dict | None:
+    try:
+        with fs.open_input_stream(f"{partition}/{MANIFEST_NAME}") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(fs, partition: str, manifest: dict) -> None:
+    data = json.dumps(manifest, indent=1).encode()
+    if isinstance(fs, pafs.LocalFileSystem):
+        # Local stand-in for the bucket: write aside, then rename over
+        tmp = f"{partition}/.{MANIFEST_NAME}.tmp"
+        with fs.open_output_stream(tmp) as f:
+            f.write(data)
+        fs.move(tmp, f"{partition}/{MANIFEST_NAME}")
+    else:
+        with fs.open_output_stream(f"{partition}/{MANIFEST_NAME}") as f:
+            f.write(data)
+
+
+def list_parquet(fs, partition: str) -> list[str]:
+    """
+    Parquet files under the partition (including shard=N/ subdirectories),
+    as paths relative to it.
+    """
+    selector = pafs.FileSelector(partition, recursive=True, allow_not_found=True)
+    return sorted(
+        info.path[len(partition) + 1:]
+        for info in fs.get_file_info(selector)
+        if info.type == pafs.FileType.File and info.path.endswith(".parquet")
+    )
+
+
+def conform(table: pa.Table) -> pa.Table:
+    """
+    Cast a flushed file to ROW_SCHEMA (older pandas-written files carry an
+    index column and may lack newer columns).
+    """
+    columns = []
+    for f in ROW_SCHEMA:
+        if f.name in table.column_names:
+            columns.append(table[f.name].cast(f.type))
+        else:
+            columns.append(pa.nulls(table.num_rows, f.type))
+    return pa.Table.from_arrays(columns, schema=ROW_SCHEMA)
+
+
+def symbol_chunks(table: pa.Table, target_rows: int):
+    """
+    Slices of a symbol-sorted table of about target_rows each, cut only
+    between symbols.
+    """
+    counts = table.group_by("symbol", use_threads=False).aggregate([([], "count_all")])
+    counts = counts.sort_by("symbol")["count_all"].to_pylist()
+
+    start = offset = 0
+    for count in counts:
+        offset += count
+        if offset - start >= target_rows:
+            yield table.slice(start, offset - start)
+            start = offset
+    if offset > start:
+        yield table.slice(start, offset - start)
+
+
+def symbol_counts(fs, partition: str, names: list[str]) -> dict[str, int]:
+    """
+    Rows per symbol across the given files, reading only the symbol column.
+    """
+    counts: dict[str, int] = {}
+    for name in names:
+        table = pq.read_table(f"{partition}/{name}", columns=["symbol"], filesystem=fs)
+        grouped = table.group_by("symbol", use_threads=False).aggregate([([], "count_all")])
+        for symbol, count in zip(grouped["symbol"].to_pylist(), grouped["count_all"].to_pylist()):
+            counts[symbol] = counts.get(symbol, 0) + count
+    return counts
+
+
+def symbol_ranges(counts: dict[str, int], max_rows: int) -> list[tuple[str, str]]:
+    """
+    (first, last) symbol ranges of about max_rows rows each, in symbol order.
+    """
+    ranges = []
+    first = None
+    rows = 0
+    for symbol in sorted(counts):
+        if first is not None and rows + counts[symbol] > max_rows:
+            ranges.append((first, last))
+            first = None
+        if first is None:
+            first, rows = symbol, 0
+        last = symbol
+        rows += counts[symbol]
+    if first is not None:
+        ranges.append((first, last))
+    return ranges
+
+
+def sorted_ranges(fs, partition: str, names: list[str], ranges: list[tuple[str, str]]):
+    """
+    The files' rows one symbol range at a time, each sorted by symbol and
+    timestamp; every file is re-read per range with the range pushed down.
+    """
+    for first, last in ranges:
+        tables = [
+            conform(pq.read_table(
+                f"{partition}/{name}",
+                filesystem=fs,
+                filters=[("symbol", ">=", first), ("symbol", "<=", last)],
+            ))
+            for name in names
+        ]
+        yield pa.concat_tables(tables).sort_by([("symbol", "ascending"), ("timestamp", "ascending")])
+
+
+def write_compacted(fs, partition: str, generation: int, tables,
+                    row_group_rows: int, max_file_rows: int) -> tuple[list[str], int]:
+    """
+    Write sorted tables of consecutive symbol ranges as
+    compacted-g<generation>-<n>.parquet files. Returns (file names, row
+    groups written).
+    """
+    names = []
+    groups = 0
+    writer = out = None
+    file_rows = 0
+    try:
+        for table in tables:
+            for chunk in symbol_chunks(table, row_group_rows):
+                if writer is None or file_rows + chunk.num_rows > max_file_rows:
+                    if writer is not None:
+                        writer.close()
+                        out.close()
+                    names.append(f"{COMPACTED_PREFIX}g{generation}-{len(names)}.parquet")
+                    out = fs.open_output_stream(f"{partition}/{names[-1]}")
+                    writer = pq.ParquetWriter(
+                        out,
+                        ROW_SCHEMA,
+                        compression="snappy",
+                        write_statistics=True,
+                        sorting_columns=[pq.SortingColumn(0), pq.SortingColumn(1)],
+                    )
+                    file_rows = 0
+                writer.write_table(chunk, row_group_size=chunk.num_rows)
+                file_rows += chunk.num_rows
+                groups += 1
+    finally:
+        if writer is not None:
+            writer.close()
+            out.close()
+    return names, groups
+
+
+def delete_files(fs, partition: str, names) -> int:
+    deleted = 0
+    for name in names:
+        try:
+            fs.delete_file(f"{partition}/{name}")
+            deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def compact_day(
+    fs,
+    root: str,
+    day: date,
+    row_group_rows: int = COMPACT_ROW_GROUP_ROWS,
+    max_file_rows: int = COMPACT_MAX_FILE_ROWS,
+    batch_rows: int = COMPACT_BATCH_ROWS,
+    log=log,
+) -> CompactStats:
+    start = time.perf_counter()
+    partition = partition_path(root, day)
+    stats = CompactStats(partition)
+
+    manifest = read_manifest(fs, partition) or {"generation": 0, "files": [], "replaces": []}
+    current = list(manifest["files"])
+    replaced = set(manifest["replaces"])
+    listed = list_parquet(fs, partition)
+
+    # Left over from an interrupted run: already replaced, or compacted
+    # output that never made it into a manifest
+    stale = [f for f in listed if f in replaced or (is_compacted(f) and f not in current)]
+    new = [f for f in listed if f not in replaced and not is_compacted(f)]
+
+    if new:
+        inputs = current + new
+        counts = symbol_counts(fs, partition, inputs)
+        ranges = symbol_ranges(counts, batch_rows)
+        tables = sorted_ranges(fs, partition, inputs, ranges)
+
+        generation = manifest["generation"] + 1
+        outputs, groups = write_compacted(fs, partition, generation, tables, row_group_rows, max_file_rows)
+        write_manifest(fs, partition, {
+            "version": 1,
+            "generation": generation,
+            "files": outputs,
+            "replaces": sorted(replaced | set(inputs)),
+            "rows": sum(counts.values()),
+            "compacted_at": datetime.now(EASTERN_TZ).isoformat(),
+        })
+        # An interrupted run of this generation may have left files with
+        # the same names, now overwritten by the outputs
+        stale = [f for f in stale + inputs if f not in outputs]
+
+        stats.inputs = len(inputs)
+        stats.outputs = outputs
+        stats.rows = sum(counts.values())
+        stats.batches = len(ranges)
+        stats.row_groups = groups
+
+    stats.deleted = delete_files(fs, partition, stale)
+    stats.seconds = time.perf_counter() - start
+
+    if new:
+        log(f"compact_day: {partition}: {stats.inputs} files -> {len(stats.outputs)} "
+            f"({stats.rows} rows in {stats.batches} batch(es), {stats.row_groups} row groups), "
+            f"deleted {stats.deleted}, {stats.seconds:.1f}s")
+    else:
+        log(f"compact_day: {partition}: nothing new to compact, deleted {stats.deleted} leftover file(s)")
+    return stats
+
+
+def day_range(first: date, last: date) -> list[date]:
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def compact_days(fs, root: str, days: list[date], log=log, **kwargs) -> tuple[list[CompactStats], list[date]]:
+    """
+    compact_day() each day, newest first, so a long backfill makes the
+    shorter history ranges readable first. A day that fails is logged and
+    the rest still run; returns the stats of the days compacted and the
+    days that failed.
+    """
+    done, failed = [], []
+    for day in sorted(days, reverse=True):
+        try:
+            done.append(compact_day(fs, root, day, log=log, **kwargs))
+        except Exception as e:
+            log(f"compact_day: {partition_path(root, day)}: failed: {e}")
+            failed.append(day)
+    return done, failed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compact days of the tick lake")
+    which = parser.add_mutually_exclusive_group()
+    which.add_argument("--date", help="one Eastern date, YYYY-MM-DD")
+    which.add_argument("--from", dest="first", help="first Eastern date of a range to backfill")
+    which.add_argument("--days", type=int, default=1, help="the N days up to yesterday (default: 1)")
+    parser.add_argument("--to", dest="last", help="last date of the --from range (default: yesterday)")
+    parser.add_argument("--root", help="pyarrow.fs URI of the lake (default: s3://$S3_BUCKET)")
+    args = parser.parse_args(argv)
+    if args.last and not args.first:
+        parser.error("--to needs --from")
+
+    yesterday = datetime.now(EASTERN_TZ).date() - timedelta(days=1)
+    if args.date:
+        days = [date.fromisoformat(args.date)]
+    elif args.first:
+        days = day_range(date.fromisoformat(args.first), date.fromisoformat(args.last) if args.last else yesterday)
+    else:
+        days = day_range(yesterday - timedelta(days=args.days - 1), yesterday)
+
+    fs, root = pafs.FileSystem.from_uri(args.root or f"s3://{os.environ['S3_BUCKET']}")
+    _, failed = compact_days(fs, root.rstrip("/"), days)
+    if failed:
+        raise SystemExit(f"compaction failed for {', '.join(d.isoformat() for d in failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from botocore.exceptions import BotoCoreError, ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
+
+from metrics import sampled
+
+
+# BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_WRITE_LIMIT = 25
+
+THROTTLE_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
+# Not retried within a flush, but the flush is held and retried later
+SERVER_ERROR_CODES = {
+    "InternalServerError",
+    "ServiceUnavailable",
+}
+
+# Endpoint unreachable, connect/read timeouts, dropped connections
+RETRYABLE_BOTOCORE_ERRORS = (BotoConnectionError, HTTPClientError)
+
+
+@dataclass
+class WriteStats:
+    items: int = 0
+    batches: int = 0
+    written: int = 0
+    failed: int = 0
+    # throttle errors plus rounds that came back with UnprocessedItems
+    throttles: int = 0
+    # connection / timeout errors, retried like throttles
+    connection_errors: int = 0
+    retries: int = 0
+    latency_seconds: float = 0.0
+    # The failed items: still throttled or unreachable after max_attempts
+    # (worth another try later), or rejected by DynamoDB (not)
+    retryable: list[dict] = field(default_factory=list, repr=False)
+    rejected: list[dict] = field(default_factory=list, repr=False)
+
+
+@dataclass
+class HeldFlush:
+    items: list[dict]
+    # on_done of this flush and of older ones it superseded
+    callbacks: list
+
+
+def item_key(item: dict) -> tuple:
+    return item["symbol"], item["ts"]
+
+
+class BatchMinuteWriter:
+    """
+    Write minute items to DynamoDB with BatchWriteItem, off the fetch path.
+
+    submit() hands a list of items to a background thread and returns
+    immediately. The thread writes them in chunks of 25 and retries
+    UnprocessedItems, throttling errors and connection / timeout errors with
+    exponential backoff and jitter. Any other error fails only its chunk.
+    Each flush is reported through `log` (sampled, see metrics.sampled())
+    with its latency and throttle count, and recorded in `metrics`:
+    ddb_write_ms per flush, ddb_batch_ms per BatchWriteItem call, and the
+    written / failed / throttle / connection error / retry counts.
+
+    A flush with items still unwritten after that is held and its unwritten
+    items retried, oldest first, with backoff (retry_base_seconds doubling
+    to retry_max_seconds) while new flushes keep going out. A newer flush
+    supersedes held items with the same key (the open rollup bucket and day
+    block are rewritten every minute), and a held flush left empty that way
+    completes with the newer one. Items DynamoDB rejects, and the oldest
+    held flush once more than max_failed are held, are handed to
+    `dead_letter(items, reason)` and count as done, so a bad item or a long
+    outage can't hold back the WAL forever.
+    """
+
+    def __init__(
+        self,
+        dynamodb,
+        table_name: str,
+        log=print,
+        max_queue: int = 16,
+        max_attempts: int = 8,
+        base_backoff_seconds: float = 0.05,
+        max_backoff_seconds: float = 2.0,
+        metrics=None,
+        max_failed: int = 16,
+        retry_base_seconds: float = 1.0,
+        retry_max_seconds: float = 60.0,
+        dead_letter=None,
+    ):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.log = log
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.metrics = metrics
+        self.max_failed = max_failed
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.dead_letter = dead_letter
+        self.last_stats: WriteStats | None = None
+
+        # Flushes with unwritten items, oldest first; only the writer thread
+        # touches them
+        self.failed: deque[HeldFlush] = deque()
+        self.failures = 0
+        self.retry_at = 0.0
+
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self._run, name="ddb-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, items: list[dict], on_done=None) -> None:
+        """
+        Queue a flush; `on_done()` is called on the writer thread once every
+        item is written or dead-lettered, which may be after retries.
+        """
+        if not items:
+            if on_done is not None:
+                on_done()
+            return
+        if self.queue.full():
+            self.log(f"DDB writer queue full ({self.queue.maxsize} flushes), waiting")
+        self.queue.put((items, on_done))
+
+    def join(self, retry_seconds: float = 30.0, deadline: float | None = None) -> None:
+        """
+        Block until every submitted flush has been written (or failed), then
+        up to retry_seconds more for failed ones to go through on retry.
+        `deadline` (time.monotonic()) bounds the whole call, queued flushes
+        included; what is left then is logged, and replayed from the WAL on
+        the next start when one is configured.
+        """
+        if not self._wait_drained(deadline):
+            self.log(f"{self.queue.unfinished_tasks} DDB minute flush(es) not written by the deadline")
+            return
+        if not self.failed:
+            return
+        # Retry now rather than at the next backoff step
+        self.retry_at = 0.0
+        self.queue.put(None)
+        retry_deadline = time.monotonic() + retry_seconds
+        if deadline is not None:
+            retry_deadline = min(retry_deadline, deadline)
+        while self.failed and time.monotonic() < retry_deadline:
+            time.sleep(0.1)
+        if self.failed:
+            self.log(f"{len(self.failed)} failed DDB minute flush(es) still not written")
+
+    def _wait_drained(self, deadline: float | None) -> bool:
+        """
+        queue.join() that gives up at `deadline`; False if flushes are
+        still queued or in progress then.
+        """
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                if deadline is None:
+                    self.queue.all_tasks_done.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            if self.failed and time.monotonic() >= self.retry_at:
+                self._retry_failed()
+            timeout = max(0.0, self.retry_at - time.monotonic()) if self.failed else None
+            try:
+                job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            try:
+                if job is not None:
+                    items, on_done = job
+                    held = HeldFlush(items, [on_done] if on_done is not None else [])
+                    self._supersede(held)
+                    if not self._flush(held):
+                        self._keep_failed(held)
+            finally:
+                self.queue.task_done()
+
+    def _flush(self, held: HeldFlush) -> bool:
+        """
+        Write a flush's items; False if some are left to retry (they replace
+        held.items). Calls its callbacks once nothing is left.
+        """
+        try:
+            stats = self.write(held.items)
+        except Exception as e:
+            self.log(f"Error in DDB minute flush: {e}")
+            return False
+
+        self.last_stats = stats
+        self._record(stats)
+        if sampled():
+            self.log(
+                f"DDB minute flush: items={stats.items}, batches={stats.batches}, "
+                f"written={stats.written}, failed={stats.failed}, "
+                f"throttles={stats.throttles}, connection_errors={stats.connection_errors}, "
+                f"retries={stats.retries}, "
+                f"latency_ms={stats.latency_seconds * 1000:.1f}"
+            )
+        if stats.rejected:
+            self._dead_letter(stats.rejected, "rejected by DynamoDB")
+        if stats.retryable:
+            held.items = stats.retryable
+            return False
+        self._done(held)
+        return True
+
+    def _done(self, held: HeldFlush) -> None:
+        for on_done in held.callbacks:
+            try:
+                on_done()
+            except Exception as e:
+                self.log(f"Error after DDB minute flush: {e}")
+
+    def _supersede(self, newer: HeldFlush) -> None:
+        """
+        Drop held items that `newer` rewrites; a held flush left empty
+        completes when `newer` does.
+        """
+        if not self.failed:
+            return
+        keys = {item_key(item) for item in newer.items}
+        for held in list(self.failed):
+            held.items = [item for item in held.items if item_key(item) not in keys]
+            if not held.items:
+                self.failed.remove(held)
+                newer.callbacks[:0] = held.callbacks
+
+    def _keep_failed(self, held: HeldFlush) -> None:
+        self.failed.append(held)
+        if len(self.failed) == 1:
+            self._back_off()
+        if len(self.failed) > self.max_failed:
+            oldest = self.failed.popleft()
+            self._dead_letter(oldest.items, f"{self.max_failed} failed flushes already pending")
+            if self.metrics is not None:
+                self.metrics.incr("ddb_flush_dropped")
+            self._done(oldest)
+
+    def _back_off(self) -> None:
+        self.failures += 1
+        backoff = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + backoff
+
+    def _retry_failed(self) -> None:
+        while self.failed:
+            if not self._flush(self.failed[0]):
+                self._back_off()
+                return
+            self.failed.popleft()
+            if self.metrics is not None:
+                self.metrics.incr("ddb_flush_retried")
+        self.failures = 0
+
+    def _dead_letter(self, items: list[dict], reason: str) -> None:
+        self.log(f"Dead-lettering {len(items)} minute items: {reason}")
+        if self.metrics is not None:
+            self.metrics.incr("ddb_items_dead_lettered", len(items))
+        if self.dead_letter is None:
+            return
+        try:
+            self.dead_letter(items, reason)
+        except Exception as e:
+            self.log(f"Error dead-lettering {len(items)} minute items: {e}")
+
+    def _record(self, stats: WriteStats) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.observe("ddb_write_ms", stats.latency_seconds * 1000)
+        self.metrics.incr("ddb_items_written", stats.written)
+        self.metrics.incr("ddb_items_failed", stats.failed)
+        self.metrics.incr("ddb_throttles", stats.throttles)
+        self.metrics.incr("ddb_connection_errors", stats.connection_errors)
+        self.metrics.incr("ddb_retries", stats.retries)
+
+    def write(self, items: list[dict]) -> WriteStats:
+        """
+        Synchronously write items in chunks of 25. Safe to call directly.
+        """
+        start = time.perf_counter()
+
+        # BatchWriteItem rejects duplicate keys in one request; last one wins
+        unique = {item_key(item): item for item in items}
+        requests = [{"PutRequest": {"Item": item}} for item in unique.values()]
+
+        stats = WriteStats(items=len(requests))
+        for i in range(0, len(requests), BATCH_WRITE_LIMIT):
+            self._write_chunk(requests[i:i + BATCH_WRITE_LIMIT], stats)
+
+        stats.latency_seconds = time.perf_counter() - start
+        return stats
+
+    def _write_chunk(self, pending: list[dict], stats: WriteStats) -> None:
+        attempt = 0
+        while pending:
+            stats.batches += 1
+            start = time.perf_counter()
+            try:
+                resp = self.dynamodb.batch_write_item(
+                    RequestItems={self.table_name: pending}
+                )
+            except (ClientError, BotoCoreError) as e:
+                code = e.response.get("Error", {}).get("Code") if isinstance(e, ClientError) else None
+                if code in THROTTLE_ERROR_CODES:
+                    stats.throttles += 1
+                elif isinstance(e, RETRYABLE_BOTOCORE_ERRORS):
+                    stats.connection_errors += 1
+                else:
+                    self.log(f"Error writing {len(pending)} minute items to DynamoDB: {e}")
+                    stats.failed += len(pending)
+                    # A server error may clear by the flush's next retry; anything else won't
+                    unwritten = stats.retryable if code in SERVER_ERROR_CODES else stats.rejected
+                    unwritten.extend(request["PutRequest"]["Item"] for request in pending)
+                    return
+            else:
+                if self.metrics is not None:
+                    self.metrics.observe("ddb_batch_ms", (time.perf_counter() - start) * 1000)
+                unprocessed = resp.get("UnprocessedItems", {}).get(self.table_name, [])
+                stats.written += len(pending) - len(unprocessed)
+                pending = unprocessed
+                if not pending:
+                    return
+                stats.throttles += 1
+
+            attempt += 1
+            if attempt >= self.max_attempts:
+                self.log(f"Giving up on {len(pending)} minute items after {attempt} attempts")
+                stats.failed += len(pending)
+                stats.retryable.extend(request["PutRequest"]["Item"] for request in pending)
+                return
+
+            stats.retries += len(pending)
+            backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** attempt)
+            time.sleep(random.uniform(0, backoff))
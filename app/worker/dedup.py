@@ -0,0 +1,91 @@
+"""
+Change detection for polled quotes before they are stored.
+
+Outside trading hours, and all day for illiquid names, a poll returns the
+same quote as the one before it. QuoteDeduper passes a row through only
+when one of CHANGE_FIELDS differs from the last row stored for its
+symbol, or when heartbeat_seconds have passed since that row (0: never),
+so a quiet symbol still shows up in every file and bucket.
+
+Every stored row carries `repeats`: how many polls since the previous
+stored row of the symbol were dropped. They returned that previous row's
+values, so the value at any time is the last stored row at or before it,
+and each row stands for 1 + `repeats` polls. The dropped polls' times are
+not kept: with ADAPTIVE_POLLING a symbol's interval changes between polls,
+so they can't be rebuilt by spacing `repeats` copies evenly after a row.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+CHANGE_FIELDS = ("price", "volume", "open", "day_high", "day_low", "previous_close")
+
+
+@dataclass
+class DedupStats:
+    rows_in: int = 0
+    rows_out: int = 0
+    heartbeats: int = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.rows_in - self.rows_out
+
+
+@dataclass
+class _Last:
+    values: tuple
+    stored_at: float
+    repeats: int = 0
+    row: dict | None = None  # newest dropped row, for drain()
+
+
+class QuoteDeduper:
+    def __init__(self, heartbeat_seconds: float = 60.0, fields=CHANGE_FIELDS):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.fields = fields
+        self.last: dict[str, _Last] = {}
+        self.stats = DedupStats()
+        self._ts_cache: tuple[str, float] = ("", 0.0)
+
+    def _epoch(self, ts: str) -> float:
+        # Rows of one poll share a timestamp string
+        if self._ts_cache[0] != ts:
+            self._ts_cache = (ts, datetime.fromisoformat(ts).timestamp())
+        return self._ts_cache[1]
+
+    def filter(self, rows: list[dict]) -> list[dict]:
+        """
+        The rows to store, each with `repeats` set.
+        """
+        out = []
+        for row in rows:
+            values = tuple(row.get(f) for f in self.fields)
+            now = self._epoch(row["timestamp"])
+            last = self.last.get(row["symbol"])
+
+            if last is not None and last.values == values:
+                if not self.heartbeat_seconds or now - last.stored_at < self.heartbeat_seconds:
+                    last.repeats += 1
+                    last.row = row
+                    continue
+                self.stats.heartbeats += 1
+
+            out.append({**row, "repeats": last.repeats if last is not None else 0})
+            self.last[row["symbol"]] = _Last(values, now)
+
+        self.stats.rows_in += len(rows)
+        self.stats.rows_out += len(out)
+        return out
+
+    def drain(self) -> list[dict]:
+        """
+        Close every open run of dropped rows by storing its newest one, so
+        the end of the run isn't lost (on shutdown).
+        """
+        out = []
+        for last in self.last.values():
+            if last.row is not None:
+                out.append({**last.row, "repeats": last.repeats - 1})
+                self.stats.rows_out += 1
+        self.last.clear()
+        return out
@@ -1,29 +1,132 @@
 import os
+import signal
 import time
-from decimal import Decimal
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
+from decimal import Decimal
 from zoneinfo import ZoneInfo
 
-import boto3
-import pandas as pd
-import yfinance as yf
+# Process start, for the time-to-first-tick metric. Taken here, ahead of
+# boto3, pyarrow and the modules that load them, because those imports are
+# a large part of what that metric measures.
+PROCESS_START = time.time()
+
+import boto3  # noqa: E402
+
+from ddb_writer import BatchMinuteWriter  # noqa: E402
+from dedup import QuoteDeduper  # noqa: E402
+from metadata import MetadataStore  # noqa: E402
+from metrics import Metrics, sampled  # noqa: E402
+from minute_blocks import block_key, chunk_start, pack_block, unpack_block  # noqa: E402
+from parquet_sink import ParquetUploader  # noqa: E402
+from polling import AdaptivePoller  # noqa: E402
+from quotes import ConcurrentFetcher, FakeQuoteSource, YFinanceQuoteSource  # noqa: E402
+from scheduler import TickScheduler  # noqa: E402
+from sharding import shard_symbols  # noqa: E402
+from streaming import STREAM_SOURCE_NAME, YAHOO_STREAM_URL, QuoteStream  # noqa: E402
+from tick_buffer import TickBuffer  # noqa: E402
+from wal import TickWal  # noqa: E402
 
 
 S3_BUCKET = os.environ["S3_BUCKET"]
-STOCK_LIST = [s.strip() for s in os.environ["STOCK_LIST"].split(",") if s.strip()]
 EASTERN_TZ = ZoneInfo("America/New_York")
 
+# Sharded fleet: SHARD_COUNT workers each poll the part of STOCK_LIST the
+# hash ring gives SHARD_INDEX (see sharding.py), and flush ticks under
+# their own day=DD/shard=<index>/ prefix
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", "0"))
+STOCK_UNIVERSE = [s.strip() for s in os.environ["STOCK_LIST"].split(",") if s.strip()]
+STOCK_LIST = shard_symbols(STOCK_UNIVERSE, SHARD_INDEX, SHARD_COUNT)
+
 # Optional: hot store in DynamoDB
 DDB_INTRADAY_TABLE = os.environ.get("DDB_INTRADAY_TABLE")
 INTRADAY_TTL_DAYS = int(os.environ.get("INTRADAY_TTL_DAYS", "60"))
+# Coarser series maintained next to the minute series, under partition key
+# "<symbol>#<seconds>", so long ranges read one item per bucket
+DDB_ROLLUP_SECONDS = [
+    int(s) for s in os.environ.get("DDB_ROLLUP_SECONDS", "1800,3600").split(",") if s.strip()
+]
+# Minute storage layout: "items" (one item per minute), "blocks" (one packed
+# item per symbol per day, see minute_blocks.py) or "both" while migrating
+DDB_MINUTE_LAYOUT = os.environ.get("DDB_MINUTE_LAYOUT", "items")
+
+# Stage timings and counters, emitted as one CloudWatch EMF line per
+# interval (see metrics.py); LOG_SAMPLE_RATE thins the per-flush log lines
+METRICS_INTERVAL_SECONDS = float(os.environ.get("METRICS_INTERVAL_SECONDS", "60"))
+METRICS = Metrics("worker", properties={"Shard": SHARD_INDEX})
 
 s3 = boto3.client("s3")
 dynamodb = boto3.resource("dynamodb") if DDB_INTRADAY_TABLE else None
 intraday_table = dynamodb.Table(DDB_INTRADAY_TABLE) if dynamodb else None
 
-# Reuse Ticker objects
-TICKERS = {symbol: yf.Ticker(symbol) for symbol in STOCK_LIST}
+# Quote fetching: "yfinance" in production, "fake" for local runs without Yahoo
+QUOTE_SOURCE_NAME = os.environ.get("QUOTE_SOURCE", "yfinance")
+# How many symbols are fetched in parallel, and how long one tick waits
+# before reporting the remaining symbols as late
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", "8"))
+FETCH_DEADLINE_SECONDS = float(os.environ.get("FETCH_DEADLINE_SECONDS", "2.5"))
+# "batch": one multi-symbol request per QUOTE_BATCH_SIZE symbols, with the
+# per-symbol path as fallback for misses. "single": one request per symbol.
+QUOTE_MODE = os.environ.get("QUOTE_MODE", "batch")
+QUOTE_BATCH_SIZE = int(os.environ.get("QUOTE_BATCH_SIZE", "50"))
+
+# Adaptive polling (see polling.py): each symbol is polled every
+# POLL_MIN_SECONDS..POLL_MAX_SECONDS depending on how much it moves, within
+# POLL_RPS_BUDGET upstream requests per second. Off: every symbol every
+# POLL_MIN_SECONDS.
+ADAPTIVE_POLLING = os.environ.get("ADAPTIVE_POLLING", "0") == "1"
+POLL_MIN_SECONDS = float(os.environ.get("POLL_MIN_SECONDS", "3"))
+POLL_MAX_SECONDS = float(os.environ.get("POLL_MAX_SECONDS", "60"))
+POLL_RPS_BUDGET = float(os.environ.get("POLL_RPS_BUDGET", "2"))
+
+# Streaming ingestion (see streaming.py): quotes pushed over Yahoo's
+# WebSocket feed, drained every STREAM_DRAIN_SECONDS; polling only runs
+# while the stream is down. STREAM_URL can point at a local replay server.
+QUOTE_STREAM = os.environ.get("QUOTE_STREAM", "0") == "1"
+STREAM_URL = os.environ.get("STREAM_URL", YAHOO_STREAM_URL)
+STREAM_DRAIN_SECONDS = float(os.environ.get("STREAM_DRAIN_SECONDS", "0.25"))
+
+if QUOTE_SOURCE_NAME == "fake":
+    QUOTE_SOURCE = FakeQuoteSource(
+        latency_seconds=float(os.environ.get("FAKE_QUOTE_LATENCY_SECONDS", "0")),
+    )
+else:
+    QUOTE_SOURCE = YFinanceQuoteSource()
+
+FETCHER = ConcurrentFetcher(QUOTE_SOURCE, FETCH_CONCURRENCY, FETCH_DEADLINE_SECONDS, metrics=METRICS)
+
+POLLER = AdaptivePoller(
+    STOCK_LIST,
+    POLL_MIN_SECONDS,
+    POLL_MAX_SECONDS,
+    POLL_RPS_BUDGET,
+    symbols_per_request=QUOTE_BATCH_SIZE if QUOTE_MODE == "batch" else 1,
+) if ADAPTIVE_POLLING else None
+
+# Write-ahead log of polled ticks (see wal.py); off when WAL_DIR is unset.
+# In ECS it must live on a volume that outlives the task (EFS).
+WAL_DIR = os.environ.get("WAL_DIR")
+WAL_FSYNC = os.environ.get("WAL_FSYNC", "1") == "1"
+
+# Budget from SIGTERM to exit for the final flushes and both background
+# writers. Keep it under the container's stopTimeout (ecs_worker.tf) so the
+# handoff ends before ECS sends SIGKILL; the WAL covers what doesn't make it.
+SHUTDOWN_SECONDS = float(os.environ.get("SHUTDOWN_SECONDS", "100"))
+
+# Drop polls that repeat the last stored quote of a symbol before they reach
+# the S3 buffer (see dedup.py); an unchanged quote is still stored every
+# DEDUP_HEARTBEAT_SECONDS (0: only on change). Minute bars see every poll.
+QUOTE_DEDUP = os.environ.get("QUOTE_DEDUP", "1") == "1"
+DEDUP_HEARTBEAT_SECONDS = float(os.environ.get("DEDUP_HEARTBEAT_SECONDS", "60"))
+DEDUPER = QuoteDeduper(DEDUP_HEARTBEAT_SECONDS) if QUOTE_DEDUP else None
+
+# Metadata is cached in S3 so warm restarts skip ticker.info entirely
+METADATA_CACHE_KEY = os.environ.get(
+    "METADATA_CACHE_KEY",
+    f"cache/metadata-shard{SHARD_INDEX}.json" if SHARD_COUNT > 1 else "cache/metadata.json",
+)
+METADATA_TTL_HOURS = float(os.environ.get("METADATA_TTL_HOURS", "24"))
 
 
 def log(msg: str) -> None:
@@ -31,6 +134,31 @@ def log(msg: str) -> None:
     print(f"[{now}] {msg}", flush=True)
 
 
+WAL = TickWal(WAL_DIR, log=log, fsync=WAL_FSYNC) if WAL_DIR else None
+
+# Minute items are written with BatchWriteItem on a background thread;
+# items it gives up on are recorded next to the WAL
+MINUTE_WRITER = BatchMinuteWriter(
+    dynamodb,
+    DDB_INTRADAY_TABLE,
+    log=log,
+    metrics=METRICS,
+    dead_letter=WAL.dead_letter if WAL is not None else None,
+) if dynamodb else None
+
+STREAM = QuoteStream(STOCK_LIST, STREAM_URL, log=log) if QUOTE_STREAM else None
+
+# Tick batches are encoded to Parquet in memory and uploaded on a background
+# thread; static metadata is joined into the batch at that point
+UPLOADER = ParquetUploader(
+    s3,
+    S3_BUCKET,
+    log=log,
+    to_table=lambda buffer: buffer.to_table(METADATA),
+    metrics=METRICS,
+)
+
+
 def get_val(info: dict, *keys):
     """
     Safely get the first existing key from a dict, or None.
@@ -42,103 +170,141 @@ def get_val(info: dict, *keys):
     return None
 
 
-def load_metadata() -> dict[str, dict]:
-    """
-    Load relatively static metadata once at startup.
-    """
-    meta: dict[str, dict] = {}
-    for symbol, ticker in TICKERS.items():
-        try:
-            info = ticker.info or {}
-        except Exception as e:
-            log(f"Error loading metadata for {symbol}: {e}")
-            info = {}
+# Loaded in the background from main(); rows get metadata joined at flush
+# time, so ticks polled before it arrives are still complete in S3
+METADATA_STORE = MetadataStore(
+    QUOTE_SOURCE,
+    STOCK_LIST,
+    s3,
+    S3_BUCKET,
+    METADATA_CACHE_KEY,
+    ttl_seconds=METADATA_TTL_HOURS * 3600,
+    max_workers=FETCH_CONCURRENCY,
+    log=log,
+)
+METADATA = METADATA_STORE.meta
 
-        meta[symbol] = {
-            "exchange": info.get("exchange"),
-            "currency": info.get("currency"),
-            "short_name": info.get("shortName"),
-        }
 
-    return meta
+def build_row(symbol: str, ts: str, finfo: dict, source: str | None = None) -> dict | None:
+    """
+    Normalize one fast_info-style quote dict into a buffer row.
+    Returns None when the quote has no price.
+    """
+    price = get_val(finfo, "lastPrice", "last_price", "regularMarketPrice")
+    if price is None:
+        # If we can't get a price, skip this row
+        METRICS.incr("quotes_missing_price")
+        if sampled():
+            log(f"Price missing for {symbol}, skipping this tick")
+        return None
+
+    volume = get_val(
+        finfo,
+        "lastVolume",
+        "last_volume",
+        "regularMarketVolume",
+        "volume",
+    )
+    if volume is not None:
+        volume = int(volume)
+    open_price = get_val(finfo, "open", "regularMarketOpen")
+    day_high = get_val(
+        finfo,
+        "dayHigh",
+        "day_high",
+        "regularMarketDayHigh",
+    )
+    day_low = get_val(
+        finfo,
+        "dayLow",
+        "day_low",
+        "regularMarketDayLow",
+    )
+    prev_close = get_val(
+        finfo,
+        "previousClose",
+        "previous_close",
+        "regularMarketPreviousClose",
+    )
 
+    meta = METADATA.get(symbol, {})
+    exchange = meta.get("exchange")
+    currency = meta.get("currency")
+    short_name = meta.get("short_name")
 
-METADATA = load_metadata()
+    return {
+        "symbol": symbol,
+        "timestamp": ts,
+        "price": float(price),
+
+        # dynamic quote fields
+        "volume": volume,
+        "open": open_price,
+        "day_high": day_high,
+        "day_low": day_low,
+        "previous_close": prev_close,
+
+        # static metadata
+        "exchange": exchange,
+        "currency": currency,
+        "short_name": short_name,
+        "source": source or QUOTE_SOURCE.name,
+    }
 
 
-def fetch_prices() -> list[dict]:
+def fetch_prices(symbols: list[str] | None = None) -> list[dict]:
     """
-    Fetch latest quote data for all symbols in STOCK_LIST.
+    Fetch latest quote data for `symbols` (default: all of STOCK_LIST).
     Adds extra fields: volume, open, high, low, previous_close, exchange, currency.
+    In batch mode symbols are requested QUOTE_BATCH_SIZE at a time and misses
+    fall back to per-symbol requests. Requests run concurrently
+    (FETCH_CONCURRENCY); any symbol that misses FETCH_DEADLINE_SECONDS is
+    reported late and left out of this tick.
     """
     rows: list[dict] = []
     ts = datetime.now(EASTERN_TZ).isoformat()
 
-    for symbol, ticker in TICKERS.items():
+    batch_size = QUOTE_BATCH_SIZE if QUOTE_MODE == "batch" else 0
+    symbols = STOCK_LIST if symbols is None else symbols
+    result = FETCHER.fetch(symbols, batch_size=batch_size)
+
+    for e in result.batch_errors:
+        log(f"Error in batch quote request: {e}")
+    if result.fallback:
+        log(f"Batch quote missed {result.fallback}, fetched per symbol")
+    for symbol, e in result.errors.items():
+        log(f"Error fetching {symbol}: {e}")
+    if result.late:
+        log(f"Late quotes (>{FETCH_DEADLINE_SECONDS}s), skipped this tick: {result.late}")
+
+    for symbol in symbols:
+        finfo = result.quotes.get(symbol)
+        if finfo is None:
+            continue
         try:
-            finfo = dict(getattr(ticker, "fast_info", {}) or {})
-
-            price = get_val(finfo, "lastPrice", "last_price", "regularMarketPrice")
-            if price is None:
-                # If we can't get a price, skip this row
-                log(f"Price missing for {symbol}, skipping this tick")
-                continue
-
-            volume = get_val(
-                finfo,
-                "lastVolume",
-                "last_volume",
-                "regularMarketVolume",
-                "volume",
-            )
-            open_price = get_val(finfo, "open", "regularMarketOpen")
-            day_high = get_val(
-                finfo,
-                "dayHigh",
-                "day_high",
-                "regularMarketDayHigh",
-            )
-            day_low = get_val(
-                finfo,
-                "dayLow",
-                "day_low",
-                "regularMarketDayLow",
-            )
-            prev_close = get_val(
-                finfo,
-                "previousClose",
-                "previous_close",
-                "regularMarketPreviousClose",
-            )
-
-            meta = METADATA.get(symbol, {})
-            exchange = meta.get("exchange")
-            currency = meta.get("currency")
-            short_name = meta.get("short_name")
-
-            rows.append(
-                {
-                    "symbol": symbol,
-                    "timestamp": ts,
-                    "price": float(price),
-
-                    # dynamic quote fields
-                    "volume": volume,
-                    "open": open_price,
-                    "day_high": day_high,
-                    "day_low": day_low,
-                    "previous_close": prev_close,
-
-                    # static metadata
-                    "exchange": exchange,
-                    "currency": currency,
-                    "short_name": short_name,
-                    "source": "yfinance",
-                }
-            )
+            row = build_row(symbol, ts, finfo)
         except Exception as e:
             log(f"Error fetching {symbol}: {e}")
+            continue
+        if row is not None:
+            rows.append(row)
+
+    return rows
+
 
+def stream_rows(quotes: list[tuple[str, float, dict]]) -> list[dict]:
+    """
+    Rows for quotes drained from the stream, stamped with Yahoo's quote
+    time instead of the poll time.
+    """
+    wanted = set(STOCK_LIST)
+    rows = []
+    for symbol, ts, quote in quotes:
+        if symbol not in wanted:
+            continue
+        row = build_row(symbol, datetime.fromtimestamp(ts, EASTERN_TZ).isoformat(), quote, STREAM_SOURCE_NAME)
+        if row is not None:
+            rows.append(row)
     return rows
 
 
@@ -148,8 +314,65 @@ def fetch_prices() -> list[dict]:
 
 @dataclass
 class MinuteState:
+    """
+    OHLCV bar for the open minute, updated in O(1) per tick.
+    Volume is derived from the cumulative day volume in the quotes: the
+    minute's volume is the last cumulative value seen minus the value at
+    the end of the previous minute.
+    """
     minute_start: datetime  # tz-aware (America/New_York)
-    last_price: float
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: int = 1
+    volume_base: int | None = None
+    volume_last: int | None = None
+
+    @classmethod
+    def start(cls, minute_start: datetime, price: float, volume: int | None = None,
+              volume_base: int | None = None) -> "MinuteState":
+        return cls(
+            minute_start=minute_start,
+            open=price,
+            high=price,
+            low=price,
+            close=price,
+            volume_base=volume if volume_base is None else volume_base,
+            volume_last=volume,
+        )
+
+    def add(self, price: float, volume: int | None) -> None:
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.close = price
+        self.ticks += 1
+        if volume is not None:
+            if self.volume_base is None:
+                self.volume_base = volume
+            self.volume_last = volume
+
+    @property
+    def volume(self) -> int:
+        if self.volume_base is None or self.volume_last is None:
+            return 0
+        if self.volume_last < self.volume_base:
+            # cumulative volume reset (new session)
+            return self.volume_last
+        return self.volume_last - self.volume_base
+
+    def bar(self) -> dict:
+        return {
+            "ts": int(self.minute_start.timestamp()),
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+            "ticks": self.ticks,
+        }
 
 
 # One state per symbol
@@ -160,38 +383,389 @@ def floor_to_minute(dt: datetime) -> datetime:
     return dt.replace(second=0, microsecond=0)
 
 
-def write_minute_to_dynamodb(symbol: str, state: MinuteState) -> None:
-    if intraday_table is None:
+def bar_item(partition: str, bar: dict) -> dict:
+    """
+    DynamoDB item for an OHLCV bar. "price" repeats the close for readers
+    that only know the original last-price items.
+    """
+    return {
+        "symbol": partition,
+        "ts": bar["ts"],
+        "price": Decimal(str(bar["close"])),
+        "open": Decimal(str(bar["open"])),
+        "high": Decimal(str(bar["high"])),
+        "low": Decimal(str(bar["low"])),
+        "close": Decimal(str(bar["close"])),
+        "volume": int(bar["volume"]),
+        "ticks": int(bar["ticks"]),
+        "ttl": bar["ts"] + INTRADAY_TTL_DAYS * 86400,
+        **({"last": bar["last"]} if "last" in bar else {}),
+    }
+
+
+def series_key(symbol: str, bucket_seconds: int) -> str:
+    return f"{symbol}#{bucket_seconds}"
+
+
+def batch_get(keys: list[tuple[str, int]]) -> dict[tuple[str, int], dict]:
+    """
+    BatchGetItem for (partition, ts) keys, 100 per call, following
+    UnprocessedKeys. Raises on error so callers can retry later.
+    """
+    found = {}
+    for i in range(0, len(keys), 100):
+        request = {
+            DDB_INTRADAY_TABLE: {
+                "Keys": [{"symbol": partition, "ts": ts} for partition, ts in keys[i:i + 100]]
+            }
+        }
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            for item in resp.get("Responses", {}).get(DDB_INTRADAY_TABLE, []):
+                found[(item["symbol"], int(item["ts"]))] = item
+            request = resp.get("UnprocessedKeys") or None
+    return found
+
+
+def item_bar(item: dict) -> dict:
+    """
+    Bar from a stored item; items written before OHLCV have only a price.
+    """
+    price = float(item.get("close") or item["price"])
+    bar = {
+        "ts": int(item["ts"]),
+        "open": float(item.get("open") or price),
+        "high": float(item.get("high") or price),
+        "low": float(item.get("low") or price),
+        "close": price,
+        "volume": int(item.get("volume") or 0),
+        "ticks": int(item.get("ticks") or 0),
+    }
+    if "last" in item:
+        # Rollup buckets: newest minute folded in
+        bar["last"] = int(item["last"])
+    return bar
+
+
+def merge_bar(bar: dict, minute: dict) -> None:
+    """
+    Fold a later minute bar into a bucket bar.
+    """
+    bar["high"] = max(bar["high"], minute["high"])
+    bar["low"] = min(bar["low"], minute["low"])
+    bar["close"] = minute["close"]
+    bar["volume"] += minute["volume"]
+    bar["ticks"] += minute["ticks"]
+
+
+# Open rollup bucket per (symbol, bucket_seconds); its "last" is the ts of
+# the newest minute folded into it, stored with the item
+ROLLUP_BARS: dict[tuple[str, int], dict] = {}
+# Buckets whose stored item (written before a restart, or by the symbol's
+# previous owner) couldn't be read yet, per (symbol, bucket_seconds,
+# bucket_ts): this process's minutes of them, and whether each came from
+# the WAL replay. Held back so writing them doesn't overwrite the stored
+# part; merged and written once the read succeeds, closed or not.
+ROLLUP_HELD: dict[tuple[str, int, int], list[tuple[dict, bool]]] = {}
+# Set while the WAL replays minutes the previous process may already have
+# folded into the stored buckets
+REPLAYING = False
+
+
+def merge_stored_bucket(item: dict | None, bucket_ts: int, minutes: list[tuple[dict, bool]]) -> dict:
+    """
+    Fold held minutes into a stored bucket item. Minutes before its "last"
+    are already in it, and so is a replayed minute equal to it (written
+    before a crash, not yet acked in the WAL); a live minute equal to it is
+    the rest of a minute the previous owner stored partially.
+    """
+    bar = item_bar(item) if item else None
+    last = bar.get("last") if bar else None
+    for minute, replayed in minutes:
+        if last is not None and (minute["ts"] < last or (minute["ts"] == last and replayed)):
+            continue
+        if bar is None:
+            bar = {**minute, "ts": bucket_ts}
+        else:
+            merge_bar(bar, minute)
+        bar["last"] = minute["ts"]
+    return bar
+
+
+def rollup_items(bars: list[tuple[str, dict]]) -> list[dict]:
+    """
+    Fold each closed minute into the rollup buckets it falls into and
+    return the updated bucket items. Rewriting the open bucket every minute
+    keeps it current for readers. A new bucket starts from the minute that
+    opens it; only a bucket this process doesn't hold at all (first minute
+    after a restart or adopting the symbol) is merged with the stored item,
+    so its open/high/low/volume survive the restart. Until that read
+    succeeds the bucket is held (ROLLUP_HELD) and retried on later minutes.
+    Minutes at or below a bucket's "last" are skipped, so a replayed minute
+    is never counted twice.
+    """
+    if not DDB_ROLLUP_SECONDS:
+        return []
+
+    items = []
+    touched = {}
+    for symbol, minute in bars:
+        ts = minute["ts"]
+        for bucket_seconds in DDB_ROLLUP_SECONDS:
+            key = (symbol, bucket_seconds)
+            bucket_ts = ts - ts % bucket_seconds
+            bar = ROLLUP_BARS.get(key)
+            if bar is None:
+                # Not held at all: the stored item may hold an earlier part
+                ROLLUP_HELD[(*key, bucket_ts)] = [(minute, REPLAYING)]
+            elif bucket_ts > bar["ts"]:
+                if key in touched:
+                    # Changed in this call: write its final state too
+                    items.append(bar_item(series_key(*key), touched.pop(key)))
+                touched[key] = {**minute, "ts": bucket_ts}
+            elif bucket_ts < bar["ts"] or ts <= bar["last"]:
+                # Late minute of a bucket already closed, or one already in it
+                continue
+            else:
+                held = ROLLUP_HELD.get((*key, bucket_ts))
+                if held is not None:
+                    held.append((minute, REPLAYING))
+                else:
+                    touched[key] = bar
+                merge_bar(bar, minute)
+                bar["last"] = ts
+                continue
+            ROLLUP_BARS[key] = touched.get(key) or {**minute, "ts": bucket_ts}
+            ROLLUP_BARS[key]["last"] = ts
+
+    if ROLLUP_HELD:
+        keys = list(ROLLUP_HELD)
+        try:
+            stored = batch_get([(series_key(symbol, seconds), bucket_ts) for symbol, seconds, bucket_ts in keys])
+        except Exception as e:
+            log(f"Error loading {len(keys)} rollup buckets, holding them until the next minute: {e}")
+        else:
+            for symbol, seconds, bucket_ts in keys:
+                partition = series_key(symbol, seconds)
+                bar = merge_stored_bucket(
+                    stored.get((partition, bucket_ts)), bucket_ts, ROLLUP_HELD.pop((symbol, seconds, bucket_ts))
+                )
+                if ROLLUP_BARS[(symbol, seconds)]["ts"] == bucket_ts:
+                    ROLLUP_BARS[(symbol, seconds)] = bar
+                else:
+                    log(f"Rollup bucket {partition}@{bucket_ts} merged after it closed")
+                items.append(bar_item(partition, bar))
+
+    items.extend(bar_item(series_key(*key), bar) for key, bar in touched.items())
+    return items
+
+
+@dataclass
+class MinuteBlock:
+    start_ts: int  # chunk start (see chunk_start), epoch seconds
+    bars: list[dict]
+
+
+# The open chunk of packed minutes per symbol. Only this chunk is re-packed
+# and rewritten on each close, so a write costs at most an hour of bars
+# (under 1 KB) instead of the whole session so far (~4 KB by the close).
+MINUTE_BLOCKS: dict[str, MinuteBlock] = {}
+
+
+def load_blocks(keys: list[tuple[str, int]]) -> None:
+    """
+    Seed MINUTE_BLOCKS from DynamoDB for (symbol, start_ts) pairs we don't
+    hold yet, so a restarted worker appends to the stored chunk instead of
+    replacing it. On error the symbols stay unloaded and are retried on the
+    next minute, rather than overwriting the stored chunk with a partial one.
+    """
+    try:
+        found = batch_get([(block_key(symbol), start_ts) for symbol, start_ts in keys])
+    except Exception as e:
+        log(f"Error loading minute blocks for {len(keys)} symbols: {e}")
         return
 
-    # minute_start is Eastern; timestamp() gives epoch seconds (UTC-based)
-    ts_epoch = int(state.minute_start.timestamp())
-    ttl_epoch = int((state.minute_start + timedelta(days=INTRADAY_TTL_DAYS)).timestamp())
+    for symbol, start_ts in keys:
+        item = found.get((block_key(symbol), start_ts))
+        bars = unpack_block(start_ts, item["blk"]) if item else []
+        MINUTE_BLOCKS[symbol] = MinuteBlock(start_ts=start_ts, bars=bars)
 
-    item = {
-        "symbol": symbol,
-        "ts": ts_epoch,
-        "price": Decimal(str(state.last_price)),
-        "ttl": ttl_epoch,
+
+def ensure_blocks(bars: list[tuple[str, dict]]) -> None:
+    missing = []
+    for symbol, bar in bars:
+        block = MINUTE_BLOCKS.get(symbol)
+        start_ts = chunk_start(bar["ts"])
+        if block is None or block.start_ts != start_ts:
+            missing.append((symbol, start_ts))
+    if missing:
+        load_blocks(missing)
+
+
+def block_items(bars: list[tuple[str, dict]]) -> list[dict]:
+    """
+    Append each closed minute to its symbol's open chunk and return the
+    re-packed chunk items. Closed chunks are never rewritten.
+    """
+    ensure_blocks(bars)
+
+    items = []
+    for symbol, bar in bars:
+        block = MINUTE_BLOCKS.get(symbol)
+        if block is None or block.start_ts != chunk_start(bar["ts"]):
+            continue
+
+        # A minute we already stored (e.g. replayed after a restart) is replaced
+        while block.bars and block.bars[-1]["ts"] >= bar["ts"]:
+            block.bars.pop()
+        block.bars.append(bar)
+
+        items.append(
+            {
+                "symbol": block_key(symbol),
+                "ts": block.start_ts,
+                "blk": pack_block(block.start_ts, block.bars),
+                "n": len(block.bars),
+                "ttl": block.start_ts + INTRADAY_TTL_DAYS * 86400,
+            }
+        )
+    return items
+
+
+# Symbols this process has closed a minute for
+ADOPTED: set[str] = set()
+
+
+def stored_minute_bars(bars: list[tuple[str, dict]]) -> dict[str, dict]:
+    """
+    Bars already stored for these (symbol, minute) pairs, from the minute
+    items or, with DDB_MINUTE_LAYOUT=blocks, from the open block chunks.
+    """
+    if DDB_MINUTE_LAYOUT == "blocks":
+        ensure_blocks(bars)
+        found = {}
+        for symbol, bar in bars:
+            block = MINUTE_BLOCKS.get(symbol)
+            if block and block.bars and block.bars[-1]["ts"] == bar["ts"]:
+                found[symbol] = dict(block.bars[-1])
+        return found
+
+    items = batch_get([(symbol, bar["ts"]) for symbol, bar in bars])
+    return {
+        symbol: item_bar(items[(symbol, bar["ts"])])
+        for symbol, bar in bars
+        if (symbol, bar["ts"]) in items
     }
 
+
+def adopt_minutes(bars: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    """
+    Merge the first minute this process closes for each symbol with what
+    is already stored for it. When a worker stops (redeploy, or a shard
+    rebalance moving the symbol to another task) it writes its partial
+    open minute; the next owner's first bar for that minute covers only the
+    rest of it, so writing it as is would overwrite the first part.
+    """
+    # Index of each new symbol's first bar in this batch
+    first_at = {}
+    for i, (symbol, _) in enumerate(bars):
+        if symbol not in ADOPTED and symbol not in first_at:
+            first_at[symbol] = i
+    if not first_at:
+        return bars
+    first = [bars[i] for i in first_at.values()]
+
     try:
-        intraday_table.put_item(Item=item)
-        log(f"DDB minute write: {item}")
+        stored = stored_minute_bars(first)
     except Exception as e:
-        log(f"Error writing to DynamoDB for {symbol}: {e}")
+        log(f"Error loading stored minutes for {len(first)} symbols, writing them unmerged: {e}")
+        stored = {}
+    ADOPTED.update(symbol for symbol, _ in first)
+    if stored:
+        log(f"Merged {len(stored)} partially stored minute(s) from a previous owner")
+
+    merged = list(bars)
+    for symbol, prev in stored.items():
+        i = first_at[symbol]
+        bar = dict(prev)
+        merge_bar(bar, bars[i][1])
+        merged[i] = (symbol, bar)
+    return merged
+
+
+# Open minutes idle for longer than this (a symbol that stopped quoting)
+# don't hold back the WAL's minutes watermark
+STALE_MINUTE_SECONDS = 300
+
+
+def minutes_watermark() -> tuple[dict[str, float], float]:
+    """
+    What the WAL may forget once the minutes closed so far are written:
+    each symbol's ticks before its open minute, and everything before the
+    oldest open minute that is still quoting.
+    """
+    open_minutes = {symbol: state.minute_start.timestamp() for symbol, state in MINUTE_STATE.items()}
+    if not open_minutes:
+        return {}, time.time()
+    newest = max(open_minutes.values())
+    floor = min(ts for ts in open_minutes.values() if ts >= newest - STALE_MINUTE_SECONDS)
+    return open_minutes, floor
+
+
+def write_minutes_to_dynamodb(closed: list[tuple[str, MinuteState]]) -> None:
+    """
+    Hand every finished minute (per DDB_MINUTE_LAYOUT), its rollup buckets
+    and block chunks to the background BatchWriteItem writer. Returns
+    immediately; the write happens off the fetch path.
+    """
+    if not closed:
+        return
+    METRICS.incr("minutes_closed", len(closed))
+    if MINUTE_WRITER is None:
+        if WAL is not None:
+            WAL.minutes_flush(*minutes_watermark())()
+        return
+
+    bars = [(symbol, state.bar()) for symbol, state in closed]
+    # Minute items and blocks get the merged bar; rollups get this
+    # process's part only, since a stored bucket already includes the rest
+    merged = adopt_minutes(bars)
+
+    items = []
+    if DDB_MINUTE_LAYOUT in ("items", "both"):
+        items.extend(bar_item(symbol, bar) for symbol, bar in merged)
+    items.extend(rollup_items(bars))
+    if DDB_MINUTE_LAYOUT in ("blocks", "both"):
+        items.extend(block_items(merged))
+
+    on_done = WAL.minutes_flush(*minutes_watermark()) if WAL is not None else None
+    MINUTE_WRITER.submit(items, on_done=on_done)
+
+
+def close_open_minutes() -> None:
+    """
+    Write every open minute as it stands; used on shutdown so the next
+    owner of these symbols can merge the rest of the minute into it.
+    """
+    closed = list(MINUTE_STATE.items())
+    MINUTE_STATE.clear()
+    write_minutes_to_dynamodb(closed)
+    log(f"Closed {len(closed)} open minute(s) on shutdown")
 
 
 def update_intraday_cache(rows: list[dict]) -> None:
     """
-    Update per-symbol minute state and flush previous minute to DynamoDB
+    Update per-symbol minute bars and flush the previous minute to DynamoDB
     when we cross minute boundary.
-    We store exactly one row per minute per symbol, using the last price
-    observed in that minute.
+    We store exactly one OHLCV bar per minute per symbol. All minutes that
+    close during this call are written together as one batched flush.
     """
+    closed: list[tuple[str, MinuteState]] = []
+
     for row in rows:
         symbol = row["symbol"]
         price = row["price"]
+        volume = row.get("volume")
         ts_str = row["timestamp"]
         ts = datetime.fromisoformat(ts_str)  # already Eastern
 
@@ -201,79 +775,217 @@ def update_intraday_cache(rows: list[dict]) -> None:
 
         if state is None:
             # First time we see this symbol
-            MINUTE_STATE[symbol] = MinuteState(
-                minute_start=minute_start,
-                last_price=price,
-            )
+            MINUTE_STATE[symbol] = MinuteState.start(minute_start, price, volume)
         else:
             if minute_start == state.minute_start:
-                # Still within the same minute: update last_price
-                state.last_price = price
+                # Still within the same minute: update the bar
+                state.add(price, volume)
+            elif minute_start < state.minute_start:
+                # Late tick of a minute already closed (a streamed quote
+                # stamped before the poll that preceded it)
+                continue
             else:
-                # Minute changed: flush previous minute, start new one
-                write_minute_to_dynamodb(symbol, state)
-                MINUTE_STATE[symbol] = MinuteState(
-                    minute_start=minute_start,
-                    last_price=price,
+                # Minute changed: queue previous minute, start new one
+                closed.append((symbol, state))
+                MINUTE_STATE[symbol] = MinuteState.start(
+                    minute_start,
+                    price,
+                    volume,
+                    volume_base=state.volume_last,
                 )
 
+    write_minutes_to_dynamodb(closed)
+
 
 ############################
-# S3 flush (unchanged)
+# S3 flush
 ############################
 
-def flush_buffer(buffer: list[dict]) -> None:
+def flush_buffer(buffer: TickBuffer) -> None:
+    """
+    Queue the buffered ticks for Parquet encoding and upload to S3.
+    The uploader takes ownership of `buffer`; callers must start a new one.
+    """
+    # The WAL segments holding these ticks can go once the upload lands
+    segments = WAL.rotate() if WAL is not None else []
     if not buffer:
+        if segments:
+            WAL.ack_uploaded(segments)
         return
 
-    df = pd.DataFrame(buffer)
-    log(f"Flushing {len(buffer)} rows with columns: {list(df.columns)}")
-
     now = datetime.now(EASTERN_TZ)
     date_str = now.strftime("year=%Y/month=%m/day=%d")
     time_str = now.strftime("%H-%M-%S")
 
-    key = f"{date_str}/stocks-{time_str}.parquet"
-
-    tmp_path = "/tmp/data.parquet"
-    df.to_parquet(
-        tmp_path,
-        compression="snappy",
-        index=False,
-    )
-    s3.upload_file(tmp_path, S3_BUCKET, key)
+    # Shards get their own prefix so two tasks flushing in the same second
+    # never write the same key
+    shard_str = f"/shard={SHARD_INDEX}" if SHARD_COUNT > 1 else ""
+    key = f"{date_str}{shard_str}/stocks-{time_str}.parquet"
 
-    log(f"Flushed {len(buffer)} records to s3://{S3_BUCKET}/{key}")
+    on_done = (lambda: WAL.ack_uploaded(segments)) if segments else None
+    UPLOADER.submit(key, buffer, on_done=on_done)
 
 
-def main() -> None:
-    log(f"Starting worker. Bucket={S3_BUCKET}, Stocks={STOCK_LIST}, "
-        f"DDB_INTRADAY_TABLE={DDB_INTRADAY_TABLE}")
-    log(f"Loaded metadata: {METADATA}")
+def dedup_rows(rows: list[dict]) -> list[dict]:
+    return DEDUPER.filter(rows) if DEDUPER is not None else rows
 
-    buffer: list[dict] = []
-    last_flush = time.time()
-    flush_interval_seconds = 60
-    poll_interval_seconds = 3
 
-    while True:
+def replay_wal(buffer: TickBuffer) -> None:
+    """
+    Restore what the previous process had not yet written: unflushed ticks
+    go back into the buffer, and ticks of unwritten minutes rebuild
+    MINUTE_STATE (closing and writing any minutes that ended since), record
+    by record as the log is read.
+    """
+    rebuild_seconds = 0.0
+
+    def restore_minutes(rows: list[dict]) -> None:
+        nonlocal rebuild_seconds
+        start = time.perf_counter()
+        global REPLAYING
+        # These minutes are rebuilt from all of their ticks, so they replace
+        # what is stored instead of being merged with it
+        ADOPTED.update(row["symbol"] for row in rows)
+        REPLAYING = True
         try:
+            update_intraday_cache(rows)
+        finally:
+            REPLAYING = False
+        rebuild_seconds += time.perf_counter() - start
+
+    replay = WAL.replay(lambda rows: buffer.extend(dedup_rows(rows)), restore_minutes)
+
+    log(f"WAL replay: {replay.segments} segments, {replay.records} records "
+        f"({replay.torn} torn), {replay.buffer_ticks} buffered ticks, "
+        f"{replay.minute_ticks} minute ticks -> {len(MINUTE_STATE)} open minutes, "
+        f"read {(replay.seconds - rebuild_seconds) * 1000:.1f} ms + rebuild {rebuild_seconds * 1000:.1f} ms")
+
+
+def main() -> None:
+    polling = f"every {POLL_MIN_SECONDS:g}s"
+    if POLLER is not None:
+        polling = f"adaptive {POLL_MIN_SECONDS:g}-{POLL_MAX_SECONDS:g}s within {POLL_RPS_BUDGET:g} req/s"
+    log(f"Starting worker. Bucket={S3_BUCKET}, Shard={SHARD_INDEX}/{SHARD_COUNT}, Stocks={STOCK_LIST}, "
+        f"DDB_INTRADAY_TABLE={DDB_INTRADAY_TABLE}, MinuteLayout={DDB_MINUTE_LAYOUT}, "
+        f"QuoteSource={QUOTE_SOURCE.name}, "
+        f"QuoteMode={QUOTE_MODE}, BatchSize={QUOTE_BATCH_SIZE}, "
+        f"Polling={polling}, Stream={STREAM_URL if STREAM else 'off'}, "
+        f"FetchConcurrency={FETCH_CONCURRENCY}, FetchDeadline={FETCH_DEADLINE_SECONDS}s, "
+        f"WAL={WAL_DIR or 'off'}, Dedup={f'heartbeat {DEDUP_HEARTBEAT_SECONDS:g}s' if DEDUPER else 'off'}")
+    METADATA_STORE.start()
+
+    poll_interval_seconds = POLL_MIN_SECONDS
+    intraday_interval_seconds = 1
+    flush_interval_seconds = 60
+    stats_interval_seconds = 60
+
+    buffer = TickBuffer()
+    pending_rows: list[dict] = []
+    first_tick = True
+
+    if WAL is not None:
+        replay_wal(buffer)
+
+    def ingest(rows: list[dict]) -> None:
+        nonlocal first_tick
+        if WAL is not None:
+            with METRICS.timer("wal_append_ms"):
+                WAL.append(rows)
+        buffer.extend(dedup_rows(rows))
+        pending_rows.extend(rows)
+
+        if first_tick and rows:
+            first_tick = False
+            seconds = time.time() - PROCESS_START
+            METRICS.observe("time_to_first_tick_ms", seconds * 1000)
+            log(f"Time to first tick: {seconds:.2f}s "
+                f"({len(rows)} symbols, metadata ready={METADATA_STORE.ready.is_set()})")
+
+    def fetch_job() -> None:
+        if STREAM is not None and STREAM.live.is_set():
+            return
+        if POLLER is not None:
+            now = time.time()
+            rows = fetch_prices(POLLER.due(now))
+            for row in rows:
+                POLLER.observe(row["symbol"], row["price"], now)
+        else:
             rows = fetch_prices()
-            buffer.extend(rows)
+        ingest(rows)
 
-            # Update DynamoDB minute cache
+    def intraday_job() -> None:
+        # Update DynamoDB minute cache
+        rows = pending_rows[:]
+        pending_rows.clear()
+        with METRICS.timer("minute_update_ms"):
             update_intraday_cache(rows)
 
-            now = time.time()
-            if now - last_flush >= flush_interval_seconds:
-                flush_buffer(buffer)
-                buffer.clear()
-                last_flush = now
-        except Exception as e:
-            log(f"Top-level error in main loop: {e}")
-            time.sleep(poll_interval_seconds)
-        finally:
-            time.sleep(poll_interval_seconds)
+    def stream_job() -> None:
+        # Streamed quotes go straight on to the minute bars
+        rows = stream_rows(STREAM.drain())
+        METRICS.incr("stream_quotes", len(rows))
+        if rows:
+            ingest(rows)
+            intraday_job()
+
+    def flush_job() -> None:
+        nonlocal buffer
+        flush_buffer(buffer)
+        buffer = TickBuffer()
+
+    def stats_job() -> None:
+        log(f"Scheduler stats: {scheduler.summary()}")
+        if POLLER is not None:
+            log(f"Polling stats: {POLLER.summary()}")
+        if STREAM is not None:
+            log(f"Stream stats: {STREAM.summary()}")
+        if DEDUPER is not None:
+            d = DEDUPER.stats
+            log(f"Dedup stats: {d.rows_in} polled, {d.rows_out} stored "
+                f"({d.heartbeats} heartbeats), {d.dropped} unchanged dropped")
+
+    scheduler = TickScheduler(log=log, metrics=METRICS)
+    scheduler.add("fetch", poll_interval_seconds, fetch_job)
+    scheduler.add("intraday", intraday_interval_seconds, intraday_job)
+    if STREAM is not None:
+        scheduler.add("stream", STREAM_DRAIN_SECONDS, stream_job)
+        STREAM.start()
+    scheduler.add("flush", flush_interval_seconds, flush_job)
+    scheduler.add("stats", stats_interval_seconds, stats_job)
+    scheduler.add("metrics", METRICS_INTERVAL_SECONDS, METRICS.flush)
+
+    stop_requested: list[float] = []
+
+    def stop(signum, frame) -> None:
+        log(f"Received signal {signum}, stopping after the current job")
+        stop_requested.append(time.monotonic())
+        scheduler.stop()
+
+    # ECS sends SIGTERM on scale-in and redeploys (SIGKILL follows after
+    # the container's stopTimeout, 120 s in ecs_worker.tf)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    scheduler.run_forever()
+    deadline = (stop_requested[0] if stop_requested else time.monotonic()) + SHUTDOWN_SECONDS
+
+    # Hand off cleanly: fold the last ticks into the open minutes, write
+    # them, flush the tick buffer, and wait for both background writers
+    # (which work in parallel) within one deadline
+    if STREAM is not None:
+        STREAM.stop()
+        stream_job()
+    intraday_job()
+    close_open_minutes()
+    if DEDUPER is not None:
+        buffer.extend(DEDUPER.drain())
+    flush_buffer(buffer)
+    if MINUTE_WRITER is not None:
+        MINUTE_WRITER.join(deadline=deadline)
+    UPLOADER.join(deadline=deadline)
+    FETCHER.shutdown()
+    METRICS.flush()
+    log(f"Worker stopped. Scheduler stats: {scheduler.summary()}")
 
 
 if __name__ == "__main__":
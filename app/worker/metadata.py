@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+
+def meta_from_info(info: dict) -> dict:
+    return {
+        "exchange": info.get("exchange"),
+        "currency": info.get("currency"),
+        "short_name": info.get("shortName"),
+    }
+
+
+class MetadataStore:
+    """
+    Relatively static per-symbol metadata (exchange, currency, short name),
+    loaded in the background so polling can start immediately.
+
+    `meta` is filled in place as results arrive; rows pick it up when the
+    tick buffer is flushed. Fetched entries are persisted as a small JSON
+    object in S3 with a per-symbol timestamp, so a warm restart within
+    ttl_seconds skips the slow `ticker.info` calls entirely.
+    """
+
+    def __init__(
+        self,
+        source,
+        symbols: list[str],
+        s3,
+        bucket: str,
+        cache_key: str,
+        ttl_seconds: float,
+        max_workers: int = 8,
+        log=print,
+    ):
+        self.source = source
+        self.symbols = symbols
+        self.s3 = s3
+        self.bucket = bucket
+        self.cache_key = cache_key
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self.log = log
+
+        self.meta: dict[str, dict] = {}
+        self.fetched_at: dict[str, float] = {}
+        self.ready = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """
+        Load metadata on a background thread and return immediately.
+        """
+        self.thread = threading.Thread(target=self.load, name="metadata", daemon=True)
+        self.thread.start()
+
+    def load(self) -> None:
+        start = time.perf_counter()
+        cached = self._read_cache()
+
+        now = time.time()
+        stale = []
+        for symbol in self.symbols:
+            entry = cached.get(symbol)
+            if entry and now - entry.get("fetched_at", 0) < self.ttl_seconds:
+                self.meta[symbol] = entry["meta"]
+                self.fetched_at[symbol] = entry["fetched_at"]
+            else:
+                stale.append(symbol)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="meta") as pool:
+                for symbol, meta in zip(stale, pool.map(self._fetch_one, stale)):
+                    if meta is not None:
+                        self.meta[symbol] = meta
+                        self.fetched_at[symbol] = time.time()
+            self._write_cache()
+
+        self.ready.set()
+        self.log(
+            f"Loaded metadata for {len(self.meta)}/{len(self.symbols)} symbols "
+            f"({len(self.symbols) - len(stale)} from cache, {len(stale)} fetched) "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def _fetch_one(self, symbol: str) -> dict | None:
+        try:
+            return meta_from_info(self.source.get_info(symbol) or {})
+        except Exception as e:
+            self.log(f"Error loading metadata for {symbol}: {e}")
+            return None
+
+    def _read_cache(self) -> dict:
+        if not self.cache_key:
+            return {}
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self.cache_key)
+            return json.loads(obj["Body"].read()).get("symbols", {})
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                self.log(f"Error reading metadata cache s3://{self.bucket}/{self.cache_key}: {e}")
+        except Exception as e:
+            self.log(f"Error reading metadata cache s3://{self.bucket}/{self.cache_key}: {e}")
+        return {}
+
+    def _write_cache(self) -> None:
+        if not self.cache_key:
+            return
+        body = {
+            "symbols": {
+                symbol: {"meta": self.meta[symbol], "fetched_at": self.fetched_at[symbol]}
+                for symbol in self.meta
+            }
+        }
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.cache_key,
+                Body=json.dumps(body).encode(),
+                ContentType="application/json",
+            )
+        except Exception as e:
+            self.log(f"Error writing metadata cache s3://{self.bucket}/{self.cache_key}: {e}")
@@ -0,0 +1,139 @@
+"""
+Packed per-symbol minute blocks.
+
+One DynamoDB item per (symbol, hour) holds every minute bar of that hour
+in a single binary attribute, instead of one item per minute. Items live
+under the partition "<symbol>#hour" with the chunk start as sort key. The
+worker rewrites the open chunk on every minute close, so a write stays
+under 1 KB (one WCU) all session; rewriting a whole-day block instead
+grew each write to ~4 KB by the close. All integers are zigzag varints;
+prices are in 1/10000 units.
+
+    version | count | count x minute delta | count x close delta
+        | count x (open - close, high - close, low - close) | count x volume
+        | count x ticks
+
+Minute deltas start from the block's start (its sort key), close deltas
+from 0.
+
+This module is shared by the worker and the read_prices Lambda; keep the
+copies in app/worker and app/lambdas/read_prices identical
+(.github/workflows/shared-modules.yml fails when they differ).
+"""
+
+BLOCK_VERSION = 1
+PRICE_SCALE = 10_000
+BLOCK_SUFFIX = "#hour"
+# Span of one block item; divides a day, so chunks stay aligned to Eastern
+# hours under the whole-hour UTC offset
+BLOCK_CHUNK_SECONDS = 3600
+
+
+def block_key(symbol: str) -> str:
+    return f"{symbol}{BLOCK_SUFFIX}"
+
+
+def chunk_start(ts: int) -> int:
+    return ts - ts % BLOCK_CHUNK_SECONDS
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    # zigzag so small negative deltas stay small
+    value = (value << 1) ^ (value >> 63)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    shift = 0
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), pos
+
+
+def _scale(price: float) -> int:
+    return round(price * PRICE_SCALE)
+
+
+def pack_block(start_ts: int, bars: list[dict]) -> bytes:
+    """
+    Encode minute bars ({"ts", "open", "high", "low", "close", "volume",
+    "ticks"}, ts ascending and minute aligned).
+    """
+    out = bytearray([BLOCK_VERSION])
+    _write_varint(out, len(bars))
+
+    prev = start_ts // 60
+    for bar in bars:
+        minute = bar["ts"] // 60
+        _write_varint(out, minute - prev)
+        prev = minute
+
+    prev = 0
+    for bar in bars:
+        close = _scale(bar["close"])
+        _write_varint(out, close - prev)
+        prev = close
+
+    for bar in bars:
+        close = _scale(bar["close"])
+        for key in ("open", "high", "low"):
+            _write_varint(out, _scale(bar[key]) - close)
+
+    for key in ("volume", "ticks"):
+        for bar in bars:
+            _write_varint(out, int(bar[key] or 0))
+
+    return bytes(out)
+
+
+def unpack_block(start_ts: int, data: bytes) -> list[dict]:
+    data = bytes(data)
+    version = data[0] if data else None
+    if version != BLOCK_VERSION:
+        raise ValueError(f"unsupported minute block version {version!r}")
+
+    count, pos = _read_varint(data, 1)
+
+    minutes = []
+    minute = start_ts // 60
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        minute += delta
+        minutes.append(minute * 60)
+
+    closes = []
+    scaled = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        scaled += delta
+        closes.append(scaled)
+
+    spreads = []
+    for close in closes:
+        bar = []
+        for _ in range(3):
+            delta, pos = _read_varint(data, pos)
+            bar.append((close + delta) / PRICE_SCALE)
+        spreads.append(bar)
+
+    columns = []
+    for _ in range(2):
+        values = []
+        for _ in range(count):
+            value, pos = _read_varint(data, pos)
+            values.append(value)
+        columns.append(values)
+
+    return [
+        {"ts": ts, "open": o, "high": h, "low": lo, "close": c / PRICE_SCALE, "volume": v, "ticks": n}
+        for ts, c, (o, h, lo), v, n in zip(minutes, closes, spreads, columns[0], columns[1])
+    ]
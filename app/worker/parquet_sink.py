@@ -0,0 +1,257 @@
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from metrics import sampled
+
+
+# Explicit schema for the tick files in S3. Matches what the pandas-based
+# writer produced, so old and new files read back as one dataset.
+# "repeats" counts the unchanged polls dropped before the row (dedup.py);
+# null in files written before it.
+ROW_SCHEMA = pa.schema(
+    [
+        ("symbol", pa.string()),
+        ("timestamp", pa.string()),
+        ("price", pa.float64()),
+        ("volume", pa.int64()),
+        ("open", pa.float64()),
+        ("day_high", pa.float64()),
+        ("day_low", pa.float64()),
+        ("previous_close", pa.float64()),
+        ("exchange", pa.string()),
+        ("currency", pa.string()),
+        ("short_name", pa.string()),
+        ("source", pa.string()),
+        ("repeats", pa.int32()),
+    ]
+)
+
+
+def encode_parquet(table: pa.Table) -> bytes:
+    """
+    Encode an Arrow table to snappy Parquet in memory (no temp file).
+    """
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression="snappy")
+    return sink.getvalue().to_pybytes()
+
+
+def rows_to_table(rows: list[dict]) -> pa.Table:
+    return pa.Table.from_pylist(rows, schema=ROW_SCHEMA)
+
+
+@dataclass
+class FlushStats:
+    key: str
+    rows: int = 0
+    bytes: int = 0
+    encode_seconds: float = 0.0
+    upload_seconds: float = 0.0
+    queued_seconds: float = 0.0
+
+
+class ParquetUploader:
+    """
+    Encode and upload tick batches to S3 on a background thread.
+
+    submit() takes ownership of the rows and returns immediately, so the poll
+    loop keeps collecting ticks while the previous minute is encoded and
+    uploaded. The queue is bounded: if S3 falls behind by max_queue flushes,
+    submit() blocks rather than letting memory grow without limit.
+
+    A flush whose upload fails is kept and retried, oldest first, with
+    exponential backoff while new flushes keep going out. At most
+    max_failed are held; past that the oldest is dropped (its ticks are
+    still in the WAL, if there is one, until the next start).
+
+    With `metrics`, each flush records parquet_encode_ms, s3_upload_ms and
+    the rows / bytes written; the per-flush log line is sampled.
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        log=print,
+        max_queue: int = 4,
+        to_table=rows_to_table,
+        metrics=None,
+        max_failed: int = 16,
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+    ):
+        self.s3 = s3
+        self.metrics = metrics
+        self.bucket = bucket
+        self.log = log
+        self.to_table = to_table
+        self.max_failed = max_failed
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.last_stats: FlushStats | None = None
+
+        # Flushes whose upload failed, oldest first; only the upload thread
+        # touches them
+        self.failed: deque = deque()
+        self.failures = 0
+        self.retry_at = 0.0
+
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self._run, name="s3-uploader", daemon=True)
+        self.thread.start()
+
+    def submit(self, key: str, rows, on_done=None) -> None:
+        """
+        Queue a flush; `on_done()` is called on the upload thread once the
+        object is in S3, which may be after retries (never if it is dropped).
+        """
+        if self.queue.full():
+            self.log(f"S3 upload queue full ({self.queue.maxsize} flushes), waiting")
+        self.queue.put((key, rows, time.perf_counter(), on_done))
+
+    def join(self, retry_seconds: float = 30.0, deadline: float | None = None) -> None:
+        """
+        Block until every submitted flush has been uploaded (or failed), then
+        up to retry_seconds more for failed ones to go through on retry.
+        `deadline` (time.monotonic()) bounds the whole call, queued flushes
+        included; what is left then is logged, and replayed from the WAL on
+        the next start when one is configured.
+        """
+        if not self._wait_drained(deadline):
+            self.log(f"{self.queue.unfinished_tasks} S3 flush(es) not uploaded by the deadline")
+            return
+        if not self.failed:
+            return
+        # Retry now rather than at the next backoff step
+        self.retry_at = 0.0
+        self.queue.put(None)
+        retry_deadline = time.monotonic() + retry_seconds
+        if deadline is not None:
+            retry_deadline = min(retry_deadline, deadline)
+        while self.failed and time.monotonic() < retry_deadline:
+            time.sleep(0.1)
+        if self.failed:
+            self.log(f"{len(self.failed)} failed S3 flush(es) still not uploaded")
+
+    def _wait_drained(self, deadline: float | None) -> bool:
+        """
+        queue.join() that gives up at `deadline`; False if flushes are
+        still queued or in progress then.
+        """
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                if deadline is None:
+                    self.queue.all_tasks_done.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            if self.failed and time.monotonic() >= self.retry_at:
+                self._retry_failed()
+            timeout = max(0.0, self.retry_at - time.monotonic()) if self.failed else None
+            try:
+                job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            try:
+                if job is not None and not self._flush(*job):
+                    self._keep_failed(job)
+            finally:
+                self.queue.task_done()
+
+    def _flush(self, key: str, rows, submitted: float, on_done) -> bool:
+        """
+        Upload one flush; False if the upload failed and should be retried.
+        """
+        try:
+            stats = self.upload(key, rows)
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.incr("s3_flush_errors")
+            self.log(f"Error flushing to s3://{self.bucket}/{key}: {e}")
+            return False
+
+        try:
+            stats.queued_seconds = time.perf_counter() - submitted - (
+                stats.encode_seconds + stats.upload_seconds
+            )
+            self.last_stats = stats
+            self._record(stats)
+            if sampled():
+                self.log(
+                    f"Flushed {stats.rows} records to s3://{self.bucket}/{key}: "
+                    f"bytes={stats.bytes}, encode_ms={stats.encode_seconds * 1000:.1f}, "
+                    f"upload_ms={stats.upload_seconds * 1000:.1f}, "
+                    f"queued_ms={stats.queued_seconds * 1000:.1f}"
+                )
+            if on_done is not None:
+                on_done()
+        except Exception as e:
+            # The object is in S3; uploading it again would not help
+            self.log(f"Error after flushing to s3://{self.bucket}/{key}: {e}")
+        return True
+
+    def _keep_failed(self, job) -> None:
+        self.failed.append(job)
+        if len(self.failed) == 1:
+            self._back_off()
+        if len(self.failed) > self.max_failed:
+            key = self.failed.popleft()[0]
+            if self.metrics is not None:
+                self.metrics.incr("s3_flush_dropped")
+            self.log(f"Dropping S3 flush {key}: {self.max_failed} failed flushes already pending")
+
+    def _back_off(self) -> None:
+        self.failures += 1
+        backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + backoff
+
+    def _retry_failed(self) -> None:
+        while self.failed:
+            if not self._flush(*self.failed[0]):
+                self._back_off()
+                return
+            self.failed.popleft()
+            if self.metrics is not None:
+                self.metrics.incr("s3_flush_retried")
+        self.failures = 0
+
+    def _record(self, stats: FlushStats) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.observe("parquet_encode_ms", stats.encode_seconds * 1000)
+        self.metrics.observe("s3_upload_ms", stats.upload_seconds * 1000)
+        self.metrics.observe("s3_queued_ms", stats.queued_seconds * 1000)
+        self.metrics.incr("s3_rows", stats.rows)
+        self.metrics.incr("s3_bytes", stats.bytes)
+
+    def upload(self, key: str, rows) -> FlushStats:
+        """
+        Synchronously encode and upload one batch. Safe to call directly.
+        """
+        start = time.perf_counter()
+        table = self.to_table(rows)
+        body = encode_parquet(table)
+        encoded = time.perf_counter()
+
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body)
+        uploaded = time.perf_counter()
+
+        return FlushStats(
+            key=key,
+            rows=table.num_rows,
+            bytes=len(body),
+            encode_seconds=encoded - start,
+            upload_seconds=uploaded - encoded,
+        )
@@ -0,0 +1,142 @@
+"""
+Adaptive per-symbol polling.
+
+The fixed schedule polls every symbol every tick. AdaptivePoller instead
+gives each symbol its own interval between min_seconds and max_seconds,
+resized after every poll from whether the quote changed and by how much:
+
+    changed:    interval /= SPEEDUP * (1 + move in bps / MOVE_REF_BPS)
+    unchanged:  interval *= SLOWDOWN
+
+(the move being an EWMA over the symbol's changes). A symbol that moves
+on most polls stays at min_seconds, one that hasn't moved for a few
+minutes drifts to max_seconds, and a quiet symbol that starts moving is
+back at the fast end within a couple of polls. Polling can only see one
+change per poll, so the interval reacts to changes rather than trying to
+estimate their rate.
+
+Each tick the symbols that are due go into a priority queue ordered by
+how overdue they are (time since the last poll / interval), weighted by
+their recent move size, and the queue is drained up to the request budget
+(a token bucket refilled at rps_budget, each request covering
+symbols_per_request symbols). What doesn't fit waits for the next tick
+with a higher priority, so a busy tick delays the calmest symbols first
+and nothing starves.
+"""
+import heapq
+import math
+from dataclasses import dataclass
+
+# Interval change per poll with / without a new quote
+SPEEDUP = 2.0
+SLOWDOWN = 1.25
+# A move of this size counts double, for the interval and the priority
+MOVE_REF_BPS = 5.0
+# Weight of the newest change in the move EWMA
+EWMA_ALPHA = 0.3
+
+
+@dataclass
+class SymbolPoll:
+    interval: float
+    last_poll: float | None = None
+    last_price: float | None = None
+    move_bps: float = 0.0  # average |return| of a change, in bps
+
+
+@dataclass
+class PollStats:
+    ticks: int = 0
+    polled: int = 0
+    requests: float = 0.0
+    # due symbols that didn't fit the budget, summed over ticks
+    deferred: int = 0
+    max_overdue: float = 0.0
+
+
+class AdaptivePoller:
+    def __init__(
+        self,
+        symbols: list[str],
+        min_seconds: float,
+        max_seconds: float,
+        rps_budget: float,
+        symbols_per_request: int = 1,
+    ):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.rps_budget = rps_budget
+        self.symbols_per_request = max(1, symbols_per_request)
+        # Everyone starts at the fastest rate until there's history
+        self.state = {s: SymbolPoll(min_seconds) for s in symbols}
+        # Unused budget carries over for two ticks at most, so a quiet
+        # spell can't turn into a burst of requests
+        self.burst = rps_budget * min_seconds * 2
+        self.tokens = self.burst
+        self.last_refill: float | None = None
+        self.stats = PollStats()
+
+    def due(self, now: float) -> list[str]:
+        """
+        The symbols to fetch this tick, most overdue first.
+        """
+        if self.last_refill is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rps_budget)
+        self.last_refill = now
+
+        queue = []
+        for symbol, s in self.state.items():
+            if s.last_poll is None:
+                queue.append((-math.inf, symbol))
+                continue
+            overdue = (now - s.last_poll) / s.interval
+            if overdue >= 1.0:
+                queue.append((-overdue * (1.0 + s.move_bps / MOVE_REF_BPS), symbol))
+        heapq.heapify(queue)
+
+        capacity = int(self.tokens * self.symbols_per_request)
+        picked = []
+        while queue and len(picked) < capacity:
+            _, symbol = heapq.heappop(queue)
+            picked.append(symbol)
+            s = self.state[symbol]
+            if s.last_poll is not None:
+                self.stats.max_overdue = max(self.stats.max_overdue, (now - s.last_poll) / s.interval)
+
+        requests = math.ceil(len(picked) / self.symbols_per_request)
+        self.tokens -= requests
+        self.stats.ticks += 1
+        self.stats.polled += len(picked)
+        self.stats.requests += requests
+        self.stats.deferred += len(queue)
+        return picked
+
+    def observe(self, symbol: str, price: float, now: float) -> None:
+        """
+        Record a fetched quote and resize the symbol's interval.
+        """
+        s = self.state.get(symbol)
+        if s is None:
+            return
+        if s.last_price and price is not None:
+            if price != s.last_price:
+                move = abs(price / s.last_price - 1.0) * 1e4
+                s.move_bps += EWMA_ALPHA * (move - s.move_bps)
+                interval = s.interval / (SPEEDUP * (1.0 + s.move_bps / MOVE_REF_BPS))
+            else:
+                interval = s.interval * SLOWDOWN
+            s.interval = min(self.max_seconds, max(self.min_seconds, interval))
+        s.last_poll = now
+        s.last_price = price
+
+    def summary(self) -> str:
+        intervals = sorted(s.interval for s in self.state.values())
+        st = self.stats
+        at_min = sum(1 for i in intervals if i <= self.min_seconds)
+        at_max = sum(1 for i in intervals if i >= self.max_seconds)
+        return (
+            f"symbols={len(intervals)}, interval_s(min={intervals[0]:.1f}, "
+            f"median={intervals[len(intervals) // 2]:.1f}, max={intervals[-1]:.1f}), "
+            f"at_min={at_min}, at_max={at_max}, polled/tick={st.polled / max(st.ticks, 1):.1f}, "
+            f"requests={st.requests:.0f}, deferred={st.deferred}, max_overdue={st.max_overdue:.1f}x"
+        )
@@ -0,0 +1,296 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+
+YAHOO_QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+
+
+############################
+# Quote sources
+############################
+
+class YFinanceQuoteSource:
+    """
+    Quote source backed by yfinance.
+
+    get_quote() returns the fast_info dict for one symbol (one or more HTTP
+    round trips per symbol). get_quotes() asks Yahoo's multi-symbol quote
+    endpoint for a whole chunk in one request, using yfinance's shared
+    session so cookies/crumb are handled the same way as Ticker calls.
+
+    yfinance (and pandas with it, about half a second) is imported on the
+    first request rather than at worker start, and a symbol's Ticker is
+    built the first time it's fetched one by one; batch mode never needs
+    one.
+    """
+
+    name = "yfinance"
+
+    def __init__(self):
+        # Reused across ticks
+        self.tickers = {}
+
+    def ticker(self, symbol: str):
+        ticker = self.tickers.get(symbol)
+        if ticker is None:
+            import yfinance as yf
+            ticker = self.tickers[symbol] = yf.Ticker(symbol)
+        return ticker
+
+    def get_quote(self, symbol: str) -> dict:
+        return dict(getattr(self.ticker(symbol), "fast_info", {}) or {})
+
+    def get_info(self, symbol: str) -> dict:
+        return self.ticker(symbol).info or {}
+
+    def get_quotes(self, symbols: list[str]) -> dict[str, dict]:
+        from yfinance.data import YfData
+
+        data = YfData().get_raw_json(
+            YAHOO_QUOTE_URL,
+            params={"symbols": ",".join(symbols), "formatted": "false"},
+        )
+        results = (data.get("quoteResponse") or {}).get("result") or []
+        wanted = set(symbols)
+        return {q["symbol"]: q for q in results if q.get("symbol") in wanted}
+
+
+class FakeQuoteSource:
+    """
+    Local stand-in for yfinance: a random walk per symbol, returned in the
+    same fast_info shape, with optional per-call latency. Used for local runs
+    and benchmarks so nothing talks to Yahoo.
+
+    Symbols in batch_misses are left out of get_quotes() responses, to
+    exercise the per-symbol fallback.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        jitter_seconds: float = 0.0,
+        seed: int | None = None,
+        batch_misses: set[str] | None = None,
+    ):
+        self.latency_seconds = latency_seconds
+        self.batch_misses = batch_misses or set()
+        self.jitter_seconds = jitter_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.state: dict[str, dict] = {}
+
+    def _initial_state(self, symbol: str) -> dict:
+        price = round(self.rng.uniform(10, 500), 2)
+        return {
+            "lastPrice": price,
+            "lastVolume": 0,
+            "open": price,
+            "dayHigh": price,
+            "dayLow": price,
+            "previousClose": price,
+        }
+
+    def _delay(self) -> float:
+        return self.latency_seconds + self.rng.uniform(0, self.jitter_seconds)
+
+    def _next_quote(self, symbol: str) -> dict:
+        state = self.state.get(symbol)
+        if state is None:
+            state = self.state[symbol] = self._initial_state(symbol)
+
+        price = round(state["lastPrice"] * (1 + self.rng.gauss(0, 0.0005)), 4)
+        state["lastPrice"] = price
+        state["lastVolume"] += self.rng.randint(0, 5000)
+        state["dayHigh"] = max(state["dayHigh"], price)
+        state["dayLow"] = min(state["dayLow"], price)
+        return dict(state)
+
+    def get_quote(self, symbol: str) -> dict:
+        with self.lock:
+            delay = self._delay()
+            quote = self._next_quote(symbol)
+
+        if delay > 0:
+            time.sleep(delay)
+        return quote
+
+    def get_info(self, symbol: str) -> dict:
+        with self.lock:
+            delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+        return {"exchange": "FAKE", "currency": "USD", "shortName": f"{symbol} (fake)"}
+
+    def get_quotes(self, symbols: list[str]) -> dict[str, dict]:
+        with self.lock:
+            delay = self._delay()
+            quotes = {
+                symbol: self._next_quote(symbol)
+                for symbol in symbols
+                if symbol not in self.batch_misses
+            }
+
+        if delay > 0:
+            time.sleep(delay)
+        return quotes
+
+
+############################
+# Concurrent / batched fetch with per-tick deadline
+############################
+
+@dataclass
+class FetchResult:
+    quotes: dict[str, dict] = field(default_factory=dict)
+    late: list[str] = field(default_factory=list)
+    errors: dict[str, Exception] = field(default_factory=dict)
+    # Symbols the batch call didn't return, fetched one by one instead
+    fallback: list[str] = field(default_factory=list)
+    batch_errors: list[Exception] = field(default_factory=list)
+
+
+class ConcurrentFetcher:
+    """
+    Fetch quotes for many symbols on a bounded thread pool.
+
+    A tick waits at most deadline_seconds. Symbols still outstanding are
+    reported as late; their request keeps its pool slot until it returns and
+    the symbol is not resubmitted meanwhile, so one slow symbol can't pile up
+    requests or stall later ticks.
+
+    With batch_size > 0 and a source that has get_quotes(), symbols are
+    first requested in chunks of batch_size (one request per chunk); only
+    the symbols a chunk didn't return go through the per-symbol path.
+
+    With `metrics` (metrics.Metrics), every request's duration is recorded
+    as fetch_batch_ms / fetch_symbol_ms, each tick's as fetch_tick_ms.
+    """
+
+    def __init__(self, source, max_workers: int, deadline_seconds: float, metrics=None):
+        self.source = source
+        self.metrics = metrics
+        self.deadline_seconds = deadline_seconds
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix="quote",
+        )
+        # symbol -> the request (batch or single) it is waiting on
+        self.in_flight: dict[str, Future] = {}
+        self.late_total = 0
+
+    def fetch(self, symbols: list[str], batch_size: int = 0) -> FetchResult:
+        result = FetchResult()
+        start = time.monotonic()
+        deadline = start + self.deadline_seconds
+
+        if batch_size > 0 and hasattr(self.source, "get_quotes"):
+            symbols = self._fetch_batches(symbols, batch_size, deadline, result)
+            result.fallback = list(symbols)
+
+        self._fetch_each(symbols, deadline, result)
+        self.late_total += len(result.late)
+        if self.metrics is not None:
+            self.metrics.observe("fetch_tick_ms", (time.monotonic() - start) * 1000)
+            self.metrics.incr("fetch_quotes", len(result.quotes))
+            self.metrics.incr("fetch_late", len(result.late))
+            self.metrics.incr("fetch_errors", len(result.errors) + len(result.batch_errors))
+            self.metrics.incr("fetch_fallback", len(result.fallback))
+        return result
+
+    def _timed(self, name: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.metrics.observe(name, (time.perf_counter() - start) * 1000)
+
+    def _outstanding(self, symbol: str) -> bool:
+        future = self.in_flight.get(symbol)
+        return future is not None and not future.done()
+
+    def _submit(self, symbols: list[str], name: str, fn, *args) -> Future:
+        if self.metrics is not None:
+            future = self.executor.submit(self._timed, name, fn, *args)
+        else:
+            future = self.executor.submit(fn, *args)
+        for symbol in symbols:
+            self.in_flight[symbol] = future
+        return future
+
+    def _wait(self, futures: dict[Future, list[str]], deadline: float):
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for future in done:
+            for symbol in futures[future]:
+                if self.in_flight.get(symbol) is future:
+                    del self.in_flight[symbol]
+        return done, not_done
+
+    def _fetch_batches(
+        self,
+        symbols: list[str],
+        batch_size: int,
+        deadline: float,
+        result: FetchResult,
+    ) -> list[str]:
+        """
+        Fetch symbols chunk by chunk; return the symbols left for the
+        per-symbol fallback. Symbols still waiting on an earlier tick's
+        request are late and left out of the chunks.
+        """
+        ready = []
+        for symbol in symbols:
+            if self._outstanding(symbol):
+                result.late.append(symbol)
+            else:
+                ready.append(symbol)
+
+        futures: dict[Future, list[str]] = {}
+        for i in range(0, len(ready), batch_size):
+            chunk = ready[i:i + batch_size]
+            futures[self._submit(chunk, "fetch_batch_ms", self.source.get_quotes, chunk)] = chunk
+
+        done, not_done = self._wait(futures, deadline)
+
+        missing: list[str] = []
+        for future in done:
+            chunk = futures[future]
+            try:
+                quotes = future.result()
+            except Exception as e:
+                result.batch_errors.append(e)
+                quotes = {}
+            result.quotes.update(quotes)
+            missing.extend(symbol for symbol in chunk if symbol not in quotes)
+
+        for future in not_done:
+            result.late.extend(futures[future])
+
+        return missing
+
+    def _fetch_each(self, symbols: list[str], deadline: float, result: FetchResult) -> None:
+        futures: dict[Future, list[str]] = {}
+        for symbol in symbols:
+            if self._outstanding(symbol):
+                # Still waiting on last tick's request
+                result.late.append(symbol)
+                continue
+            futures[self._submit([symbol], "fetch_symbol_ms", self.source.get_quote, symbol)] = [symbol]
+
+        done, not_done = self._wait(futures, deadline)
+
+        for future in done:
+            symbol = futures[future][0]
+            try:
+                result.quotes[symbol] = future.result()
+            except Exception as e:
+                result.errors[symbol] = e
+
+        result.late.extend(futures[future][0] for future in not_done)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,133 @@
+import math
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    errors: int = 0
+    # slots skipped because the previous run (or another job) overran
+    missed: int = 0
+    # runs that took longer than the job's period
+    overruns: int = 0
+    last_duration: float = 0.0
+    max_duration: float = 0.0
+    # how late a run started relative to its grid slot
+    last_jitter: float = 0.0
+    max_jitter: float = 0.0
+    total_jitter: float = 0.0
+
+    def summary(self) -> str:
+        avg_jitter = self.total_jitter / self.runs if self.runs else 0.0
+        return (
+            f"runs={self.runs}, errors={self.errors}, missed={self.missed}, "
+            f"overruns={self.overruns}, "
+            f"jitter_ms(avg={avg_jitter * 1000:.1f}, max={self.max_jitter * 1000:.1f}), "
+            f"duration_ms(last={self.last_duration * 1000:.1f}, max={self.max_duration * 1000:.1f})"
+        )
+
+
+@dataclass
+class Job:
+    name: str
+    period: float
+    fn: object
+    offset: float = 0.0
+    next_run: float = 0.0
+    stats: JobStats = field(default_factory=JobStats)
+
+
+class TickScheduler:
+    """
+    Run jobs on a fixed wall-clock grid (e.g. every 3 s at :00, :03, :06 ...).
+
+    The next slot is always computed from the grid, not from when the last
+    run finished, so fetch/flush time doesn't stretch the period. If a run
+    overruns one or more slots, those slots are skipped and counted as
+    missed instead of being run back to back.
+
+    With `metrics`, every run records scheduler_<job>_jitter_ms and
+    scheduler_<job>_ms, and missed slots, overruns and errors are counted
+    as scheduler_<job>_missed / _overruns / _errors when they happen.
+    """
+
+    def __init__(self, log=print, clock=time.time, sleep=time.sleep, metrics=None):
+        self.log = log
+        self.clock = clock
+        self.sleep = sleep
+        self.metrics = metrics
+        self.jobs: list[Job] = []
+        self.stopped = False
+
+    def add(self, name: str, period: float, fn, offset: float = 0.0) -> Job:
+        now = self.clock()
+        job = Job(name=name, period=period, fn=fn, offset=offset)
+        job.next_run = math.ceil((now - offset) / period) * period + offset
+        self.jobs.append(job)
+        return job
+
+    def run_pending(self) -> None:
+        for job in sorted(self.jobs, key=lambda j: j.next_run):
+            if self.clock() >= job.next_run:
+                self._run(job)
+
+    def _run(self, job: Job) -> None:
+        scheduled = job.next_run
+        start = self.clock()
+        failed = False
+        try:
+            job.fn()
+        except Exception as e:
+            job.stats.errors += 1
+            failed = True
+            self.log(f"Error in scheduled job {job.name}: {e}")
+        end = self.clock()
+
+        stats = job.stats
+        stats.runs += 1
+        stats.last_jitter = start - scheduled
+        stats.max_jitter = max(stats.max_jitter, stats.last_jitter)
+        stats.total_jitter += stats.last_jitter
+        stats.last_duration = end - start
+        stats.max_duration = max(stats.max_duration, stats.last_duration)
+        overran = stats.last_duration > job.period
+        if overran:
+            stats.overruns += 1
+
+        # Next slot on the grid strictly after now; anything in between is missed
+        slots = math.floor((end - scheduled) / job.period) + 1
+        stats.missed += slots - 1
+        job.next_run = scheduled + slots * job.period
+
+        if self.metrics is not None:
+            self._record(job.name, stats, slots - 1, overran, failed)
+
+    def _record(self, name: str, stats: JobStats, missed: int, overran: bool, failed: bool) -> None:
+        prefix = f"scheduler_{name}"
+        self.metrics.observe(f"{prefix}_jitter_ms", stats.last_jitter * 1000)
+        self.metrics.observe(f"{prefix}_ms", stats.last_duration * 1000)
+        if missed:
+            self.metrics.incr(f"{prefix}_missed", missed)
+        if overran:
+            self.metrics.incr(f"{prefix}_overruns")
+        if failed:
+            self.metrics.incr(f"{prefix}_errors")
+
+    def run_forever(self) -> None:
+        """
+        Run until stop() is called (e.g. from a signal handler); returns
+        after the sleep in progress, i.e. within one period of the fastest job.
+        """
+        while not self.stopped:
+            self.run_pending()
+            next_run = min(job.next_run for job in self.jobs)
+            delay = next_run - self.clock()
+            if delay > 0 and not self.stopped:
+                self.sleep(delay)
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def summary(self) -> str:
+        return "; ".join(f"{job.name}: {job.stats.summary()}" for job in self.jobs)
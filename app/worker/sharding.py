@@ -0,0 +1,45 @@
+"""
+Symbol partitioning for a fleet of workers.
+
+Each worker task gets SHARD_INDEX / SHARD_COUNT and keeps the symbols the
+hash ring assigns to it. The ring places VNODES points per shard, so
+going from N to N + 1 shards moves only ~1/(N + 1) of the symbols, and
+every process computes the same assignment without talking to the others
+(blake2b, not Python's per-process salted hash()).
+"""
+import bisect
+import hashlib
+
+VNODES = 128
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, shard_count: int, vnodes: int = VNODES):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.shard_count = shard_count
+        points = sorted(
+            (_hash(f"shard-{shard}#{v}"), shard)
+            for shard in range(shard_count)
+            for v in range(vnodes)
+        )
+        self._keys = [p for p, _ in points]
+        self._shards = [s for _, s in points]
+
+    def owner(self, symbol: str) -> int:
+        i = bisect.bisect(self._keys, _hash(symbol)) % len(self._keys)
+        return self._shards[i]
+
+
+def shard_symbols(symbols: list[str], shard_index: int, shard_count: int) -> list[str]:
+    """
+    The symbols shard `shard_index` of `shard_count` owns, in input order.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard index {shard_index} out of range for {shard_count} shards")
+    ring = HashRing(shard_count)
+    return [s for s in symbols if ring.owner(s) == shard_index]
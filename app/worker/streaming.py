@@ -0,0 +1,149 @@
+"""
+Push-based quote ingestion from Yahoo's streaming WebSocket.
+
+QuoteStream keeps a yf.WebSocket subscribed to the shard's symbols on a
+background thread and queues every pushed quote; the worker drains the
+queue several times a second and feeds the rows through the same path as
+polled ones (WAL, tick buffer, minute bars). Quotes arrive as soon as
+Yahoo publishes them, one message per change, instead of one request per
+symbol (or batch) every few seconds.
+
+When the connection drops (or can't be opened) `live` is cleared, the
+worker goes back to polling, and the thread reconnects with exponential
+backoff. A connection that goes quiet without closing is caught by the
+websockets client's keepalive pings.
+
+The URL is configurable so tests can point it at a local server that
+replays recorded messages (test/demo_stream.py).
+"""
+import threading
+import time
+
+STREAM_SOURCE_NAME = "yfinance-ws"
+YAHOO_STREAM_URL = "wss://streamer.finance.yahoo.com/?version=2"
+
+
+def message_to_quote(message: dict) -> tuple[str, float, dict] | None:
+    """
+    (symbol, epoch seconds, fast_info-style quote dict) for a decoded
+    PricingData message, or None if it carries no price. int64 fields
+    arrive as strings.
+    """
+    symbol = message.get("id")
+    price = message.get("price")
+    if not symbol or price is None:
+        return None
+    try:
+        ts = int(message["time"]) / 1000
+    except (KeyError, ValueError):
+        ts = time.time()
+    quote = {
+        "last_price": price,
+        "open": message.get("open_price"),
+        "day_high": message.get("day_high"),
+        "day_low": message.get("day_low"),
+        "previous_close": message.get("previous_close"),
+    }
+    if message.get("day_volume") is not None:
+        quote["volume"] = int(message["day_volume"])
+    return symbol, ts, quote
+
+
+class QuoteStream:
+    def __init__(
+        self,
+        symbols: list[str],
+        url: str = YAHOO_STREAM_URL,
+        log=print,
+        reconnect_max_seconds: float = 30.0,
+    ):
+        self.symbols = list(symbols)
+        self.url = url
+        self.log = log
+        self.reconnect_max_seconds = reconnect_max_seconds
+
+        self.lock = threading.Lock()
+        self.pending: list[tuple[str, float, dict]] = []
+        self.live = threading.Event()
+        self.stopped = threading.Event()
+        self.ws = None
+        self.backoff = 1.0
+        self.thread = threading.Thread(target=self._run, name="quote-stream", daemon=True)
+
+        self.messages = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        ws = self.ws
+        if ws is not None:
+            ws.close()
+        self.thread.join(timeout=5)
+
+    def drain(self) -> list[tuple[str, float, dict]]:
+        """
+        Quotes received since the last call, in arrival order.
+        """
+        with self.lock:
+            quotes, self.pending = self.pending, []
+        return quotes
+
+    def _on_message(self, message: dict) -> None:
+        # Raising here would end yf's listen loop, so bad messages are dropped
+        try:
+            quote = message_to_quote(message)
+        except Exception as e:
+            self.log(f"Dropping malformed stream message: {e}")
+            return
+        if quote is None:
+            return
+        with self.lock:
+            self.pending.append(quote)
+            self.messages += 1
+        if not self.live.is_set():
+            # Only a connection that delivers counts as up
+            self.connects += 1
+            self.live.set()
+            self.backoff = 1.0
+            self.log(f"Quote stream live from {self.url}, {len(self.symbols)} symbols")
+
+    def _run(self) -> None:
+        # Imported here so polling-only workers never load yfinance for it
+        import yfinance as yf
+
+        while not self.stopped.is_set():
+            try:
+                self.ws = yf.WebSocket(url=self.url, verbose=False)
+                self.ws.subscribe(self.symbols)
+                # Returns (or raises) when the connection closes
+                self.ws.listen(self._on_message)
+            except Exception as e:
+                if not self.stopped.is_set():
+                    self.log(f"Quote stream error: {e}")
+            finally:
+                was_live = self.live.is_set()
+                self.live.clear()
+                if self.ws is not None:
+                    try:
+                        self.ws.close()
+                    except Exception:
+                        pass
+                    self.ws = None
+
+            if self.stopped.is_set():
+                break
+            if was_live:
+                self.disconnects += 1
+            self.log(f"Quote stream down, polling until reconnect in {self.backoff:.0f}s")
+            self.stopped.wait(self.backoff)
+            self.backoff = min(self.backoff * 2, self.reconnect_max_seconds)
+
+    def summary(self) -> str:
+        return (
+            f"live={self.live.is_set()}, messages={self.messages}, "
+            f"connects={self.connects}, disconnects={self.disconnects}"
+        )
@@ -0,0 +1,116 @@
+from array import array
+
+import numpy as np
+import pyarrow as pa
+
+from parquet_sink import ROW_SCHEMA
+
+
+# Sentinels for a missing volume / repeats count in the integer columns
+NO_VOLUME = -1
+NO_REPEATS = -1
+
+FLOAT_FIELDS = ("price", "open", "day_high", "day_low", "previous_close")
+
+
+class TickBuffer:
+    """
+    Column-oriented buffer for ticks between S3 flushes.
+
+    Instead of one 13-key dict per tick, every numeric field lives in a typed
+    array, symbols and timestamps are stored once and referenced by integer
+    id, and the static metadata (exchange, currency, short_name) is only
+    joined in when the batch is turned into an Arrow table at flush time.
+    Missing floats are stored as NaN and missing volumes / repeats as
+    NO_VOLUME / NO_REPEATS; all come back as nulls.
+    """
+
+    def __init__(self):
+        self.symbols: list[str] = []
+        self.symbol_ids: dict[str, int] = {}
+        self.timestamps: list[str] = []
+        self.sources: list[str] = []
+        self.source_ids: dict[str, int] = {}
+
+        self.symbol_col = array("i")
+        self.ts_col = array("i")
+        self.source_col = array("b")
+        self.volume_col = array("q")
+        self.repeats_col = array("i")
+        self.float_cols = {name: array("d") for name in FLOAT_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.symbol_col)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def _intern(self, value: str, values: list[str], ids: dict[str, int]) -> int:
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(values)
+            values.append(value)
+        return idx
+
+    def append(self, row: dict) -> None:
+        ts = row["timestamp"]
+        # Rows of one tick share a timestamp, so only compare with the last one
+        if not self.timestamps or self.timestamps[-1] != ts:
+            self.timestamps.append(ts)
+
+        self.symbol_col.append(self._intern(row["symbol"], self.symbols, self.symbol_ids))
+        self.ts_col.append(len(self.timestamps) - 1)
+        self.source_col.append(self._intern(row["source"], self.sources, self.source_ids))
+
+        volume = row.get("volume")
+        self.volume_col.append(NO_VOLUME if volume is None else int(volume))
+        repeats = row.get("repeats")
+        self.repeats_col.append(NO_REPEATS if repeats is None else repeats)
+        for name, col in self.float_cols.items():
+            value = row.get(name)
+            col.append(float("nan") if value is None else float(value))
+
+    def extend(self, rows: list[dict]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the column arrays (excluding the small
+        symbol / timestamp dictionaries).
+        """
+        cols = [self.symbol_col, self.ts_col, self.source_col, self.volume_col, self.repeats_col]
+        cols.extend(self.float_cols.values())
+        return sum(col.itemsize * len(col) for col in cols)
+
+    def to_table(self, metadata: dict[str, dict]) -> pa.Table:
+        """
+        Build an Arrow table in ROW_SCHEMA, joining metadata per symbol.
+        """
+        symbol_idx = pa.array(np.frombuffer(self.symbol_col, dtype=np.int32))
+
+        def decode(values: list[str], idx_col: array, dtype) -> pa.Array:
+            indices = pa.array(np.frombuffer(idx_col, dtype=dtype))
+            return pa.DictionaryArray.from_arrays(indices, pa.array(values, pa.string())).dictionary_decode()
+
+        def meta_col(key: str) -> pa.Array:
+            values = [metadata.get(symbol, {}).get(key) for symbol in self.symbols]
+            return pa.array(values, pa.string()).take(symbol_idx)
+
+        volume = np.frombuffer(self.volume_col, dtype=np.int64)
+        repeats = np.frombuffer(self.repeats_col, dtype=np.int32)
+
+        columns = {
+            "symbol": decode(self.symbols, self.symbol_col, np.int32),
+            "timestamp": decode(self.timestamps, self.ts_col, np.int32),
+            "volume": pa.array(volume, mask=volume == NO_VOLUME),
+            "exchange": meta_col("exchange"),
+            "currency": meta_col("currency"),
+            "short_name": meta_col("short_name"),
+            "source": decode(self.sources, self.source_col, np.int8),
+            "repeats": pa.array(repeats, mask=repeats == NO_REPEATS),
+        }
+        for name, col in self.float_cols.items():
+            columns[name] = pa.array(np.frombuffer(col, dtype=np.float64), from_pandas=True)
+
+        return pa.table([columns[field.name] for field in ROW_SCHEMA], schema=ROW_SCHEMA)
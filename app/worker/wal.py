@@ -0,0 +1,270 @@
+"""
+Write-ahead log for polled ticks.
+
+Every poll's rows are appended to the log before they reach the tick
+buffer or MINUTE_STATE, as one record per poll: a whole batch of symbols
+costs one write and one fsync (group commit), not one per tick.
+
+The log is split into segments, one per S3 flush:
+
+    <dir>/<n>.wal   ticks of a buffer not yet uploaded to S3
+    <dir>/<n>.up    uploaded, kept while its minutes aren't in DynamoDB yet
+    <dir>/minutes.ack   per symbol, the epoch second before which its
+                        ticks are in DynamoDB (the start of its open
+                        minute), plus a floor for every other symbol
+    <dir>/minutes.dead  minute items the writer gave up on (see
+                        ddb_writer.py), one JSON line per batch, for a
+                        manual re-drive
+
+Minute flushes are acknowledged in the order they were submitted: the
+watermark only advances through the oldest flush not yet written, so a
+failed flush keeps its ticks (and every later one's) for the next replay.
+The writer retries a failed flush until it is written or dead-lettered,
+so the watermark is held back for the length of an outage, not for good.
+
+A segment is deleted once it is uploaded and all its ticks are older than
+the floor. replay() streams back the ticks still needed, one record at a
+time: the unuploaded ones for the tick buffer and, per symbol, those from
+its open minute on for the minute bars. A record cut short by a crash (bad length or CRC) ends its
+segment; everything before it is kept.
+
+Record: 4-byte length | 4-byte CRC32 | JSON list of rows
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+
+HEADER = struct.Struct("<II")
+ACK_NAME = "minutes.ack"
+DEAD_LETTER_NAME = "minutes.dead"
+
+
+@dataclass
+class WalReplay:
+    buffer_ticks: int = 0
+    minute_ticks: int = 0
+    segments: int = 0
+    records: int = 0
+    torn: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class MinuteFlush:
+    open_minutes: dict[str, float]
+    floor: float
+    done: bool = False
+
+
+def row_epoch(row: dict) -> float:
+    return datetime.fromisoformat(row["timestamp"]).timestamp()
+
+
+class TickWal:
+    def __init__(self, directory: str, log=print, fsync: bool = True):
+        self.directory = directory
+        self.log = log
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # segment -> newest tick (epoch seconds) in it
+        self.max_ts: dict[int, float] = {}
+        self.uploaded: set[int] = set()
+        # Segments whose ticks are in the current tick buffer
+        self.pending: list[int] = []
+        self.minutes_acked, self.minutes_floor = self._read_ack()
+        # Minute flushes submitted but not yet through, oldest first
+        self.minute_flushes: deque[MinuteFlush] = deque()
+
+        self.segment = max(self._segments(), default=0) + 1
+        self.file = None
+
+    def _path(self, segment: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{segment:010d}.{suffix}")
+
+    def _segments(self) -> dict[int, str]:
+        found = {}
+        for name in os.listdir(self.directory):
+            stem, _, suffix = name.partition(".")
+            if suffix in ("wal", "up") and stem.isdigit():
+                found[int(stem)] = suffix
+        return found
+
+    def _read_ack(self) -> tuple[dict[str, float], float]:
+        try:
+            with open(os.path.join(self.directory, ACK_NAME)) as f:
+                ack = json.load(f)
+        except FileNotFoundError:
+            return {}, 0.0
+        return ack["symbols"], ack["floor"]
+
+    def _write_ack(self) -> None:
+        tmp = os.path.join(self.directory, f".{ACK_NAME}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"floor": self.minutes_floor, "symbols": self.minutes_acked}, f)
+        os.replace(tmp, os.path.join(self.directory, ACK_NAME))
+
+    def _read_segment(self, path: str, replay: WalReplay):
+        pos = 0
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    torn = bool(header)
+                    break
+                length, crc = HEADER.unpack(header)
+                # a torn length can be anything; don't read past the file
+                payload = f.read(length) if pos + HEADER.size + length <= size else b""
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    torn = True
+                    break
+                pos += HEADER.size + length
+                replay.records += 1
+                yield json.loads(payload)
+        if torn:
+            # torn tail from a crash mid-append: drop it so appends stay aligned
+            replay.torn += 1
+            with open(path, "r+b") as f:
+                f.truncate(pos)
+
+    def replay(self, restore_buffer, restore_minutes) -> WalReplay:
+        """
+        Stream the ticks to restore on startup, one record at a time:
+        `restore_buffer(rows)` gets the unuploaded ones, `restore_minutes(rows)`
+        those of minutes not yet in DynamoDB. Nothing is collected here, so
+        a log that is hours behind costs one record of memory beyond what
+        the callbacks keep. Call once, before the first append().
+        """
+        start = time.perf_counter()
+        replay = WalReplay()
+        # What the previous process had acked; flushes submitted by the
+        # callbacks move the live watermark while we read
+        acked, floor = dict(self.minutes_acked), self.minutes_floor
+        for segment, suffix in sorted(self._segments().items()):
+            replay.segments += 1
+            newest = 0.0
+            for rows in self._read_segment(self._path(segment, suffix), replay):
+                if not rows:
+                    continue
+                minute_rows = []
+                for row in rows:
+                    ts = row_epoch(row)
+                    newest = max(newest, ts)
+                    if ts >= acked.get(row["symbol"], floor):
+                        minute_rows.append(row)
+                if suffix == "wal":
+                    replay.buffer_ticks += len(rows)
+                    restore_buffer(rows)
+                if minute_rows:
+                    replay.minute_ticks += len(minute_rows)
+                    restore_minutes(minute_rows)
+            with self.lock:
+                self.max_ts[segment] = newest
+                if suffix == "up":
+                    self.uploaded.add(segment)
+                else:
+                    self.pending.append(segment)
+        replay.seconds = time.perf_counter() - start
+        return replay
+
+    def append(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        payload = json.dumps(rows, separators=(",", ":")).encode()
+        newest = max(row_epoch(row) for row in rows)
+        with self.lock:
+            if self.file is None:
+                self.file = open(self._path(self.segment, "wal"), "ab")
+                self.pending.append(self.segment)
+            self.file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+            self.file.write(payload)
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.max_ts[self.segment] = max(self.max_ts.get(self.segment, 0.0), newest)
+
+    def rotate(self) -> list[int]:
+        """
+        Seal the open segment at a buffer flush. Returns the segments whose
+        ticks that buffer holds, to pass to ack_uploaded().
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                self.segment += 1
+            sealed, self.pending = self.pending, []
+            return sealed
+
+    def ack_uploaded(self, segments: list[int]) -> None:
+        with self.lock:
+            for segment in segments:
+                path = self._path(segment, "wal")
+                if os.path.exists(path):
+                    os.replace(path, self._path(segment, "up"))
+                self.uploaded.add(segment)
+            self._truncate()
+
+    def minutes_flush(self, open_minutes: dict[str, float], floor: float):
+        """
+        Register a flush of the minutes closed so far, in submit order.
+        Returns the callable to run once all of it is in DynamoDB: every
+        tick of a symbol before its `open_minutes` start (or before `floor`
+        for symbols not in it). Segments are truncated by `floor` alone.
+        """
+        flush = MinuteFlush(dict(open_minutes), floor)
+        with self.lock:
+            self.minute_flushes.append(flush)
+        return lambda: self._ack_minutes(flush)
+
+    def _ack_minutes(self, flush: MinuteFlush) -> None:
+        with self.lock:
+            flush.done = True
+            acked = None
+            while self.minute_flushes and self.minute_flushes[0].done:
+                acked = self.minute_flushes.popleft()
+            if acked is None:
+                return
+            self.minutes_acked = acked.open_minutes
+            self.minutes_floor = max(self.minutes_floor, acked.floor)
+            self._write_ack()
+            self._truncate()
+
+    def dead_letter(self, items: list[dict], reason: str) -> None:
+        """
+        Record minute items that will not be written, so acking their
+        flush doesn't lose them without a trace.
+        """
+        line = json.dumps({"time": time.time(), "reason": reason, "items": items},
+                          separators=(",", ":"), default=str)
+        with self.lock, open(os.path.join(self.directory, DEAD_LETTER_NAME), "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _truncate(self) -> None:
+        for segment in sorted(self.uploaded):
+            if self.max_ts.get(segment, 0.0) >= self.minutes_floor:
+                continue
+            try:
+                os.remove(self._path(segment, "up"))
+            except FileNotFoundError:
+                pass
+            self.uploaded.discard(segment)
+            self.max_ts.pop(segment, None)
+
+    def size(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory)
+            if name.endswith((".wal", ".up"))
+        )
@@ -58,6 +58,8 @@ resource "aws_iam_role_policy" "ecs_task_s3_policy" {
                 Effect = "Allow"
                 Action = [
                   "s3:PutObject",
+                  "s3:GetObject",
+                  "s3:DeleteObject",
                   "s3:AbortMultipartUpload",
                   "s3:ListBucket"
                 ]
@@ -86,6 +88,8 @@ resource "aws_iam_role_policy" "ecs_task_ddb_policy" {
                 Effect = "Allow"
                 Action = [
                     "dynamodb:PutItem",
+                    "dynamodb:BatchWriteItem",
+                    "dynamodb:BatchGetItem",
                     "dynamodb:DescribeTable"
                 ]
                 Resource = aws_dynamodb_table.intraday.arn
@@ -142,6 +146,48 @@ resource "aws_security_group" "worker_sg" {
     }
 }
 
+############################
+# EFS for the worker's write-ahead log
+############################
+
+# Fargate task storage is gone when the task is replaced, so the WAL
+# (app/worker/wal.py) lives on EFS; each shard uses its own directory
+resource "aws_efs_file_system" "worker_wal" {
+    creation_token   = "${var.project_name}-worker-wal-${var.env}"
+    encrypted        = true
+    throughput_mode  = "elastic"
+
+    tags = {
+        Project = var.project_name
+        Env     = var.env
+    }
+}
+
+resource "aws_security_group" "worker_wal_sg" {
+    name            = "${var.project_name}-worker-wal-sg-${var.env}"
+    description   = "NFS from ECS worker tasks to the WAL file system"
+    vpc_id        = data.aws_vpc.default.id
+
+    ingress {
+        from_port       = 2049
+        to_port         = 2049
+        protocol        = "tcp"
+        security_groups = [aws_security_group.worker_sg.id]
+    }
+
+    tags = {
+        Project = var.project_name
+        Env     = var.env
+    }
+}
+
+resource "aws_efs_mount_target" "worker_wal" {
+    for_each        = toset(data.aws_subnets.default.ids)
+    file_system_id  = aws_efs_file_system.worker_wal.id
+    subnet_id       = each.value
+    security_groups = [aws_security_group.worker_wal_sg.id]
+}
+
 ############################
 # ECS Cluster
 ############################
@@ -159,8 +205,11 @@ resource "aws_ecs_cluster" "this" {
 # ECS Task Definition (Fargate)
 ############################
 
+# One task definition and service per shard (var.worker_shards); shard 0
+# keeps the original names so a single-shard setup is unchanged
 resource "aws_ecs_task_definition" "worker" {
-    family                         = "${var.project_name}-worker-${var.env}"
+    count                          = var.worker_shards
+    family                         = count.index == 0 ? "${var.project_name}-worker-${var.env}" : "${var.project_name}-worker-${var.env}-shard${count.index}"
     cpu                            = "256"
     memory                         = "512"
     network_mode                   = "awsvpc"
@@ -173,11 +222,23 @@ resource "aws_ecs_task_definition" "worker" {
         operating_system_family = "LINUX"
     }
 
+    volume {
+        name = "wal"
+
+        efs_volume_configuration {
+            file_system_id     = aws_efs_file_system.worker_wal.id
+            transit_encryption = "ENABLED"
+        }
+    }
+
     container_definitions = jsonencode([
         {
             name        = "worker"
             image       = "${aws_ecr_repository.worker.repository_url}:latest"
             essential   = true
+            # Fargate's maximum; the worker's SIGTERM handoff is bounded by
+            # SHUTDOWN_SECONDS (100 s by default) within it
+            stopTimeout = 120
             environment = [
                 {
                     name  = "S3_BUCKET"
@@ -194,6 +255,33 @@ resource "aws_ecs_task_definition" "worker" {
                 {
                     name  = "INTRADAY_TTL_DAYS"
                     value = "60"
+                },
+                {
+                    name  = "SHARD_INDEX"
+                    value = tostring(count.index)
+                },
+                {
+                    name  = "SHARD_COUNT"
+                    value = tostring(var.worker_shards)
+                },
+                {
+                    name  = "WAL_DIR"
+                    value = "/wal/shard-${count.index}"
+                },
+                {
+                    name  = "METRICS_NAMESPACE"
+                    value = var.project_name
+                },
+                {
+                    name  = "LOG_SAMPLE_RATE"
+                    value = "0.1"
+                }
+            ]
+            mountPoints = [
+                {
+                    sourceVolume  = "wal"
+                    containerPath = "/wal"
+                    readOnly      = false
                 }
             ]
             logConfiguration = {
@@ -218,12 +306,18 @@ resource "aws_ecs_task_definition" "worker" {
 ############################
 
 resource "aws_ecs_service" "worker" {
-    name            = "${var.project_name}-worker-service-${var.env}"
+    count           = var.worker_shards
+    name            = count.index == 0 ? "${var.project_name}-worker-service-${var.env}" : "${var.project_name}-worker-service-${var.env}-shard${count.index}"
     cluster         = aws_ecs_cluster.this.id
-    task_definition = aws_ecs_task_definition.worker.arn
+    task_definition = aws_ecs_task_definition.worker[count.index].arn
     desired_count   = 0         # start OFF by default
     launch_type     = "FARGATE"
 
+    # Stop the old task before starting its replacement, so a symbol never
+    # has two owners writing the same minute (see adopt_minutes() in main.py)
+    deployment_minimum_healthy_percent = 0
+    deployment_maximum_percent         = 100
+
     network_configuration {
         assign_public_ip = true
         subnets          = data.aws_subnets.default.ids
@@ -234,10 +328,21 @@ resource "aws_ecs_service" "worker" {
         ignore_changes = [desired_count] # we'll control this via Lambda/EventBridge later
     }
 
+    # Tasks can't mount the WAL volume before the mount targets exist
+    depends_on = [aws_efs_mount_target.worker_wal]
+
     tags = {
         Project = var.project_name
         Env     = var.env
     }
 }
 
+moved {
+    from = aws_ecs_task_definition.worker
+    to   = aws_ecs_task_definition.worker[0]
+}
 
+moved {
+    from = aws_ecs_service.worker
+    to   = aws_ecs_service.worker[0]
+}
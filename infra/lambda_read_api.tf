@@ -61,6 +61,21 @@ resource "aws_iam_role_policy" "lambda_read_policy" {
                     "dynamodb:DescribeTable"
                 ]
                 Resource = aws_dynamodb_table.intraday.arn
+            },
+            # Parquet lake for history ranges
+            {
+                Effect = "Allow"
+                Action = [
+                    "s3:ListBucket"
+                ]
+                Resource = aws_s3_bucket.stock_data.arn
+            },
+            {
+                Effect = "Allow"
+                Action = [
+                    "s3:GetObject"
+                ]
+                Resource = "${aws_s3_bucket.stock_data.arn}/*"
             }
         ]
     })
@@ -97,12 +112,16 @@ resource "aws_lambda_function" "read_prices" {
 
     handler = "handler.handler"
     runtime = "python3.11"
-    timeout = 5
+    timeout = 15
     memory_size = 256
+    layers  = var.read_prices_layers
 
     environment {
         variables = {
             DDB_INTRADAY_TABLE = aws_dynamodb_table.intraday.name
+            LAKE_URI           = "s3://${aws_s3_bucket.stock_data.bucket}"
+            METRICS_NAMESPACE  = var.project_name
+            LOG_SAMPLE_RATE    = "0.05"
         }
     }
 
@@ -92,8 +92,9 @@ resource "aws_lambda_function" "worker_switch" {
     environment {
         variables = {
             ECS_CLUSTER = aws_ecs_cluster.this.name
-            ECS_SERVICE = aws_ecs_service.worker.name
+            ECS_SERVICE = join(",", aws_ecs_service.worker[*].name)
             NOTIFY_TOPIC_ARN  = aws_sns_topic.worker_notifications.arn
+            METRICS_NAMESPACE = var.project_name
         }
     }
 
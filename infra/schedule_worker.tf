@@ -102,3 +102,75 @@ resource "aws_lambda_permission" "scheduler_off_invoke" {
     principal     = "scheduler.amazonaws.com"
     source_arn    = aws_scheduler_schedule.worker_off.arn
 }
+
+
+
+############################
+# Nightly compaction of the past year's Parquet files (Tue–Sat 02:00 ET)
+############################
+
+resource "aws_iam_role_policy" "scheduler_run_compaction" {
+    name = "${var.project_name}-scheduler-run-compaction-${var.env}"
+    role = aws_iam_role.scheduler_role.id
+
+    policy = jsonencode({
+        Version = "2012-10-17"
+        Statement = [
+            {
+                Effect = "Allow"
+                Action = [
+                    "ecs:RunTask"
+                ]
+                Resource = aws_ecs_task_definition.worker[0].arn
+            },
+            {
+                Effect = "Allow"
+                Action = [
+                    "iam:PassRole"
+                ]
+                Resource = aws_iam_role.ecs_task_role.arn
+            }
+        ]
+    })
+}
+
+resource "aws_scheduler_schedule" "compact_lake" {
+    name = "${var.project_name}-compact-lake-${var.env}"
+
+    flexible_time_window {
+        mode = "OFF"
+    }
+
+    schedule_expression_timezone = "America/New_York"
+    # 0 2 ? * TUE-SAT *  => 02:00 Tue-Sat. Each run covers the 366 days up
+    # to the trading day before, the span of the 3M/6M/1Y history ranges
+    # (history.py). The first run after deploy backfills the lake; after
+    # that a failed night is redone by the next one, and a day already
+    # compacted only costs a manifest read and a listing
+    schedule_expression = "cron(0 2 ? * TUE-SAT *)"
+
+    target {
+        arn      = aws_ecs_cluster.this.arn
+        role_arn = aws_iam_role.scheduler_role.arn
+
+        ecs_parameters {
+            task_definition_arn = aws_ecs_task_definition.worker[0].arn
+            launch_type         = "FARGATE"
+
+            network_configuration {
+                assign_public_ip = true
+                subnets          = data.aws_subnets.default.ids
+                security_groups  = [aws_security_group.worker_sg.id]
+            }
+        }
+
+        input = jsonencode({
+            containerOverrides = [
+                {
+                    name    = "worker"
+                    command = ["python", "compact.py", "--days", "366"]
+                }
+            ]
+        })
+    }
+}
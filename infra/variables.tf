@@ -35,4 +35,20 @@ variable "stock_symbols" {
     ]
 }
 
+# Number of worker shards; each runs as its own ECS service polling the
+# part of stock_symbols the hash ring assigns it. Change it while the
+# worker is off: stopped tasks write their open minutes, and the next
+# owner of a moved symbol merges the rest of that minute into it.
+variable "worker_shards" {
+    type    = number
+    default = 1
+}
 
+# Optional Lambda layers for read_prices, e.g. the AWS SDK for pandas layer
+# (arn:aws:lambda:<region>:336392948345:layer:AWSSDKPandas-Python311:<version>),
+# which provides numpy for the vectorized build_points() path and pyarrow for
+# the 3M / 6M / 1Y history ranges read from the Parquet lake
+variable "read_prices_layers" {
+    type    = list(string)
+    default = []
+}
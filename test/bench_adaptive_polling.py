@@ -0,0 +1,136 @@
+"""
+Simulate a trading session of symbols with very different activity
+(Poisson quote changes from several per second to none) and compare the
+fixed every-tick schedule with the adaptive poller: upstream requests per
+second and how long a quote change takes to be seen (detection lag), per
+activity class.
+
+    python test/bench_adaptive_polling.py --symbols 1000 --minutes 30
+"""
+import argparse
+import bisect
+import os
+import random
+import statistics
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+
+from polling import AdaptivePoller  # noqa: E402
+
+TICK_SECONDS = 3
+BATCH_SIZE = 50
+# (share of symbols, quote changes per second, typical move in bps)
+CLASSES = {
+    "active": (0.2, 0.5, 2.0),
+    "moderate": (0.3, 0.05, 4.0),
+    "quiet": (0.3, 0.002, 8.0),
+    "halted": (0.2, 0.0, 0.0),
+}
+
+
+def make_market(symbols: list[str], seconds: int, seed: int = 3):
+    """
+    Per symbol: its class, change times and the price after each change.
+    """
+    rng = random.Random(seed)
+    market = {}
+    start = 0
+    for name, (share, rate, move_bps) in CLASSES.items():
+        end = start + round(share * len(symbols))
+        for symbol in symbols[start:end]:
+            times, prices = [0.0], [100.0]
+            t = 0.0
+            while rate:
+                t += rng.expovariate(rate)
+                if t >= seconds:
+                    break
+                times.append(t)
+                step = max(0.01, round(prices[-1] * move_bps / 1e4 * rng.uniform(0.5, 1.5), 2))
+                prices.append(round(prices[-1] + rng.choice((-step, step)), 2))
+            market[symbol] = (name, times, prices)
+        start = end
+    return market
+
+
+def price_at(market, symbol: str, t: float) -> float:
+    _, times, prices = market[symbol]
+    return prices[bisect.bisect_right(times, t) - 1]
+
+
+def simulate(market, symbols: list[str], seconds: int, poller=None):
+    """
+    Returns (requests per second, {symbol: poll times}).
+    """
+    polls = {s: [] for s in symbols}
+    requests = 0
+    for tick in range(0, seconds, TICK_SECONDS):
+        now = float(tick)
+        due = poller.due(now) if poller else symbols
+        requests += -(-len(due) // BATCH_SIZE)
+        for symbol in due:
+            polls[symbol].append(now)
+            if poller:
+                poller.observe(symbol, price_at(market, symbol, now), now)
+    return requests / seconds, polls
+
+
+def lags(market, polls, seconds: int) -> dict[str, list[float]]:
+    """
+    Seconds from each quote change to the first poll after it, by class.
+    """
+    out = {name: [] for name in CLASSES}
+    for symbol, times in polls.items():
+        name, changes, _ = market[symbol]
+        for t in changes[1:]:
+            i = bisect.bisect_left(times, t)
+            out[name].append((times[i] if i < len(times) else seconds) - t)
+    return out
+
+
+def report(label: str, rps: float, by_class: dict[str, list[float]], polls) -> None:
+    every = [lag for values in by_class.values() for lag in values]
+    print(f"{label}: {rps:5.2f} req/s, {sum(map(len, polls.values())):7d} symbol polls, "
+          f"detection lag mean {statistics.mean(every):5.1f}s "
+          f"p95 {statistics.quantiles(every, n=20)[-1]:5.1f}s")
+    for name, values in by_class.items():
+        if values:
+            print(f"    {name:9s} {len(values):6d} changes, lag mean {statistics.mean(values):5.1f}s "
+                  f"p95 {statistics.quantiles(values, n=20)[-1]:5.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--minutes", type=int, default=30)
+    parser.add_argument("--min-seconds", type=float, default=3)
+    parser.add_argument("--max-seconds", type=float, default=60)
+    args = parser.parse_args()
+
+    seconds = args.minutes * 60
+    symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+    market = make_market(symbols, seconds)
+
+    fixed_rps, polls = simulate(market, symbols, seconds)
+    report(f"fixed, {args.symbols} symbols", fixed_rps, lags(market, polls, seconds), polls)
+
+    for budget in (fixed_rps / 2, fixed_rps / 4):
+        poller = AdaptivePoller(symbols, args.min_seconds, args.max_seconds, budget, BATCH_SIZE)
+        rps, polls = simulate(market, symbols, seconds, poller)
+        report(f"adaptive, {args.symbols} symbols, budget {budget:.2f} req/s", rps,
+               lags(market, polls, seconds), polls)
+        print(f"    {poller.summary()}")
+
+    # Same upstream load as the fixed schedule, for 3x the symbols
+    many = [f"SYM{i:04d}" for i in range(args.symbols * 3)]
+    market = make_market(many, seconds)
+    poller = AdaptivePoller(many, args.min_seconds, args.max_seconds, fixed_rps, BATCH_SIZE)
+    rps, polls = simulate(market, many, seconds, poller)
+    report(f"adaptive, {len(many)} symbols, budget {fixed_rps:.2f} req/s", rps,
+           lags(market, polls, seconds), polls)
+    print(f"    {poller.summary()}")
+
+
+if __name__ == "__main__":
+    main()
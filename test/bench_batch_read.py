@@ -0,0 +1,86 @@
+"""
+N single-symbol read_prices invocations vs one symbols=... invocation,
+against a moto table with a simulated per-query round trip.
+
+    python test/bench_batch_read.py --symbols 20 --rtt 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "lambdas", "read_prices"))
+
+TABLE = "bench-intraday"
+
+
+def seed(symbols: list[str], minutes: int) -> None:
+    table = boto3.resource("dynamodb").create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "symbol", "KeyType": "HASH"},
+            {"AttributeName": "ts", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "symbol", "AttributeType": "S"},
+            {"AttributeName": "ts", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    now = int(time.time()) // 60 * 60
+    with table.batch_writer() as batch:
+        for symbol in symbols:
+            for m in range(minutes):
+                batch.put_item(Item={"symbol": symbol, "ts": now - 60 * m, "price": Decimal("100.5")})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--minutes", type=int, default=390)
+    parser.add_argument("--rtt", type=float, default=0.05, help="simulated seconds per Query call")
+    args = parser.parse_args()
+
+    os.environ.update(AWS_DEFAULT_REGION="us-east-1", DDB_INTRADAY_TABLE=TABLE)
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+
+    with mock_aws():
+        seed(symbols, args.minutes)
+
+        import handler
+        handler.log = handler.METRICS.emit = lambda msg: None
+        handler.get_client().meta.events.register(
+            "before-call.dynamodb.Query", lambda **kwargs: time.sleep(args.rtt)
+        )
+
+        def invoke(qs):
+            handler.SERIES_CACHE.clear()
+            return handler.handler({"queryStringParameters": qs}, None)
+
+        # Warm the client's connection pool, as a warm container would have
+        invoke({"symbols": ",".join(symbols), "range": "1D"})
+
+        start = time.perf_counter()
+        singles = [
+            json.loads(invoke({"symbol": s, "range": "1D"})["body"])["points"] for s in symbols
+        ]
+        single_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = json.loads(invoke({"symbols": ",".join(symbols), "range": "1D"})["body"])
+        batch_elapsed = time.perf_counter() - start
+
+        assert [s["points"] for s in body["series"]] == singles
+        print(f"{args.symbols} symbols x {args.minutes} minutes, rtt={args.rtt * 1000:.0f} ms/query")
+        print(f"single-symbol: {len(symbols)} invocations, {single_elapsed * 1000:.1f} ms total")
+        print(f"symbols=...:   1 invocation,  {batch_elapsed * 1000:.1f} ms total "
+              f"(concurrency={handler.READ_QUERY_CONCURRENCY})")
+
+
+if __name__ == "__main__":
+    main()
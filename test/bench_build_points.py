@@ -0,0 +1,60 @@
+"""
+build_points() micro-benchmark: pure-Python vs NumPy path over synthetic
+DynamoDB-shaped items (Decimal ts/price), spanning DST switches.
+
+    python test/bench_build_points.py
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("DDB_INTRADAY_TABLE", "bench-intraday")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "lambdas", "read_prices"))
+
+import handler  # noqa: E402
+
+
+def make_items(n: int) -> list[dict]:
+    start = 1_760_000_000  # 2025-10-09, so large runs cross Nov and Mar DST switches
+    return [
+        {
+            "symbol": "AAPL",
+            "ts": Decimal(start + 60 * i),
+            "price": Decimal(f"{100 + (i % 997) / 100:.2f}"),
+            "open": Decimal(f"{100 + (i % 991) / 100:.2f}"),
+            "high": Decimal(f"{101 + (i % 997) / 100:.2f}"),
+            "low": Decimal(f"{99 + (i % 983) / 100:.2f}"),
+            "close": Decimal(f"{100 + (i % 997) / 100:.2f}"),
+            "volume": Decimal(i % 5000),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, items, bucket_seconds, candles, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        points = fn(items, bucket_seconds, candles)
+        best = min(best, time.perf_counter() - start)
+    return best, points
+
+
+def main():
+    handler.log = handler.METRICS.emit = lambda msg: None
+
+    for n in (1_000, 40_000, 400_000):
+        items = make_items(n)
+        for bucket_seconds, candles in ((60, False), (3600, False), (3600, True)):
+            py_time, py_points = timed(handler.build_points_python, items, bucket_seconds, candles)
+            np_time, np_points = timed(handler.build_points_numpy, items, bucket_seconds, candles)
+            assert py_points == np_points
+            kind = "candles" if candles else "close"
+            print(f"{n:7d} items, bucket={bucket_seconds:4d}s {kind:7s}: python {py_time * 1000:8.1f} ms, "
+                  f"numpy {np_time * 1000:8.1f} ms ({py_time / np_time:4.1f}x), {len(np_points)} points")
+
+
+if __name__ == "__main__":
+    main()
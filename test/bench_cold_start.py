@@ -0,0 +1,244 @@
+"""
+Cold-start cost of each entry point: time to import the module (the
+Lambda init phase, or the worker before its first job) and time of the
+first call in the fresh process, less the time spent waiting on AWS
+responses, each measured in a new interpreter.
+AWS calls go to a local moto server through AWS_ENDPOINT_URL, so nothing
+extra (moto, boto3) is imported into the measured process. The server
+needs the moto[server] extra (test/requirements.txt).
+
+    python test/bench_cold_start.py --runs 7
+    python test/bench_cold_start.py --ref HEAD~1 --profile
+
+--ref also measures the app/ tree of a git revision, for before/after
+numbers; --profile prints the slowest imports (python -X importtime) of
+one run per entry point.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PORT = 5123
+TABLE = "cold-intraday"
+BUCKET = "cold-bucket"
+
+ENTRIES = {
+    "read_prices": {
+        "path": "app/lambdas/read_prices",
+        "module": "handler",
+        "env": {"DDB_INTRADAY_TABLE": TABLE},
+    },
+    "switch": {
+        "path": "app/lambdas/switch",
+        "module": "handler",
+        "env": {"ECS_CLUSTER": "cold", "ECS_SERVICE": "worker"},
+    },
+    "worker": {
+        "path": "app/worker",
+        "module": "main",
+        "env": {"S3_BUCKET": BUCKET, "DDB_INTRADAY_TABLE": TABLE, "STOCK_LIST": "AAPL,MSFT,NVDA"},
+    },
+    "worker-fake": {
+        "path": "app/worker",
+        "module": "main",
+        "env": {"S3_BUCKET": BUCKET, "DDB_INTRADAY_TABLE": TABLE, "STOCK_LIST": "AAPL,MSFT,NVDA",
+                "QUOTE_SOURCE": "fake"},
+    },
+}
+
+
+def first_call(name: str, module) -> None:
+    if name == "read_prices":
+        resp = module.handler({"queryStringParameters": {"symbol": "AAPL", "range": "1D"}}, None)
+        assert resp["statusCode"] == 200, resp
+    elif name == "switch":
+        resp = module.handler({"action": "off"}, None)
+        assert resp["statusCode"] == 200, resp
+    elif name == "worker-fake":
+        assert module.fetch_prices()
+    # "worker" polls Yahoo on its first call; only the import is measured
+
+
+def child(name: str, app_root: str) -> None:
+    entry = ENTRIES[name]
+    sys.path.insert(0, os.path.join(app_root, entry["path"]))
+    start = time.perf_counter()
+    module = importlib.import_module(entry["module"])
+    imported = time.perf_counter()
+
+    # Time spent waiting on (moto's) HTTP responses, which says nothing
+    # about the code; botocore is loaded by every entry point by now
+    from botocore.endpoint import Endpoint
+    waited = [0.0]
+    send = Endpoint._send
+
+    def timed_send(self, request):
+        t = time.perf_counter()
+        try:
+            return send(self, request)
+        finally:
+            waited[0] += time.perf_counter() - t
+
+    Endpoint._send = timed_send
+    first_call(name, module)
+    called = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "first_call_ms": (called - imported - waited[0]) * 1000,
+        "aws_wait_ms": waited[0] * 1000,
+    }))
+
+
+def start_aws():
+    """
+    moto server with the table (a day of minutes for AAPL), bucket and ECS
+    service the entry points touch.
+    """
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=PORT, verbose=False)
+    server.start()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    endpoint = f"http://127.0.0.1:{PORT}"
+
+    ddb = boto3.client("dynamodb", endpoint_url=endpoint)
+    ddb.create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "symbol", "KeyType": "HASH"},
+            {"AttributeName": "ts", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "symbol", "AttributeType": "S"},
+            {"AttributeName": "ts", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    now = int(time.time()) // 60 * 60
+    table = boto3.resource("dynamodb", endpoint_url=endpoint).Table(TABLE)
+    with table.batch_writer() as batch:
+        for m in range(390):
+            batch.put_item(Item={"symbol": "AAPL", "ts": now - m * 60, "price": 100 + m % 7})
+    boto3.client("s3", endpoint_url=endpoint).create_bucket(Bucket=BUCKET)
+
+    ecs = boto3.client("ecs", endpoint_url=endpoint)
+    ecs.create_cluster(clusterName="cold")
+    ecs.register_task_definition(
+        family="worker", containerDefinitions=[{"name": "worker", "image": "worker", "memory": 128}]
+    )
+    ecs.create_service(cluster="cold", serviceName="worker", taskDefinition="worker", desiredCount=0)
+    return server, endpoint
+
+
+def checkout(ref: str) -> str:
+    directory = tempfile.mkdtemp(prefix="cold-start-")
+    archive = subprocess.run(["git", "-C", ROOT, "archive", ref, "app"], check=True, capture_output=True)
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+    return directory
+
+
+def run_entry(name: str, app_root: str, env: dict, profile: bool = False) -> dict:
+    cmd = [sys.executable, __file__, "--child", name, "--app-root", app_root]
+    if profile:
+        cmd[1:1] = ["-X", "importtime"]
+    proc = subprocess.run(cmd, env={**env, **ENTRIES[name]["env"]}, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"{name} failed:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if profile:
+        result["imports"] = slowest_imports(proc.stderr)
+    return result
+
+
+def slowest_imports(stderr: str, top: int = 8) -> list[tuple[str, float]]:
+    """
+    Top-level packages by cumulative import time (ms), from -X importtime.
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        if package in ("site", "encodings"):
+            # Interpreter startup, before the timed import
+            continue
+        packages[package] = max(packages.get(package, 0), int(cumulative) / 1000)
+    return sorted(packages.items(), key=lambda kv: -kv[1])[:top]
+
+
+def measure(label: str, app_root: str, env: dict, runs: int, profile: bool) -> dict:
+    results = {}
+    for name in ENTRIES:
+        samples = [run_entry(name, app_root, env) for _ in range(runs)]
+        for s in samples:
+            s["total_ms"] = s["import_ms"] + s["first_call_ms"]
+        results[name] = {
+            key: round(statistics.median(s[key] for s in samples), 1)
+            for key in ("import_ms", "first_call_ms", "total_ms", "aws_wait_ms")
+        }
+        r = results[name]
+        print(f"{label:>12} {name:12s} import {r['import_ms']:6.1f} ms + first call {r['first_call_ms']:6.1f} ms "
+              f"= {r['total_ms']:6.1f} ms (+{r['aws_wait_ms']:.0f} ms waiting on AWS)", file=sys.stderr)
+        if profile:
+            imports = run_entry(name, app_root, env, profile=True)["imports"]
+            print("             " + ", ".join(f"{mod} {ms:.0f}" for mod, ms in imports), file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--ref", help="also measure this git revision's app/ tree")
+    parser.add_argument("--profile", action="store_true", help="print the slowest imports per entry point")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--app-root", default=ROOT, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.app_root)
+        return
+
+    credentials = {
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "cold",
+        "AWS_SECRET_ACCESS_KEY": "cold",
+    }
+    os.environ.update(credentials)
+    server, endpoint = start_aws()
+    # Children get a minimal environment, like a Lambda
+    env = {
+        "PATH": os.environ.get("PATH", ""),
+        "AWS_ENDPOINT_URL": endpoint,
+        "METRICS_ENABLED": "0",
+        "LOG_SAMPLE_RATE": "0",
+        **credentials,
+    }
+    try:
+        results = {}
+        if args.ref:
+            results[args.ref] = measure(args.ref, checkout(args.ref), env, args.runs, args.profile)
+        results["tree"] = measure("tree", ROOT, env, args.runs, args.profile)
+    finally:
+        server.stop()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+    else:
+        print(json.dumps(results, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Write a local lake with one file per minute like flush_buffer(), scan it
+with the history reader, compact every day, then scan again. Also checks
+that a backfill range skips days already compacted, that re-running is a
+no-op and that late files and leftovers from an interrupted run are
+handled. Days are merged in several symbol ranges
+(--batch-symbols) to exercise the bounded-memory path.
+
+    python test/bench_compact.py --days 10 --symbols 50
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from bench_history import ROOT, write_lake
+
+EASTERN_TZ = ZoneInfo("America/New_York")
+
+sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+sys.path.insert(0, os.path.join(ROOT, "app", "lambdas", "read_prices"))
+
+import compact  # noqa: E402
+from history import LakeReader  # noqa: E402
+from parquet_sink import rows_to_table  # noqa: E402
+
+
+def lake_days(root: str) -> list:
+    days = []
+    for dirpath, dirnames, _ in os.walk(root):
+        if os.path.basename(dirpath).startswith("day="):
+            y, m, d = (int(p.split("=")[1]) for p in dirpath[len(root) + 1:].split("/"))
+            days.append(datetime(y, m, d).date())
+            dirnames.clear()
+    return sorted(days)
+
+
+def scan(reader: LakeReader, symbols: list[str], start_dt, end_dt, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        logs = []
+        reader.log = logs.append
+        start = time.perf_counter()
+        result = reader.query(symbols, start_dt, end_dt, 60 * 60)
+        best = min(best, time.perf_counter() - start)
+    return best, result, logs[-1].split(": ", 1)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--tick-seconds", type=int, default=15)
+    parser.add_argument("--batch-symbols", type=int, default=8, help="symbols per in-memory batch")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="lake-")
+    symbols = [f"SYM{i:03d}" for i in range(args.symbols)]
+    try:
+        start = time.perf_counter()
+        files = write_lake(root, args.days, symbols, flush_minutes=1, tick_seconds=args.tick_seconds)
+        print(f"wrote {files} one-minute files in {time.perf_counter() - start:.1f}s")
+
+        # No file cap: the uncompacted scan is the baseline being measured
+        reader = LakeReader(root, max_workers=8, max_files=files)
+        end_dt = datetime.now(EASTERN_TZ)
+        start_dt = end_dt - timedelta(days=args.days + 1)
+        cases = {"1 symbol": [symbols[len(symbols) // 2]], "all symbols": symbols}
+
+        before = {name: scan(reader, syms, start_dt, end_dt) for name, syms in cases.items()}
+
+        fs = pafs.LocalFileSystem()
+        # Ticks per symbol-day, so batches hold about --batch-symbols symbols
+        batch_rows = args.batch_symbols * 390 * 60 // args.tick_seconds
+        start = time.perf_counter()
+        days = lake_days(root)
+        # The oldest day first on its own, then all of them as one backfill
+        # range: the day already done is skipped, the rest are compacted
+        compact.main(["--date", days[0].isoformat(), "--root", root])
+        done, failed = compact.compact_days(
+            fs, root, compact.day_range(days[0], days[-1]), batch_rows=batch_rows, log=lambda msg: None,
+        )
+        assert not failed, failed
+        compacted = [stats for stats in done if stats.inputs]
+        assert len(compacted) == len(days) - 1, [stats.partition for stats in compacted]
+        for stats in compacted:
+            assert stats.batches == -(-len(symbols) // args.batch_symbols), stats
+        print(f"compacted {len(days)} days in {time.perf_counter() - start:.1f}s "
+              f"(backfill over {len(done)} calendar days)")
+
+        for name, syms in cases.items():
+            b_time, b_result, b_info = before[name]
+            a_time, a_result, a_info = scan(reader, syms, start_dt, end_dt)
+            assert a_result == b_result, f"{name}: results differ after compaction"
+            print(f"{name:11s}: before {b_time * 1000:8.1f} ms [{b_info}]")
+            print(f"{'':11s}  after  {a_time * 1000:8.1f} ms [{a_info}] ({b_time / a_time:4.1f}x)")
+
+        # Re-run: nothing to do
+        day = lake_days(root)[-1]
+        stats = compact.compact_day(fs, root, day, log=lambda msg: None)
+        assert stats.inputs == 0 and stats.deleted == 0
+
+        # A late flush and a leftover from a run that died before its manifest
+        partition = compact.partition_path(root, day)
+        late = datetime.combine(day, datetime.min.time(), EASTERN_TZ).replace(hour=16, minute=5)
+        pq.write_table(
+            rows_to_table([{"symbol": symbols[0], "timestamp": late.isoformat(), "price": 1.0}]),
+            f"{partition}/stocks-16-05-00.parquet",
+        )
+        shutil.copy(f"{partition}/compacted-g1-0.parquet", f"{partition}/compacted-g9-0.parquet")
+        assert not any(f.endswith("g9-0.parquet") for f in reader.list_files([partition[len(root) + 1:]]))
+
+        stats = compact.compact_day(fs, root, day, log=lambda msg: None)
+        assert stats.inputs == 2 and stats.outputs == ["compacted-g2-0.parquet"] and stats.deleted == 3
+        assert sorted(os.listdir(partition)) == ["_manifest.json", "compacted-g2-0.parquet"]
+        print(f"re-run: no-op when up to date; late file merged into generation 2, "
+              f"{stats.row_groups} row groups of whole symbols")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
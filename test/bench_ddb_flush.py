@@ -0,0 +1,148 @@
+"""
+Minute flush to a moto-backed DynamoDB table: one put_item per symbol vs
+BatchWriteItem in chunks of 25, plus a run where a third of every batch comes
+back as UnprocessedItems to exercise the retry path, and one where calls
+fail with connection / timeout errors (retried) or a non-retryable botocore
+error (only that chunk is lost). Last, join() against an endpoint that
+stays down has to return by its shutdown deadline.
+
+    python test/bench_ddb_flush.py --symbols 500
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+import boto3
+from botocore.exceptions import EndpointConnectionError, ParamValidationError, ReadTimeoutError
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "worker"))
+
+from ddb_writer import BatchMinuteWriter  # noqa: E402
+
+
+TABLE = "bench-intraday"
+
+
+class FlakyDynamoDB:
+    """
+    Wraps the resource and reports part of every batch as unprocessed.
+    """
+
+    def __init__(self, dynamodb, drop_every: int = 3):
+        self.dynamodb = dynamodb
+        self.drop_every = drop_every
+
+    def batch_write_item(self, RequestItems):
+        requests = RequestItems[TABLE]
+        dropped = requests[::self.drop_every] if len(requests) > 1 else []
+        kept = [r for r in requests if r not in dropped]
+        self.dynamodb.batch_write_item(RequestItems={TABLE: kept})
+        return {"UnprocessedItems": {TABLE: dropped} if dropped else {}}
+
+
+class UnreliableDynamoDB:
+    """
+    Wraps the resource and raises the next error in `errors` (None: pass
+    the call through) on each batch_write_item call.
+    """
+
+    def __init__(self, dynamodb, errors: list):
+        self.dynamodb = dynamodb
+        self.errors = list(errors)
+
+    def batch_write_item(self, RequestItems):
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return self.dynamodb.batch_write_item(RequestItems=RequestItems)
+
+
+def make_items(n: int, ts: int) -> list[dict]:
+    return [
+        {"symbol": f"SYM{i}", "ts": ts, "price": Decimal("100.25"), "ttl": ts + 86400}
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb")
+        table = dynamodb.create_table(
+            TableName=TABLE,
+            KeySchema=[
+                {"AttributeName": "symbol", "KeyType": "HASH"},
+                {"AttributeName": "ts", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "symbol", "AttributeType": "S"},
+                {"AttributeName": "ts", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+        start = time.perf_counter()
+        for item in make_items(args.symbols, 1_700_000_000):
+            table.put_item(Item=item)
+        serial = time.perf_counter() - start
+        print(f"put_item x{args.symbols}: {serial * 1000:.1f} ms, {args.symbols} calls")
+
+        writer = BatchMinuteWriter(dynamodb, TABLE)
+        stats = writer.write(make_items(args.symbols, 1_700_000_060))
+        print(f"BatchWriteItem: {stats.latency_seconds * 1000:.1f} ms, {stats.batches} calls, "
+              f"written={stats.written}, throttles={stats.throttles}")
+
+        flaky = BatchMinuteWriter(FlakyDynamoDB(dynamodb), TABLE, base_backoff_seconds=0.001)
+        stats = flaky.write(make_items(args.symbols, 1_700_000_120))
+        print(f"BatchWriteItem w/ unprocessed: {stats.latency_seconds * 1000:.1f} ms, "
+              f"{stats.batches} calls, written={stats.written}, failed={stats.failed}, "
+              f"throttles={stats.throttles}, retries={stats.retries}")
+
+        # Chunk 1: endpoint down, then a read timeout, then written.
+        # Chunk 2: a non-retryable error loses that chunk alone.
+        errors = [
+            EndpointConnectionError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com"),
+            ReadTimeoutError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com"),
+            None,
+            ParamValidationError(report="bad item"),
+        ]
+        unreliable = BatchMinuteWriter(UnreliableDynamoDB(dynamodb, errors), TABLE, base_backoff_seconds=0.001)
+        stats = unreliable.write(make_items(args.symbols, 1_700_000_180))
+        print(f"BatchWriteItem w/ connection errors: {stats.latency_seconds * 1000:.1f} ms, "
+              f"{stats.batches} calls, written={stats.written}, failed={stats.failed}, "
+              f"connection_errors={stats.connection_errors}, retries={stats.retries}")
+        lost = min(25, max(0, args.symbols - 25))
+        assert stats.connection_errors == 2, stats
+        assert stats.failed == lost, stats
+        assert stats.written == args.symbols - lost, stats
+
+        count = table.scan(Select="COUNT")["Count"]
+        assert count == 4 * args.symbols - lost, count
+        print(f"table holds {count} items")
+
+        # Endpoint down for good: the shutdown join gives up at its deadline
+        # instead of waiting out retry_seconds
+        down = [EndpointConnectionError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com")] * 10_000
+        stuck = BatchMinuteWriter(
+            UnreliableDynamoDB(dynamodb, down), TABLE, log=lambda msg: None, max_attempts=2,
+            base_backoff_seconds=0.001,
+        )
+        stuck.submit(make_items(args.symbols, 1_700_000_240))
+        start = time.monotonic()
+        stuck.join(retry_seconds=30.0, deadline=start + 1.0)
+        waited = time.monotonic() - start
+        assert waited < 1.5, waited
+        print(f"join with the endpoint down: returned after {waited:.2f} s, "
+              f"{len(stuck.failed)} flush(es) still held")
+
+
+if __name__ == "__main__":
+    main()
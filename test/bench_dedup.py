@@ -0,0 +1,162 @@
+"""
+Run polled quotes through the worker's change detection and compare what
+flush_buffer() would store with and without it: rows and Parquet bytes
+per one-minute file. Uses the captured tick files in test/ and a replayed
+session of liquid, illiquid and after-hours symbols, and checks that the
+full series is rebuilt from the stored rows and their `repeats`.
+
+    python test/bench_dedup.py --symbols 300 --minutes 60
+"""
+import argparse
+import bisect
+import glob
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+import pyarrow.parquet as pq
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+EASTERN_TZ = ZoneInfo("America/New_York")
+POLL_SECONDS = 3
+
+sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+
+from dedup import QuoteDeduper  # noqa: E402
+from parquet_sink import encode_parquet, rows_to_table  # noqa: E402
+from tick_buffer import TickBuffer  # noqa: E402
+
+# (share of symbols, chance a poll returns a new quote)
+REGIMES = {"liquid": (0.3, 0.9), "illiquid": (0.4, 0.1), "after-hours": (0.3, 0.0)}
+
+
+def regimes(symbols: list[str]) -> dict[str, str]:
+    out = {}
+    start = 0
+    for name, (share, _) in REGIMES.items():
+        end = start + round(share * len(symbols))
+        out.update((s, name) for s in symbols[start:end])
+        start = end
+    return out
+
+
+def session(symbols: list[str], minutes: int, seed: int = 7) -> list[list[dict]]:
+    """
+    One poll every POLL_SECONDS, as fetch_prices() returns them.
+    """
+    rng = random.Random(seed)
+    chance = {s: REGIMES[name][1] for s, name in regimes(symbols).items()}
+    quote = {
+        s: {"price": round(rng.uniform(10, 500), 2), "volume": rng.randint(10_000, 5_000_000)}
+        for s in symbols
+    }
+
+    start = datetime.now(EASTERN_TZ).replace(hour=15, minute=0, second=0, microsecond=0)
+    polls = []
+    for i in range(minutes * 60 // POLL_SECONDS):
+        ts = (start + timedelta(seconds=i * POLL_SECONDS)).isoformat()
+        rows = []
+        for s in symbols:
+            q = quote[s]
+            if rng.random() < chance[s]:
+                q["price"] = round(q["price"] * (1 + rng.gauss(0, 0.0005)), 2)
+                q["volume"] += rng.randint(100, 5_000)
+            rows.append({
+                "symbol": s, "timestamp": ts, "price": q["price"], "volume": q["volume"],
+                "open": 100.0, "day_high": 600.0, "day_low": 5.0, "previous_close": 100.0,
+                "source": "replay",
+            })
+        polls.append(rows)
+    return polls
+
+
+def stored_files(polls: list[list[dict]], deduper, polls_per_file: int):
+    """
+    Rows and Parquet bytes of each flush, built like the worker does.
+    """
+    files = []
+    for i in range(0, len(polls), polls_per_file):
+        buffer = TickBuffer()
+        for rows in polls[i:i + polls_per_file]:
+            buffer.extend(deduper.filter(rows) if deduper else rows)
+        if deduper and i + polls_per_file >= len(polls):
+            buffer.extend(deduper.drain())
+        files.append(buffer.to_table({}))
+    return files
+
+
+def check_rebuild(polls: list[list[dict]], tables) -> None:
+    """
+    Every polled value is the last stored row at or before its poll, and
+    stored rows plus their repeats add up to the polls.
+    """
+    stored = sorted(
+        (r for t in tables for r in t.select(["symbol", "timestamp", "price", "repeats"]).to_pylist()),
+        key=lambda r: (r["symbol"], r["timestamp"]),
+    )
+    by_symbol = {s: list(rows) for s, rows in groupby(stored, key=lambda r: r["symbol"])}
+    counts = {s: sum(1 + r["repeats"] for r in rows) for s, rows in by_symbol.items()}
+    keys = {s: [r["timestamp"] for r in rows] for s, rows in by_symbol.items()}
+    for rows in polls:
+        for row in rows:
+            s = row["symbol"]
+            i = bisect.bisect_right(keys[s], row["timestamp"]) - 1
+            assert by_symbol[s][i]["price"] == row["price"], (s, row["timestamp"])
+    for s in by_symbol:
+        assert counts[s] == sum(1 for rows in polls for r in rows if r["symbol"] == s), s
+
+
+def report(name: str, plain, deduped) -> None:
+    rows_a = sum(t.num_rows for t in plain)
+    rows_b = sum(t.num_rows for t in deduped)
+    bytes_a = sum(len(encode_parquet(t)) for t in plain)
+    bytes_b = sum(len(encode_parquet(t)) for t in deduped)
+    print(f"{name:34s} rows {rows_a:8d} -> {rows_b:7d} ({rows_b / rows_a:6.1%})  "
+          f"S3 bytes {bytes_a / 1e3:9.1f} KB -> {bytes_b / 1e3:8.1f} KB ({bytes_b / bytes_a:6.1%})")
+
+
+def captured_polls() -> list[list[dict]]:
+    rows = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "stocks-*.parquet"))):
+        table = pq.read_table(path)
+        rows.extend({**r, "source": r.get("source") or "yfinance"} for r in table.to_pylist())
+    rows.sort(key=lambda r: r["timestamp"])
+    return [list(g) for _, g in groupby(rows, key=lambda r: r["timestamp"])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--minutes", type=int, default=60)
+    args = parser.parse_args()
+
+    polls = captured_polls()
+    plain = [rows_to_table([r for rows in polls for r in rows])]
+    for heartbeat in (0, 60):
+        deduper = QuoteDeduper(heartbeat)
+        stored = [r for rows in polls for r in deduper.filter(rows)] + deduper.drain()
+        deduped = [rows_to_table(stored)]
+        check_rebuild(polls, deduped)
+        report(f"captured ticks, heartbeat {heartbeat:2d}s", plain, deduped)
+
+    symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+    polls = session(symbols, args.minutes)
+    per_file = 60 // POLL_SECONDS
+    plain = stored_files(polls, None, per_file)
+    for heartbeat in (0, 60):
+        deduped = stored_files(polls, QuoteDeduper(heartbeat), per_file)
+        check_rebuild(polls, deduped)
+        report(f"replayed {args.minutes}m session, heartbeat {heartbeat:2d}s", plain, deduped)
+        regime = regimes(symbols)
+        for name in REGIMES:
+            subset = [[r for r in rows if regime[r["symbol"]] == name] for rows in polls]
+            report(f"  {name}", stored_files(subset, None, per_file),
+                   stored_files(subset, QuoteDeduper(heartbeat), per_file))
+    print("full series rebuilt from stored rows + repeats in every case")
+
+
+if __name__ == "__main__":
+    main()
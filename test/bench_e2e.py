@@ -0,0 +1,379 @@
+"""
+End-to-end benchmark of the worker and read_prices against moto-backed S3
+and DynamoDB, for several symbol counts, with JSON output for tracking
+regressions.
+
+For each symbol count a child process:
+  1. seeds --history-days of minutes (and rollups) for --read-symbols
+     symbols through the worker's DynamoDB writer
+  2. runs --ticks live ticks with the synthetic quote source:
+     fetch_prices() -> update_intraday_cache() -> tick buffer, then
+     flush_buffer() to S3
+  3. writes --replay-minutes of ticks as one Parquet file per minute (or
+     takes --replay-dir) and replays them through the same path as fast as
+     possible (or at --speed x real time), closing minutes into DynamoDB
+  4. calls read_prices.handler for 1D / 1W / 1M, single-symbol (cold and
+     cached) and one symbols=... request
+
+    python test/bench_e2e.py --symbols 10,100,1000 --out bench-e2e.json
+    python test/bench_e2e.py --symbols 10,100 --baseline bench-e2e.json
+
+With --baseline the run exits non-zero if a metric is worse than the
+baseline by more than --tolerance.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+EASTERN_TZ = ZoneInfo("America/New_York")
+BUCKET = "bench-bucket"
+TABLE = "bench-intraday"
+TICK_SECONDS = 3
+RANGES = ("1D", "1W", "1M")
+
+# metric -> which direction is better
+METRICS = {
+    "live.tick_ms": "lower",
+    "live.ticks_per_s": "higher",
+    "live.rows_per_s": "higher",
+    "live.flush_encode_ms": "lower",
+    "live.flush_upload_ms": "lower",
+    "replay.rows_per_s": "higher",
+    "replay.speedup": "higher",
+    "replay.ddb_drain_s": "lower",
+    **{f"read.{r}.{k}": "lower" for r in RANGES for k in ("cold_ms", "cached_ms", "many_ms")},
+}
+
+
+def create_storage():
+    import boto3
+    boto3.client("s3").create_bucket(Bucket=BUCKET)
+    boto3.resource("dynamodb").create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "symbol", "KeyType": "HASH"},
+            {"AttributeName": "ts", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "symbol", "AttributeType": "S"},
+            {"AttributeName": "ts", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def seed_history(worker, symbols: list[str], days: int) -> int:
+    """
+    Regular-hours minutes for every weekday before today, minute by minute
+    across the symbols like the worker closes them.
+    """
+    today = datetime.now(EASTERN_TZ).replace(hour=9, minute=30, second=0, microsecond=0)
+    minutes = 0
+    for d in range(days, 0, -1):
+        day_open = today - timedelta(days=d)
+        if day_open.weekday() >= 5:
+            continue
+        for m in range(390):
+            price = 100 + (m % 60) / 10
+            closed = []
+            for symbol in symbols:
+                state = worker.MinuteState.start(day_open + timedelta(minutes=m), price, 1_000 * m)
+                state.add(price + 0.25, 1_000 * m + 400)
+                closed.append((symbol, state))
+            worker.write_minutes_to_dynamodb(closed)
+            minutes += len(closed)
+    worker.MINUTE_WRITER.join()
+    return minutes
+
+
+def run_live(worker, ticks: int) -> dict:
+    buffer = worker.TickBuffer()
+    tick_ms, rows = [], 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        polled = worker.fetch_prices()
+        buffer.extend(worker.dedup_rows(polled))
+        worker.update_intraday_cache(polled)
+        tick_ms.append((time.perf_counter() - start) * 1000)
+        rows += len(polled)
+
+    start = time.perf_counter()
+    worker.flush_buffer(buffer)
+    worker.UPLOADER.join()
+    flush = worker.UPLOADER.last_stats
+    median = statistics.median(tick_ms)
+    return {
+        "ticks": ticks,
+        "tick_ms": round(median, 3),
+        "tick_p95_ms": round(statistics.quantiles(tick_ms, n=20)[-1], 3),
+        "ticks_per_s": round(1000 / median, 2),
+        "rows_per_s": round(rows / (sum(tick_ms) / 1000), 1),
+        "flush_rows": flush.rows,
+        "flush_bytes": flush.bytes,
+        "flush_encode_ms": round(flush.encode_seconds * 1000, 3),
+        "flush_upload_ms": round(flush.upload_seconds * 1000, 3),
+        "flush_total_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+def write_replay_files(worker, directory: str, symbols: list[str], minutes: int) -> list[str]:
+    """
+    `minutes` of synthetic ticks ending at the current minute, stored like
+    flush_buffer() stores them (one Parquet file per minute).
+    """
+    from parquet_sink import encode_parquet
+
+    source = worker.FakeQuoteSource(seed=11)
+    end = worker.floor_to_minute(datetime.now(EASTERN_TZ))
+    paths = []
+    for m in range(minutes, 0, -1):
+        buffer = worker.TickBuffer()
+        minute = end - timedelta(minutes=m)
+        for s in range(0, 60, TICK_SECONDS):
+            ts = (minute + timedelta(seconds=s)).isoformat()
+            quotes = source.get_quotes(symbols)
+            buffer.extend(worker.build_row(sym, ts, quotes[sym]) for sym in symbols)
+        path = os.path.join(directory, (minute + timedelta(minutes=1)).strftime("stocks-%H-%M-%S.parquet"))
+        with open(path, "wb") as f:
+            f.write(encode_parquet(buffer.to_table({})))
+        paths.append(path)
+    return paths
+
+
+def run_replay(worker, paths: list[str], speed: float) -> dict:
+    """
+    Feed stored ticks back poll by poll: minute bars, tick buffer, one
+    flush per file. speed=0 replays as fast as possible.
+    """
+    import pyarrow.parquet as pq
+
+    rows_total = 0
+    first_ts = last_ts = None
+    wall_start = time.perf_counter()
+    for path in paths:
+        rows = pq.read_table(path).to_pylist()
+        rows.sort(key=lambda r: r["timestamp"])
+        buffer = worker.TickBuffer()
+        for ts, poll in groupby(rows, key=lambda r: r["timestamp"]):
+            poll = list(poll)
+            epoch = datetime.fromisoformat(ts).timestamp()
+            first_ts = first_ts or epoch
+            last_ts = epoch
+            if speed:
+                delay = (epoch - first_ts) / speed - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            buffer.extend(worker.dedup_rows(poll))
+            worker.update_intraday_cache(poll)
+            rows_total += len(poll)
+        worker.flush_buffer(buffer)
+    worker.close_open_minutes()
+    ingest_seconds = time.perf_counter() - wall_start
+
+    drain_start = time.perf_counter()
+    worker.UPLOADER.join()
+    worker.MINUTE_WRITER.join()
+    drain_seconds = time.perf_counter() - drain_start
+    simulated = (last_ts - first_ts) + TICK_SECONDS if first_ts else 0.0
+    return {
+        "files": len(paths),
+        "rows": rows_total,
+        "simulated_s": round(simulated, 1),
+        "ingest_s": round(ingest_seconds, 3),
+        "rows_per_s": round(rows_total / ingest_seconds, 1),
+        "speedup": round(simulated / (ingest_seconds + drain_seconds), 1),
+        "ddb_drain_s": round(drain_seconds, 3),
+    }
+
+
+def run_reads(handler, symbols: list[str], repeat: int) -> dict:
+    def call(qs):
+        start = time.perf_counter()
+        resp = handler.handler({"queryStringParameters": qs}, None)
+        elapsed = (time.perf_counter() - start) * 1000
+        assert resp["statusCode"] == 200, resp
+        return elapsed, resp
+
+    results = {}
+    for range_str in RANGES:
+        cold, cached, many = [], [], []
+        for _ in range(repeat):
+            handler.SERIES_CACHE.clear()
+            ms, resp = call({"symbol": symbols[0], "range": range_str})
+            cold.append(ms)
+            ms, _ = call({"symbol": symbols[0], "range": range_str})
+            cached.append(ms)
+            handler.SERIES_CACHE.clear()
+            ms, _ = call({"symbols": ",".join(symbols), "range": range_str})
+            many.append(ms)
+        results[range_str] = {
+            "points": len(json.loads(resp["body"])["points"]),
+            "bytes": len(resp["body"]),
+            "cold_ms": round(statistics.median(cold), 3),
+            "cached_ms": round(statistics.median(cached), 3),
+            "many_ms": round(statistics.median(many), 3),
+            "many_symbols": len(symbols),
+        }
+    return results
+
+
+def child(args) -> dict:
+    from moto import mock_aws
+
+    symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+    read_symbols = symbols[:args.read_symbols]
+    os.environ.update(
+        AWS_DEFAULT_REGION="us-east-1",
+        AWS_ACCESS_KEY_ID="bench",
+        AWS_SECRET_ACCESS_KEY="bench",
+        S3_BUCKET=BUCKET,
+        DDB_INTRADAY_TABLE=TABLE,
+        STOCK_LIST=",".join(symbols),
+        QUOTE_SOURCE="fake",
+    )
+    sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+    sys.path.insert(0, os.path.join(ROOT, "app", "lambdas", "read_prices"))
+
+    replay_dir = args.replay_dir or tempfile.mkdtemp(prefix="replay-")
+    try:
+        with mock_aws():
+            create_storage()
+            import main as worker
+            worker.log = worker.MINUTE_WRITER.log = worker.UPLOADER.log = lambda msg: None
+
+            start = time.perf_counter()
+            seeded = seed_history(worker, read_symbols, args.history_days)
+            seed_seconds = time.perf_counter() - start
+
+            live = run_live(worker, args.ticks)
+            # Live ticks leave minutes open at wall-clock time, after the
+            # replayed window
+            worker.close_open_minutes()
+
+            paths = sorted(glob.glob(os.path.join(replay_dir, "**", "*.parquet"), recursive=True))
+            if not paths:
+                paths = write_replay_files(worker, replay_dir, symbols, args.replay_minutes)
+            replay = run_replay(worker, paths, args.speed)
+
+            import handler
+            handler.log = handler.METRICS.emit = lambda msg: None
+            reads = run_reads(handler, read_symbols, args.repeat)
+    finally:
+        if not args.replay_dir:
+            shutil.rmtree(replay_dir)
+
+    return {
+        "symbols": args.symbols,
+        "seed": {"minutes": seeded, "seconds": round(seed_seconds, 1)},
+        "live": live,
+        "replay": replay,
+        "read": reads,
+    }
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    out = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        else:
+            out[f"{prefix}{key}"] = value
+    return out
+
+
+def regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    base = {r["symbols"]: flatten(r) for r in baseline}
+    found = []
+    for result in results:
+        old = base.get(result["symbols"])
+        if old is None:
+            continue
+        new = flatten(result)
+        for metric, better in METRICS.items():
+            if metric not in old or metric not in new or not old[metric]:
+                continue
+            ratio = new[metric] / old[metric]
+            worse = ratio > 1 + tolerance if better == "lower" else ratio < 1 - tolerance
+            if worse:
+                found.append(f"{result['symbols']} symbols: {metric} {old[metric]} -> {new[metric]} ({ratio:.2f}x)")
+    return found
+
+
+def summary(result: dict) -> str:
+    live, replay = result["live"], result["replay"]
+    reads = ", ".join(
+        f"{r} {v['cold_ms']:.0f}/{v['cached_ms']:.1f}/{v['many_ms']:.0f} ms" for r, v in result["read"].items()
+    )
+    return (
+        f"{result['symbols']:5d} symbols: tick {live['tick_ms']:.1f} ms ({live['rows_per_s']:.0f} rows/s), "
+        f"flush {live['flush_encode_ms']:.1f}+{live['flush_upload_ms']:.1f} ms; "
+        f"replay {replay['rows_per_s']:.0f} rows/s ({replay['speedup']:.0f}x real time); "
+        f"read cold/cached/many {reads}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", default="10,100,1000", help="comma-separated symbol counts")
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--replay-minutes", type=int, default=10)
+    parser.add_argument("--replay-dir", help="replay these stored Parquet files instead of synthetic ones")
+    parser.add_argument("--speed", type=float, default=0, help="replay at this multiple of real time (0: max)")
+    parser.add_argument("--read-symbols", type=int, default=3)
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.symbols = int(args.symbols)
+        print(json.dumps(child(args)))
+        return
+
+    results = []
+    for count in (int(s) for s in args.symbols.split(",")):
+        # One process per size: the worker reads STOCK_LIST at import
+        cmd = [sys.executable, __file__, "--child", "--symbols", str(count)]
+        for flag in ("ticks", "replay_minutes", "replay_dir", "speed", "read_symbols", "history_days", "repeat"):
+            value = getattr(args, flag)
+            if value is not None:
+                cmd += [f"--{flag.replace('_', '-')}", str(value)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"benchmark for {count} symbols failed")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print(summary(results[-1]), file=sys.stderr)
+
+    doc = json.dumps({"created": datetime.now(EASTERN_TZ).isoformat(), "results": results}, indent=1)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(doc + "\n")
+    else:
+        print(doc)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f)["results"], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare serial, concurrent and batched quote fetching against the fake quote source.
+Also checks that symbols of a batch still in flight are reported late and
+not requested again when the next tick chunks them differently.
+
+    python test/bench_fetch.py --symbols 50 --latency 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "worker"))
+
+from quotes import ConcurrentFetcher, FakeQuoteSource  # noqa: E402
+
+
+def run(symbols, concurrency, deadline, latency, jitter, ticks, batch_size=0):
+    source = FakeQuoteSource(
+        latency_seconds=latency,
+        jitter_seconds=jitter,
+        seed=1,
+        batch_misses=set(symbols[:2]),
+    )
+    fetcher = ConcurrentFetcher(source, concurrency, deadline)
+
+    durations = []
+    fetched = 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        result = fetcher.fetch(symbols, batch_size=batch_size)
+        durations.append(time.perf_counter() - start)
+        fetched += len(result.quotes)
+
+    fetcher.shutdown()
+    return max(durations), sum(durations) / len(durations), fetched, fetcher.late_total
+
+
+def check_late_batches(symbols, latency):
+    source = FakeQuoteSource(latency_seconds=latency, seed=1)
+    calls = []
+    get_quotes = source.get_quotes
+    source.get_quotes = lambda chunk: calls.append(list(chunk)) or get_quotes(chunk)
+    fetcher = ConcurrentFetcher(source, 8, deadline_seconds=latency / 10)
+
+    first = fetcher.fetch(symbols, batch_size=4)
+    # Next tick: one symbol dropped, so every chunk holds different symbols
+    second = fetcher.fetch(symbols[1:], batch_size=4)
+    assert sorted(first.late) == sorted(symbols) and sorted(second.late) == sorted(symbols[1:])
+    assert len(calls) == -(-len(symbols) // 4), calls
+
+    # Once those requests return, the symbols are fetched again
+    time.sleep(latency * 2)
+    source.latency_seconds = 0
+    third = fetcher.fetch(symbols[1:], batch_size=4)
+    fetcher.shutdown()
+    assert not third.late and len(third.quotes) == len(symbols) - 1
+    assert set(fetcher.in_flight) <= set(symbols)
+    print(f"late batches: {len(symbols)} symbols in flight not resubmitted when rechunked; "
+          f"{len(calls)} batch requests over 3 ticks")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--deadline", type=float, default=2.5)
+    parser.add_argument("--ticks", type=int, default=3)
+    args = parser.parse_args()
+
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+
+    print(f"{args.symbols} symbols, latency={args.latency}s+{args.jitter}s jitter, "
+          f"deadline={args.deadline}s, {args.ticks} ticks")
+    for concurrency in (1, 8, 32):
+        worst, avg, fetched, late = run(
+            symbols, concurrency, args.deadline, args.latency, args.jitter, args.ticks
+        )
+        print(f"concurrency={concurrency:3d}  avg_tick={avg:.2f}s  worst_tick={worst:.2f}s  "
+              f"fetched={fetched}  late={late}")
+    for batch_size in (25, 100):
+        worst, avg, fetched, late = run(
+            symbols, 8, args.deadline, args.latency, args.jitter, args.ticks, batch_size
+        )
+        print(f"batch_size={batch_size:3d}  avg_tick={avg:.2f}s  worst_tick={worst:.2f}s  "
+              f"fetched={fetched}  late={late}")
+    check_late_batches(symbols[:10], args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Build a local directory laid out like the S3 Parquet lake, then serve
+3M / 1Y / custom ranges from it through read_prices (LAKE_URI=<dir>)
+and compare against a naive full read of every file and column. Daily
+points must be labeled at Eastern midnight of their trading day, and a
+range over more files than LAKE_MAX_FILES must get a 400.
+
+    python test/bench_history.py --days 260 --symbols 20
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pyarrow.parquet as pq
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+EASTERN_TZ = ZoneInfo("America/New_York")
+
+sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+sys.path.insert(0, os.path.join(ROOT, "app", "lambdas", "read_prices"))
+
+from parquet_sink import ROW_SCHEMA, rows_to_table  # noqa: E402
+
+
+def write_lake(root: str, days: int, symbols: list[str], flush_minutes: int, tick_seconds: int) -> int:
+    """
+    Regular-hours ticks for every weekday in the last `days`, one file per
+    `flush_minutes` like the worker's flush_buffer() keys.
+    """
+    today = datetime.now(EASTERN_TZ).replace(hour=9, minute=30, second=0, microsecond=0)
+    files = 0
+    for d in range(days, -1, -1):
+        day_open = today - timedelta(days=d)
+        if day_open.weekday() >= 5:
+            continue
+        for flush in range(0, 390, flush_minutes):
+            rows = []
+            for s in range(0, flush_minutes * 60, tick_seconds):
+                t = day_open + timedelta(minutes=flush, seconds=s)
+                for i, symbol in enumerate(symbols):
+                    rows.append({
+                        "symbol": symbol,
+                        "timestamp": t.isoformat(),
+                        "price": round(100 + i + ((t.timestamp() // 60) % 97) / 10, 2),
+                        "volume": 1000,
+                        "exchange": "FAKE",
+                        "source": "bench",
+                    })
+            end = day_open + timedelta(minutes=flush + flush_minutes)
+            path = os.path.join(root, end.strftime("year=%Y/month=%m/day=%d"), end.strftime("stocks-%H-%M-%S.parquet"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(rows_to_table(rows), path, compression="snappy")
+            files += 1
+    return files
+
+
+def naive(root: str, symbol: str, start_dt: datetime, end_dt: datetime, bucket_seconds: int) -> list[tuple]:
+    """
+    Read every file and column, then filter and downsample in Python.
+    """
+    last = {}
+    for dirpath, _, names in os.walk(root):
+        for name in sorted(names):
+            for row in pq.read_table(os.path.join(dirpath, name), schema=ROW_SCHEMA).to_pylist():
+                if row["symbol"] != symbol:
+                    continue
+                ts = int(datetime.fromisoformat(row["timestamp"]).timestamp())
+                if not start_dt.timestamp() <= ts <= end_dt.timestamp():
+                    continue
+                if bucket_seconds >= 86400:
+                    day = datetime.fromtimestamp(ts, EASTERN_TZ).replace(hour=0, minute=0, second=0)
+                    bucket = int(day.timestamp())
+                else:
+                    bucket = ts - ts % bucket_seconds
+                if bucket not in last or ts >= last[bucket][0]:
+                    last[bucket] = (ts, row["price"])
+    return [
+        (datetime.fromtimestamp(bucket, EASTERN_TZ).isoformat(), price)
+        for bucket, (_, price) in sorted(last.items())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=260)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--flush-minutes", type=int, default=30)
+    parser.add_argument("--tick-seconds", type=int, default=60)
+    parser.add_argument("--lake", help="reuse/keep this directory instead of a temp dir")
+    args = parser.parse_args()
+
+    root = args.lake or tempfile.mkdtemp(prefix="lake-")
+    symbols = [f"SYM{i:03d}" for i in range(args.symbols)]
+    if not os.listdir(root):
+        start = time.perf_counter()
+        files = write_lake(root, args.days, symbols, args.flush_minutes, args.tick_seconds)
+        print(f"wrote {files} files to {root} in {time.perf_counter() - start:.1f}s")
+
+    # No file cap for the comparison; it is checked on its own below
+    os.environ.update(AWS_DEFAULT_REGION="us-east-1", DDB_INTRADAY_TABLE="unused", LAKE_URI=root,
+                      LAKE_MAX_FILES="1000000")
+    import handler
+    lake_logs = []
+    handler.log = lambda msg: lake_logs.append(msg) if msg.startswith("LakeReader") else None
+    handler.METRICS.emit = lambda line: None
+
+    today = datetime.now(EASTERN_TZ).date()
+    cases = [
+        {"range": "3M"},
+        {"range": "1Y"},
+        {"start": (today - timedelta(days=40)).isoformat(), "end": (today - timedelta(days=10)).isoformat()},
+    ]
+    try:
+        for qs in cases:
+            label = qs.get("range") or f"{qs['start']}..{qs['end']}"
+            start = time.perf_counter()
+            resp = handler.handler({"queryStringParameters": {"symbol": symbols[0], **qs}}, None)
+            elapsed = time.perf_counter() - start
+            body = json.loads(resp["body"])
+
+            start_dt = datetime.fromisoformat(body["start"])
+            end_dt = datetime.fromisoformat(body["end"])
+            bucket_seconds = handler.parse_history_range(body["range"], qs.get("start"), qs.get("end"))[2]
+            naive_start = time.perf_counter()
+            expected = naive(root, symbols[0], start_dt, end_dt, bucket_seconds)
+            naive_elapsed = time.perf_counter() - naive_start
+
+            assert [(p["t"], p["price"]) for p in body["points"]] == expected, f"{label}: lake points differ"
+            if bucket_seconds >= 86400:
+                # Daily points are labeled at Eastern midnight of their own trading day
+                labels = [datetime.fromisoformat(p["t"]) for p in body["points"]]
+                assert all(t.hour == t.minute == 0 and t.weekday() < 5 for t in labels), labels[:3]
+                compact = json.loads(handler.handler(
+                    {"queryStringParameters": {"symbol": symbols[0], "format": "compact", **qs}}, None
+                )["body"])
+                assert [datetime.fromtimestamp(t, EASTERN_TZ) for t in compact["t"]] == labels
+            print(f"{label:22s}: {len(body['points']):5d} points, lake {elapsed * 1000:8.1f} ms "
+                  f"vs naive full scan {naive_elapsed * 1000:8.1f} ms ({naive_elapsed / elapsed:4.1f}x)  "
+                  f"[{lake_logs[-1].split(': ', 1)[1]}]")
+
+            many = json.loads(handler.handler(
+                {"queryStringParameters": {"symbols": ",".join(symbols[:5]), **qs}}, None
+            )["body"])
+            assert many["series"][0]["points"] == body["points"]
+
+        # None of the days are compacted: a 1Y range over more files than
+        # the cap is refused up front
+        handler.get_lake().max_files = 10 * (390 // args.flush_minutes + 1)
+        resp = handler.handler({"queryStringParameters": {"symbol": symbols[0], "range": "1Y"}}, None)
+        error = json.loads(resp["body"])["error"]
+        assert resp["statusCode"] == 400 and "not compacted" in error, resp
+        print(f"1Y over {handler.get_lake().max_files} files max: 400 ({error})")
+    finally:
+        if not args.lake:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Cost and accuracy of the metrics layer (app/worker/metrics.py): time per
+observe() / incr() from one and several threads, percentile error of the
+log-bucketed histogram against exact percentiles on lognormal latencies,
+and the size of the EMF record a worker emits per interval.
+
+    python test/bench_metrics.py --samples 200000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+
+from metrics import Histogram, Metrics  # noqa: E402
+
+# Timers a worker records in one interval (see main.py / quotes.py / ...)
+WORKER_TIMERS = (
+    "fetch_tick_ms", "fetch_batch_ms", "fetch_symbol_ms", "minute_update_ms", "wal_append_ms",
+    "ddb_write_ms", "ddb_batch_ms", "parquet_encode_ms", "s3_upload_ms", "s3_queued_ms",
+    *(f"scheduler_{job}_{kind}" for job in ("fetch", "intraday", "flush", "stats", "metrics")
+      for kind in ("jitter_ms", "ms")),
+)
+WORKER_COUNTERS = (
+    "fetch_quotes", "fetch_late", "fetch_errors", "fetch_fallback", "minutes_closed",
+    "ddb_items_written", "ddb_items_failed", "ddb_throttles", "ddb_retries", "s3_rows", "s3_bytes",
+)
+
+
+def time_calls(metrics: Metrics, n: int, threads: int) -> float:
+    """
+    ns per observe() + incr() pair with `threads` threads recording at once.
+    """
+    def work():
+        for i in range(n // threads):
+            metrics.observe("fetch_symbol_ms", 1.0 + i % 50)
+            metrics.incr("fetch_quotes")
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def accuracy(samples: int) -> None:
+    rng = random.Random(5)
+    values = [rng.lognormvariate(3, 1) for _ in range(samples)]
+    hist = Histogram()
+    for v in values:
+        hist.add(v)
+    exact = statistics.quantiles(values, n=1000)
+    qs = [0.5, 0.9, 0.99, 0.999]
+    for q, approx in zip(qs, hist.quantiles(qs)):
+        true = exact[round(q * 1000) - 1]
+        print(f"  p{q * 100:g}: exact {true:8.2f} ms, histogram {approx:8.2f} ms ({(approx / true - 1) * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=200_000)
+    args = parser.parse_args()
+
+    lines = []
+    metrics = Metrics("worker", properties={"Shard": 0}, emit=lines.append)
+    for threads in (1, 8):
+        print(f"observe()+incr(), {threads} thread(s): {time_calls(metrics, args.samples, threads):.0f} ns")
+    disabled = Metrics("worker", emit=lines.append, enabled=False)
+    print(f"disabled (METRICS_ENABLED=0): {time_calls(disabled, args.samples, 1):.0f} ns")
+    metrics.record()
+
+    print(f"percentiles over {args.samples} lognormal latencies:")
+    accuracy(args.samples)
+
+    rng = random.Random(7)
+    for name in WORKER_TIMERS:
+        for _ in range(1000):
+            metrics.observe(name, rng.lognormvariate(2, 1))
+    for name in WORKER_COUNTERS:
+        metrics.incr(name, rng.randrange(1, 10_000))
+    record = metrics.flush()
+    assert metrics.flush() is None
+    size = len(lines[-1])
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert all(len(record[m["Name"]]) <= 100 for m in directive["Metrics"] if m["Unit"] == "Milliseconds")
+    assert json.loads(lines[-1])["histograms"]["ddb_write_ms"]["count"] == 1000
+    print(f"worker EMF record: {len(directive['Metrics'])} metrics, {size} bytes per interval "
+          f"({size * 60 * 24 / 1e6:.1f} MB/day at one per minute)")
+
+
+if __name__ == "__main__":
+    main()
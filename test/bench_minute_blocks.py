@@ -0,0 +1,130 @@
+"""
+Seed a moto table with DDB_MINUTE_LAYOUT=both, then compare read_prices
+reading per-minute items vs packed hourly blocks (rollups off, so every range
+reads the minute series). Also checks that a tail refresh reads only the
+newest chunk.
+
+    python test/bench_minute_blocks.py --days 30
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import boto3
+from moto import mock_aws
+
+from bench_rollups import EASTERN_TZ, ROOT, TABLE, create_table, seed
+
+
+def rounded(points: list[dict]) -> list[dict]:
+    # Blocks store prices in 1/10000 units
+    return [{k: round(v, 4) if isinstance(v, float) else v for k, v in p.items()} for p in points]
+
+
+def run(handler, range_str: str, blocks: bool):
+    handler.DDB_ROLLUP_SECONDS = []
+    handler.DDB_MINUTE_BLOCKS = blocks
+    handler.SERIES_CACHE.clear()
+
+    calls = {"query": 0, "items": 0, "bytes": 0}
+    client = handler.get_client()
+    query = client.query
+
+    def counting_query(**kwargs):
+        resp = query(**kwargs)
+        calls["query"] += 1
+        calls["items"] += len(resp.get("Items", []))
+        calls["bytes"] += sum(len(i["blk"]["B"]) if "blk" in i else 40 for i in resp.get("Items", []))
+        return resp
+
+    client.query = counting_query
+    start = time.perf_counter()
+    resp = handler.handler(
+        {"queryStringParameters": {"symbol": "AAPL", "range": range_str, "candles": "1"}}, None
+    )
+    elapsed = time.perf_counter() - start
+    client.query = query
+
+    return elapsed, calls, json.loads(resp["body"])["points"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ.update(
+        AWS_DEFAULT_REGION="us-east-1",
+        S3_BUCKET="bench-bucket",
+        STOCK_LIST="AAPL",
+        QUOTE_SOURCE="fake",
+        DDB_INTRADAY_TABLE=TABLE,
+        DDB_MINUTE_LAYOUT="both",
+        DDB_ROLLUP_SECONDS="",
+    )
+    sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+    sys.path.insert(0, os.path.join(ROOT, "app", "lambdas", "read_prices"))
+
+    with mock_aws():
+        create_table()
+        import main as worker
+        worker.log = lambda msg: None
+        worker.MINUTE_WRITER.log = worker.log
+
+        minutes = seed(worker, "AAPL", args.days)
+        print(f"seeded {minutes} minutes as items and {len(worker.MINUTE_BLOCKS)} open block chunk(s)")
+        sizes = [len(i["blk"]["B"]) for i in scan_blocks(worker)]
+        print(f"block chunks: {len(sizes)} items, largest {max(sizes)} bytes")
+
+        import handler
+        handler.log = handler.METRICS.emit = lambda msg: None
+
+        for range_str in ("1D", "1W", "1M"):
+            items_t, items_calls, items_points = run(handler, range_str, blocks=False)
+            blocks_t, blocks_calls, blocks_points = run(handler, range_str, blocks=True)
+            assert rounded(items_points) == rounded(blocks_points), f"{range_str}: block points differ"
+            print(
+                f"{range_str}: items {items_calls['items']:6d} reads (~{items_calls['bytes'] / 1024:6.1f} KiB) "
+                f"{items_t * 1000:7.1f} ms  ->  blocks {blocks_calls['items']:3d} reads "
+                f"(~{blocks_calls['bytes'] / 1024:5.1f} KiB) {blocks_t * 1000:6.1f} ms, "
+                f"{blocks_calls['query']} queries"
+            )
+
+        # A cache tail refresh (the last few minutes) reads only the chunks
+        # it overlaps, not the session since midnight
+        last_ts = int(scan_blocks(worker)[-1]["ts"]["N"]) + 30 * 60
+        client = handler.get_client()
+        query = client.query
+        chunks_read = []
+
+        def counting_query(**kwargs):
+            resp = query(**kwargs)
+            chunks_read.append(resp["Count"])
+            return resp
+
+        client.query = counting_query
+        tail = handler.query_blocks(
+            "AAPL",
+            datetime.fromtimestamp(last_ts - 5 * 60, EASTERN_TZ),
+            datetime.fromtimestamp(last_ts, EASTERN_TZ),
+        )
+        client.query = query
+        assert sum(chunks_read) == 1 and len(tail) == 6, (chunks_read, len(tail))
+        print(f"tail refresh: {len(tail)} minutes from {sum(chunks_read)} chunk")
+
+
+def scan_blocks(worker) -> list[dict]:
+    resp = boto3.client("dynamodb").query(
+        TableName=TABLE,
+        KeyConditionExpression="#s = :s",
+        ExpressionAttributeNames={"#s": "symbol"},
+        ExpressionAttributeValues={":s": {"S": worker.block_key("AAPL")}},
+    )
+    return resp["Items"]
+
+
+if __name__ == "__main__":
+    main()
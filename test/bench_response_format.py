@@ -0,0 +1,121 @@
+"""
+read_prices payload size and serialization time per range for each
+response format (points / columns / compact) and Accept-Encoding, over a
+moto table seeded through the worker.
+
+    python test/bench_response_format.py --days 30
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from moto import mock_aws
+
+from bench_rollups import ROOT, TABLE, create_table, seed
+
+EASTERN_TZ = ZoneInfo("America/New_York")
+
+
+def decode(resp) -> dict:
+    body = resp["body"]
+    if not resp.get("isBase64Encoded"):
+        return json.loads(body)
+    data = base64.b64decode(body)
+    if resp["headers"]["Content-Encoding"] == "gzip":
+        data = gzip.decompress(data)
+    else:
+        import brotli
+        data = brotli.decompress(data)
+    return json.loads(data)
+
+
+def expand(body: dict) -> list[tuple[str, float]]:
+    """
+    Rebuild (t, price) pairs from a compact body.
+    """
+    times = [
+        body["t0"] + (offset + i) * body["step"]
+        for offset, length in body["runs"]
+        for i in range(length)
+    ]
+    return [
+        (datetime.fromtimestamp(ts, EASTERN_TZ).isoformat(), price)
+        for ts, price in zip(times, body["price"])
+    ]
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--candles", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.update(
+        AWS_DEFAULT_REGION="us-east-1",
+        S3_BUCKET="bench-bucket",
+        STOCK_LIST="AAPL",
+        QUOTE_SOURCE="fake",
+        DDB_INTRADAY_TABLE=TABLE,
+    )
+    sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+    sys.path.insert(0, os.path.join(ROOT, "app", "lambdas", "read_prices"))
+
+    with mock_aws():
+        create_table()
+        import main as worker
+        worker.log = lambda msg: None
+        worker.MINUTE_WRITER.log = worker.log
+        seed(worker, "AAPL", args.days)
+
+        import handler
+        handler.log = handler.METRICS.emit = lambda msg: None
+
+        encodings = [None, "gzip"] + (["br"] if handler.brotli is not None else [])
+        for range_str in ("1D", "1W", "1M"):
+            start_dt, end_dt, bucket_seconds, series_seconds = handler.parse_range(range_str)
+            items, _, _ = handler.cached_query_series("AAPL", start_dt, end_dt, series_seconds, args.candles)
+
+            # What the handler sent before: points, default json.dumps separators
+            base_t, base = timed(lambda: json.dumps(
+                {"symbol": "AAPL", "range": range_str,
+                 "points": handler.build_points(items, bucket_seconds, args.candles)}
+            ))
+            print(f"{range_str}: {len(items)} items, baseline {len(base):7d} B {base_t * 1000:6.2f} ms")
+
+            points = json.loads(base)["points"]
+            for fmt in handler.RESPONSE_FORMATS:
+                for encoding in encodings:
+                    headers = {"accept-encoding": encoding} if encoding else {}
+
+                    def respond():
+                        series = handler.encode_series(items, bucket_seconds, args.candles, fmt)
+                        return handler.json_response(
+                            200, {"symbol": "AAPL", "range": range_str, **series}, headers
+                        )
+
+                    elapsed, resp = timed(respond)
+                    body = decode(resp)
+                    if fmt == "compact":
+                        assert expand(body) == [(p["t"], p["price"]) for p in points], f"{range_str}: compact differs"
+                    size = len(base64.b64decode(resp["body"])) if resp.get("isBase64Encoded") else len(resp["body"])
+                    print(f"    {fmt:8s} {encoding or 'identity':8s} {size:7d} B ({size / len(base):6.1%}) "
+                          f"{elapsed * 1000:6.2f} ms ({elapsed / base_t:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
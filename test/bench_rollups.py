@@ -0,0 +1,232 @@
+"""
+Seed a moto DynamoDB table through the worker's minute/rollup writer, then
+compare read_prices over the raw minute series vs the rollup series. The
+seeding restarts the worker mid-bucket with its first rollup read failing;
+the rollup candles must still match the minute ones. Two more restarts
+check the stored buckets directly: one whose reads keep failing until the
+bucket has closed, and a crash whose unacked minutes are replayed into
+buckets that already hold them.
+
+    python test/bench_rollups.py --days 30
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import boto3
+from moto import mock_aws
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+EASTERN_TZ = ZoneInfo("America/New_York")
+TABLE = "bench-intraday"
+
+
+def create_table():
+    boto3.resource("dynamodb").create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "symbol", "KeyType": "HASH"},
+            {"AttributeName": "ts", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "symbol", "AttributeType": "S"},
+            {"AttributeName": "ts", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def seed(worker, symbol: str, days: int) -> int:
+    """
+    Write `days` of regular-hours minutes, one flush per minute like the worker.
+    """
+    today = datetime.now(EASTERN_TZ).replace(hour=9, minute=30, second=0, microsecond=0)
+    closed = []
+    for d in range(days, -1, -1):
+        day_open = today - timedelta(days=d)
+        if day_open.weekday() >= 5:
+            continue
+        for m in range(390):
+            price = 100 + (m % 60) / 10
+            volume = 1_000 * (m + 1)
+            state = worker.MinuteState.start(day_open + timedelta(minutes=m), price, volume - 500)
+            state.add(price + 0.35, volume - 200)
+            state.add(price - 0.15 * (m % 3), volume)
+            closed.append((symbol, state))
+
+    # Count rollup reads, and fail the first one after the "restart" below
+    batch_get = worker.batch_get
+    reads = {"rollup": 0, "fail": 0}
+
+    def counting_batch_get(keys):
+        if any(partition.rpartition("#")[2].isdigit() for partition, _ in keys):
+            reads["rollup"] += 1
+            if reads["fail"]:
+                reads["fail"] -= 1
+                raise RuntimeError("injected DynamoDB read failure")
+        return batch_get(keys)
+
+    worker.batch_get = counting_batch_get
+    # Mid-bucket, mid-series: the worker restarts and can't read the stored
+    # buckets on its first minute
+    restart_at = len(closed) // 2 + 7
+
+    # The writer dedupes keys per flush, so submit minute by minute
+    for i, pair in enumerate(closed):
+        if i == restart_at:
+            worker.MINUTE_WRITER.join()
+            worker.ROLLUP_BARS.clear()
+            reads["fail"] = 1
+        worker.write_minutes_to_dynamodb([pair])
+    worker.MINUTE_WRITER.join()
+    worker.batch_get = batch_get
+
+    # Only the first minute and the restart (failed read, then its retry)
+    # read buckets; rollovers start from the closing minute
+    assert reads["rollup"] == (3 if worker.DDB_ROLLUP_SECONDS else 0), reads
+    return len(closed)
+
+
+def hour_states(worker, start: datetime) -> list:
+    states = []
+    for m in range(60):
+        price = 50 + (m % 7) / 10
+        state = worker.MinuteState.start(start + timedelta(minutes=m), price, 100 * m)
+        state.add(price + 0.2 * (m % 5), 100 * m + 40)
+        states.append(state)
+    return states
+
+
+def check_bucket(worker, symbol: str, states: list) -> None:
+    """
+    The stored rollup buckets of one hour of minutes equal the bars
+    merged from those minutes.
+    """
+    bars = [state.bar() for state in states]
+    for bucket_seconds in worker.DDB_ROLLUP_SECONDS:
+        for bucket_ts in sorted({b["ts"] - b["ts"] % bucket_seconds for b in bars}):
+            minutes = [b for b in bars if b["ts"] - b["ts"] % bucket_seconds == bucket_ts]
+            expected = dict(minutes[0], ts=bucket_ts)
+            for minute in minutes[1:]:
+                worker.merge_bar(expected, minute)
+            item = boto3.resource("dynamodb").Table(TABLE).get_item(
+                Key={"symbol": worker.series_key(symbol, bucket_seconds), "ts": bucket_ts}
+            )["Item"]
+            stored = {k: v for k, v in worker.item_bar(item).items() if k != "last"}
+            assert stored == expected, (bucket_seconds, bucket_ts, stored, expected)
+
+
+def check_restarts(worker) -> None:
+    start = datetime.now(EASTERN_TZ).replace(hour=10, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    batch_get = worker.batch_get
+
+    # Restart at 10:20 with rollup reads failing until 10:35: the 10:00
+    # half-hour bucket closes while held and must still keep 10:00-10:19
+    states = hour_states(worker, start)
+    failing = set(range(20, 36))
+    for m, state in enumerate(states):
+        if m == 20:
+            worker.MINUTE_WRITER.join()
+            worker.ROLLUP_BARS.clear()
+
+        def flaky_batch_get(keys, m=m):
+            if m in failing and any("#" in partition for partition, _ in keys):
+                raise RuntimeError("injected DynamoDB read failure")
+            return batch_get(keys)
+
+        worker.batch_get = flaky_batch_get
+        worker.write_minutes_to_dynamodb([("HELD", state)])
+    worker.batch_get = batch_get
+    worker.MINUTE_WRITER.join()
+    check_bucket(worker, "HELD", states)
+
+    # Crash after 10:39 was written but only 10:24 acked: 10:25-10:39 are
+    # replayed into buckets that already hold them
+    states = hour_states(worker, start)
+    for state in states[:40]:
+        worker.write_minutes_to_dynamodb([("REPLAY", state)])
+    worker.MINUTE_WRITER.join()
+    worker.ROLLUP_BARS.clear()
+    worker.REPLAYING = True
+    for state in states[25:40]:
+        worker.write_minutes_to_dynamodb([("REPLAY", state)])
+    worker.REPLAYING = False
+    for state in states[40:]:
+        worker.write_minutes_to_dynamodb([("REPLAY", state)])
+    worker.MINUTE_WRITER.join()
+    check_bucket(worker, "REPLAY", states)
+    print("restart with reads failing past a bucket close, and a replay after a crash: buckets exact")
+
+
+def run(handler, symbol: str, range_str: str, rollups: bool):
+    handler.DDB_ROLLUP_SECONDS = [1800, 3600] if rollups else []
+    handler.SERIES_CACHE.clear()
+
+    calls = {"query": 0, "items": 0}
+    client = handler.get_client()
+    query = client.query
+
+    def counting_query(**kwargs):
+        resp = query(**kwargs)
+        calls["query"] += 1
+        calls["items"] += len(resp.get("Items", []))
+        return resp
+
+    client.query = counting_query
+    start = time.perf_counter()
+    resp = handler.handler(
+        {"queryStringParameters": {"symbol": symbol, "range": range_str, "candles": "1"}}, None
+    )
+    elapsed = time.perf_counter() - start
+    client.query = query
+
+    points = json.loads(resp["body"])["points"]
+    return elapsed, calls["query"], calls["items"], points
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ.update(
+        AWS_DEFAULT_REGION="us-east-1",
+        S3_BUCKET="bench-bucket",
+        STOCK_LIST="AAPL",
+        QUOTE_SOURCE="fake",
+        DDB_INTRADAY_TABLE=TABLE,
+    )
+    sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+    sys.path.insert(0, os.path.join(ROOT, "app", "lambdas", "read_prices"))
+
+    with mock_aws():
+        create_table()
+        import main as worker
+        worker.log = lambda msg: None
+        worker.MINUTE_WRITER.log = worker.log
+
+        start = time.perf_counter()
+        minutes = seed(worker, "AAPL", args.days)
+        print(f"seeded {minutes} minutes (+ rollups) in {time.perf_counter() - start:.1f}s")
+        check_restarts(worker)
+
+        import handler
+        handler.log = handler.METRICS.emit = lambda msg: None
+
+        for range_str in ("1D", "1W", "1M"):
+            raw = run(handler, "AAPL", range_str, rollups=False)
+            rolled = run(handler, "AAPL", range_str, rollups=True)
+            assert raw[3] == rolled[3], f"{range_str}: rollup candles differ from minute candles"
+            print(
+                f"{range_str}: minutes {raw[2]:6d} items / {raw[1]:3d} queries / {raw[0] * 1000:7.1f} ms"
+                f"  ->  rollups {rolled[2]:5d} items / {rolled[1]:3d} queries / {rolled[0] * 1000:7.1f} ms"
+                f"  ({len(rolled[3])} points)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+read_prices query_dynamodb(): one serial pager over the whole range vs
+concurrent ts segments (READ_SEGMENT_ITEMS / READ_SEGMENT_MAX, off by
+default, run here with 8), with and without the ts/price projection, on a moto table seeded with a month of
+minute bars (390 per day, full worker items).
+
+moto pages at 1 MB like DynamoDB, but in-process it answers each Query by
+walking the whole partition in Python, under the caller's GIL, which would
+swamp what is measured here. So every distinct Query is answered by moto
+once, and timed runs (with moto off) replay its HTTP response after a
+simulated round trip (--rtt) plus service read time per item returned
+(--item-us): request signing, response parsing and item decoding are real,
+the service is a model.
+
+    python test/bench_segmented_query.py --days 30 --rtt 0.01 --item-us 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from moto import mock_aws
+from moto.core.botocore_stubber import MockRawResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "lambdas", "read_prices"))
+
+TABLE = "bench-intraday"
+MINUTES_PER_DAY = 390
+
+
+def seed(days: int) -> int:
+    table = boto3.resource("dynamodb").create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "symbol", "KeyType": "HASH"},
+            {"AttributeName": "ts", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "symbol", "AttributeType": "S"},
+            {"AttributeName": "ts", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    now = int(time.time()) // 60 * 60
+    with table.batch_writer() as batch:
+        for d in range(days):
+            for m in range(MINUTES_PER_DAY):
+                ts = now - d * 86400 - m * 60
+                price = Decimal(str(round(100 + (ts // 60) % 97 / 10, 2)))
+                # Same shape as the worker's bar_item()
+                batch.put_item(Item={
+                    "symbol": "AAPL", "ts": ts, "price": price, "open": price, "high": price,
+                    "low": price, "close": price, "volume": 1000 + m, "ticks": 12,
+                    "ttl": ts + 35 * 86400,
+                })
+    return now
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rtt", type=float, default=0.01, help="simulated seconds per Query call")
+    parser.add_argument("--item-us", type=float, default=5.0, help="simulated service µs per item returned")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Segmenting is off by default; size it for the segmented modes
+    os.environ.update(AWS_DEFAULT_REGION="us-east-1", DDB_INTRADAY_TABLE=TABLE, READ_SEGMENT_MAX="8")
+
+    with mock_aws():
+        now = seed(args.days)
+
+        import handler
+        handler.log = handler.METRICS.emit = lambda msg: None
+
+        lock = threading.Lock()
+        calls = {"pages": 0, "bytes": 0}
+        # Query request body -> (url, status, headers, body, items) moto returned
+        recorded = {}
+        pending = threading.local()
+
+        def replay(request, **kwargs):
+            pending.key = request.body
+            response = recorded.get(request.body)
+            if response is None:
+                return None  # moto answers and after() records it
+            url, status, headers, body, items = response
+            time.sleep(args.rtt + args.item_us * items / 1e6)
+            return AWSResponse(url, status, headers, MockRawResponse(body))
+
+        def after(http_response, **kwargs):
+            with lock:
+                recorded.setdefault(pending.key, (
+                    http_response.url, http_response.status_code,
+                    http_response.headers, http_response.content,
+                    len(json.loads(http_response.content)["Items"]),
+                ))
+                calls["pages"] += 1
+                calls["bytes"] += len(http_response.content)
+
+        events = handler.get_client().meta.events
+        events.register("before-send.dynamodb.Query", replay)
+        events.register("after-call.dynamodb.Query", after)
+
+        modes = {
+            "serial": (1, None),
+            "serial+proj": (1, handler.PRICE_ATTRIBUTES),
+            "segmented": (handler.READ_SEGMENT_MAX, None),
+            "segmented+proj": (handler.READ_SEGMENT_MAX, handler.PRICE_ATTRIBUTES),
+        }
+        ranges = {}
+        for label, days in (("1D", 1), ("1W", 7), ("1M", 30)):
+            days = min(days, args.days)
+            ranges[label] = (datetime.fromtimestamp(now - days * 86400 + 1), datetime.fromtimestamp(now))
+
+        # Every Query the timed runs make, answered by moto and recorded
+        for start_dt, end_dt in ranges.values():
+            for segment_max, attributes in modes.values():
+                handler.READ_SEGMENT_MAX = segment_max
+                handler.query_dynamodb("AAPL", start_dt, end_dt, 60, attributes)
+
+    # moto is off from here: botocore runs every before-send handler, so it
+    # would otherwise still build each response; all Queries are replayed
+    print(f"AAPL, {args.days} days x {MINUTES_PER_DAY} minutes, rtt={args.rtt * 1000:.0f} ms/query, "
+          f"{args.item_us:g} µs/item, READ_SEGMENT_ITEMS={handler.READ_SEGMENT_ITEMS}")
+    for label, (start_dt, end_dt) in ranges.items():
+        results = {}
+        for mode, (segment_max, attributes) in modes.items():
+            handler.READ_SEGMENT_MAX = segment_max
+            times = []
+            for _ in range(args.repeat):
+                calls.update(pages=0, bytes=0)
+                start = time.perf_counter()
+                items = handler.query_dynamodb("AAPL", start_dt, end_dt, 60, attributes)
+                times.append(time.perf_counter() - start)
+            results[mode] = [(int(i["ts"]), float(i["price"])) for i in items]
+            segments = len(handler.segment_bounds(int(start_dt.timestamp()), int(end_dt.timestamp()), 60))
+            print(f"{label}: {mode:15s} {statistics.median(times) * 1000:7.1f} ms  {len(items):5d} items  "
+                  f"{segments} segment(s)  {calls['pages']:2d} pages  {calls['bytes'] / 1024:7.1f} KB")
+
+        assert all(r == results["serial"] for r in results.values())
+        assert [ts for ts, _ in results["serial"]] == sorted(ts for ts, _ in results["serial"])
+
+if __name__ == "__main__":
+    main()
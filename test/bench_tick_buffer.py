@@ -0,0 +1,93 @@
+"""
+Bytes per buffered tick: list-of-dicts rows vs the columnar TickBuffer.
+
+    python test/bench_tick_buffer.py --symbols 100 --ticks 20
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "worker"))
+
+from parquet_sink import encode_parquet, rows_to_table  # noqa: E402
+from tick_buffer import TickBuffer  # noqa: E402
+
+
+EASTERN_TZ = ZoneInfo("America/New_York")
+
+
+def make_ticks(symbols: int, ticks: int):
+    start = datetime(2025, 11, 18, 10, 0, tzinfo=EASTERN_TZ)
+    for t in range(ticks):
+        ts = (start + timedelta(seconds=3 * t)).isoformat()
+        yield [
+            {
+                "symbol": f"SYM{i}",
+                "timestamp": ts,
+                "price": 100.0 + i + t * 0.01,
+                "volume": 1_000_000 + t,
+                "open": 100.0 + i,
+                "day_high": 101.0 + i,
+                "day_low": 99.0 + i,
+                "previous_close": 100.5 + i,
+                "exchange": "NMS",
+                "currency": "USD",
+                "short_name": f"Symbol {i} Inc.",
+                "source": "yfinance",
+            }
+            for i in range(symbols)
+        ]
+
+
+def measure(fill) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = fill()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, held
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+
+    n = args.symbols * args.ticks
+    metadata = {
+        f"SYM{i}": {"exchange": "NMS", "currency": "USD", "short_name": f"Symbol {i} Inc."}
+        for i in range(args.symbols)
+    }
+
+    def fill_rows():
+        rows = []
+        for tick in make_ticks(args.symbols, args.ticks):
+            # fetch_prices() builds fresh dicts (and a fresh timestamp) every tick
+            rows.extend(dict(row, timestamp=str(row["timestamp"])) for row in tick)
+        return rows
+
+    def fill_buffer():
+        buffer = TickBuffer()
+        for tick in make_ticks(args.symbols, args.ticks):
+            buffer.extend(tick)
+        return buffer
+
+    rows_bytes, rows = measure(fill_rows)
+    buffer_bytes, buffer = measure(fill_buffer)
+
+    assert rows_to_table(rows).equals(buffer.to_table(metadata))
+
+    print(f"{n} ticks ({args.symbols} symbols x {args.ticks} polls)")
+    print(f"list[dict]:  {rows_bytes / n:8.1f} bytes/tick")
+    print(f"TickBuffer:  {buffer_bytes / n:8.1f} bytes/tick")
+    print(f"parquet:     {len(encode_parquet(buffer.to_table(metadata))) / n:8.1f} bytes/tick")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Measure the tick WAL: append cost per poll next to the in-memory buffer,
+then "crash" after a full minute of polls for --symbols symbols and time
+the replay that restores the tick buffer and the open minutes. Also checks
+that a torn last record is dropped, that segments are deleted once
+their ticks are in S3 and their minutes in DynamoDB, and that a flush
+whose S3 upload fails is retried and only then acked, that a failed
+DynamoDB minute flush keeps its ticks in the log even after a later
+flush succeeds, until its retry lands, and that a flush DynamoDB rejects
+is dead-lettered instead of holding the log back.
+
+    python test/bench_wal.py --symbols 1000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import boto3
+import pyarrow as pa
+from botocore.exceptions import ClientError
+import pyarrow.parquet as pq
+from moto import mock_aws
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+EASTERN_TZ = ZoneInfo("America/New_York")
+BUCKET = "bench-bucket"
+TABLE = "bench-intraday"
+POLL_SECONDS = 3
+
+
+def create_storage():
+    boto3.client("s3").create_bucket(Bucket=BUCKET)
+    boto3.resource("dynamodb").create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "symbol", "KeyType": "HASH"},
+            {"AttributeName": "ts", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "symbol", "AttributeType": "S"},
+            {"AttributeName": "ts", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def make_polls(worker, symbols: list[str], minute_start: datetime, polls: int) -> list[list[dict]]:
+    source = worker.FakeQuoteSource(seed=1)
+    result = []
+    for i in range(polls):
+        ts = (minute_start + timedelta(seconds=i * POLL_SECONDS)).isoformat()
+        quotes = source.get_quotes(symbols)
+        result.append([worker.build_row(s, ts, quotes[s]) for s in symbols])
+    return result
+
+
+def segments(wal_dir: str) -> list[str]:
+    return sorted(n for n in os.listdir(wal_dir) if n.endswith((".wal", ".up")))
+
+
+def replay_rows(wal_dir: str) -> tuple[list[dict], list[dict]]:
+    from wal import TickWal
+    buffer_rows, minute_rows = [], []
+    TickWal(wal_dir).replay(buffer_rows.extend, minute_rows.extend)
+    return buffer_rows, minute_rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+
+    wal_dir = tempfile.mkdtemp(prefix="wal-")
+    symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+    os.environ.update(
+        AWS_DEFAULT_REGION="us-east-1",
+        S3_BUCKET=BUCKET,
+        STOCK_LIST=",".join(symbols),
+        QUOTE_SOURCE="fake",
+        DDB_INTRADAY_TABLE=TABLE,
+        DDB_ROLLUP_SECONDS="",
+        WAL_DIR=wal_dir,
+        WAL_FSYNC="0" if args.no_fsync else "1",
+    )
+    sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+
+    try:
+        with mock_aws():
+            create_storage()
+            import main as worker
+            from wal import TickWal, row_epoch
+            worker.log = lambda msg: None
+            worker.MINUTE_WRITER.log = worker.UPLOADER.log = worker.log
+
+            minute = worker.floor_to_minute(datetime.now(EASTERN_TZ)) - timedelta(minutes=5)
+            polls = make_polls(worker, symbols, minute, 60 // POLL_SECONDS + 1)
+            full_minute, next_poll = polls[:-1], polls[-1]
+
+            # A full minute of polls, as fetch_job does it
+            append_ms, extend_ms = [], []
+            buffer = worker.TickBuffer()
+            for rows in full_minute:
+                start = time.perf_counter()
+                worker.WAL.append(rows)
+                append_ms.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                buffer.extend(rows)
+                worker.update_intraday_cache(rows)
+                extend_ms.append((time.perf_counter() - start) * 1000)
+            ticks = sum(len(rows) for rows in full_minute)
+            print(f"{len(full_minute)} polls x {args.symbols} symbols ({ticks} ticks), "
+                  f"fsync={'off' if args.no_fsync else 'on'}: WAL append median "
+                  f"{statistics.median(append_ms):.2f} ms / max {max(append_ms):.2f} ms per poll, "
+                  f"buffer + minute state {statistics.median(extend_ms):.2f} ms per poll; "
+                  f"log {worker.WAL.size() / 1e6:.1f} MB")
+
+            # Crash mid-append: half a record at the end of the segment
+            worker.WAL.file.write(b"\x40\x00\x00\x00\x00\x00\x00\x00{\"torn")
+            worker.WAL.file.close()
+
+            # Restart: a new WAL over the same directory, empty process state
+            worker.WAL = TickWal(wal_dir, log=worker.log)
+            worker.MINUTE_STATE.clear()
+            logs = []
+            worker.log = logs.append
+            buffer = worker.TickBuffer()
+            start = time.perf_counter()
+            worker.replay_wal(buffer)
+            replay_seconds = time.perf_counter() - start
+            worker.log = lambda msg: None
+            assert len(buffer) == ticks, (len(buffer), ticks)
+            assert len(worker.MINUTE_STATE) == args.symbols
+            assert all(s.ticks == len(full_minute) for s in worker.MINUTE_STATE.values())
+            print(f"replay after crash: {replay_seconds * 1000:.1f} ms total ({logs[-1].split(': ', 1)[1]})")
+
+            # Flush to S3, then the next poll closes the minute in DynamoDB
+            worker.WAL.append(next_poll)
+            buffer.extend(next_poll)
+            worker.flush_buffer(buffer)
+            worker.update_intraday_cache(next_poll)
+            worker.UPLOADER.join()
+            worker.MINUTE_WRITER.join()
+            left = segments(wal_dir)
+            # Segment 2 is uploaded too but holds ticks of the still open minute
+            assert left == ["0000000002.up"], left
+
+            item = boto3.resource("dynamodb").Table(TABLE).get_item(
+                Key={"symbol": symbols[0], "ts": int(minute.timestamp())}
+            )["Item"]
+            assert int(item["ticks"]) == len(full_minute)
+            print(f"after S3 upload + minute write: segment 1 deleted, left {left}; "
+                  f"rebuilt minute stored with all {int(item['ticks'])} ticks")
+
+            # What a second crash now would replay: the open minute's poll
+            buffer_rows, minute_rows = replay_rows(wal_dir)
+            assert not buffer_rows and len(minute_rows) == args.symbols
+            print(f"second replay: {len(buffer_rows)} buffered / {len(minute_rows)} minute ticks")
+
+            # S3 outage: the first upload of the next flush fails, the retry
+            # lands all its rows and only then acks its segment
+            put_object = worker.UPLOADER.s3.put_object
+            failures = [1]
+
+            def flaky_put_object(**kwargs):
+                if failures[0]:
+                    failures[0] -= 1
+                    raise RuntimeError("injected S3 failure")
+                return put_object(**kwargs)
+
+            worker.UPLOADER.s3.put_object = flaky_put_object
+            worker.UPLOADER.base_backoff_seconds = 0.05
+            poll = make_polls(worker, symbols, minute + timedelta(minutes=1), 2)[1]
+            worker.WAL.append(poll)
+            buffer = worker.TickBuffer()
+            buffer.extend(poll)
+            worker.flush_buffer(buffer)
+            worker.UPLOADER.join()
+            worker.UPLOADER.s3.put_object = put_object
+            assert not failures[0] and not worker.UPLOADER.failed
+            key = worker.UPLOADER.last_stats.key
+            body = boto3.client("s3").get_object(Bucket=BUCKET, Key=key)["Body"].read()
+            assert pq.read_table(pa.BufferReader(body)).num_rows == len(poll)
+            left = segments(wal_dir)
+            assert left == ["0000000002.up", "0000000003.up"], left
+            print(f"S3 failure: flush retried, {len(poll)} rows uploaded, segment acked; left {left}")
+
+            # DynamoDB failure: closing minute+1 fails, closing minute+2
+            # succeeds; minute+1's ticks must survive until its retry lands
+            batch_write_item = worker.MINUTE_WRITER.dynamodb.batch_write_item
+            failures = [1]
+
+            def flaky_batch_write_item(**kwargs):
+                if failures[0]:
+                    failures[0] -= 1
+                    raise ClientError({"Error": {"Code": "InternalServerError"}}, "BatchWriteItem")
+                return batch_write_item(**kwargs)
+
+            worker.MINUTE_WRITER.dynamodb.batch_write_item = flaky_batch_write_item
+            worker.MINUTE_WRITER.retry_base_seconds = 3600
+            for m in (2, 3):
+                poll = make_polls(worker, symbols, minute + timedelta(minutes=m), 1)[0]
+                worker.WAL.append(poll)
+                worker.update_intraday_cache(poll)
+                worker.MINUTE_WRITER.queue.join()
+            assert not failures[0] and worker.MINUTE_WRITER.last_stats.failed == 0
+            assert len(worker.MINUTE_WRITER.failed) == 1
+
+            lost = (minute + timedelta(minutes=1)).timestamp()
+            assert worker.WAL.minutes_floor <= lost, worker.WAL.minutes_floor
+            _, minute_rows = replay_rows(wal_dir)
+            kept = [r for r in minute_rows if lost <= row_epoch(r) < lost + 60]
+            assert len(kept) == 2 * args.symbols, len(kept)
+            print(f"DynamoDB failure: later flush succeeded, failed minute's {len(kept)} ticks "
+                  f"still replayed; left {segments(wal_dir)}")
+
+            # The held flush is retried (join() retries it right away); once
+            # it lands the watermark moves past minute+2
+            worker.MINUTE_WRITER.join()
+            assert not worker.MINUTE_WRITER.failed
+            assert worker.WAL.minutes_floor > lost + 60, worker.WAL.minutes_floor
+            item = boto3.resource("dynamodb").Table(TABLE).get_item(
+                Key={"symbol": symbols[0], "ts": int(lost)}
+            )["Item"]
+            _, minute_rows = replay_rows(wal_dir)
+            assert all(row_epoch(r) >= worker.WAL.minutes_floor for r in minute_rows)
+            print(f"DynamoDB retry: minute+1 written with {int(item['ticks'])} ticks, "
+                  f"floor advanced; left {segments(wal_dir)}")
+
+            # A flush DynamoDB rejects is dead-lettered next to the log and
+            # acked, so it doesn't hold the watermark either
+            failures = [1]
+
+            def rejecting_batch_write_item(**kwargs):
+                if failures[0]:
+                    failures[0] -= 1
+                    raise ClientError({"Error": {"Code": "ValidationException"}}, "BatchWriteItem")
+                return batch_write_item(**kwargs)
+
+            worker.MINUTE_WRITER.dynamodb.batch_write_item = rejecting_batch_write_item
+            poll = make_polls(worker, symbols, minute + timedelta(minutes=4), 1)[0]
+            worker.WAL.append(poll)
+            worker.update_intraday_cache(poll)
+            worker.MINUTE_WRITER.join()
+            worker.MINUTE_WRITER.dynamodb.batch_write_item = batch_write_item
+            assert not failures[0] and not worker.MINUTE_WRITER.failed
+            assert worker.WAL.minutes_floor >= (minute + timedelta(minutes=4)).timestamp()
+            with open(os.path.join(wal_dir, "minutes.dead")) as f:
+                dead = [json.loads(line) for line in f]
+            assert len(dead) == 1 and len(dead[0]["items"]) == min(25, args.symbols), dead[0]["reason"]
+            print(f"DynamoDB rejection: {len(dead[0]['items'])} items dead-lettered, floor advanced")
+    finally:
+        shutil.rmtree(wal_dir)
+
+
+if __name__ == "__main__":
+    main()
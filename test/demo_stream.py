@@ -0,0 +1,221 @@
+"""
+Run the worker in streaming mode against a local WebSocket server that
+replays recorded Yahoo pricing messages, with moto standing in for S3 and
+DynamoDB. Midway the server drops the connection and refuses new ones for
+a while. Checks that minute bars get streamed quotes well under a second
+after they are published, that the worker polls while the stream is down
+and goes back to streaming once it reconnects, and that no minute is lost.
+
+    python test/demo_stream.py --seconds 90 --outage 30:45
+
+The recording is a JSONL file of {"t": seconds, "message": base64}, as
+Yahoo sends them; without --recording one is built from the captured tick
+files in test/. Replayed messages are re-stamped with the send time.
+"""
+import argparse
+import base64
+import glob
+import io
+import json
+import logging
+import os
+import signal
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import boto3
+import pyarrow.parquet as pq
+from moto import mock_aws
+from websockets.sync.server import serve
+from yfinance.pricing_pb2 import PricingData
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+BUCKET = "demo-bucket"
+TABLE = "demo-intraday"
+PORT = 8765
+
+
+def recording_from_captures() -> list[dict]:
+    """
+    One message per captured tick, at its offset from the first tick.
+    """
+    rows = []
+    for path in glob.glob(os.path.join(os.path.dirname(__file__), "stocks-*.parquet")):
+        table = pq.read_table(path)
+        if "volume" in table.column_names:
+            rows.extend(table.to_pylist())
+    rows.sort(key=lambda r: r["timestamp"])
+    start = datetime.fromisoformat(rows[0]["timestamp"]).timestamp()
+
+    recording = []
+    for r in rows:
+        msg = PricingData(
+            id=r["symbol"], price=r["price"], day_volume=r["volume"], open_price=r["open"],
+            day_high=r["day_high"], day_low=r["day_low"], previous_close=r["previous_close"],
+            exchange=r["exchange"] or "", currency=r["currency"] or "",
+        )
+        ts = datetime.fromisoformat(r["timestamp"]).timestamp()
+        recording.append({"t": ts - start, "message": base64.b64encode(msg.SerializeToString()).decode()})
+    return recording
+
+
+class ReplayServer:
+    """
+    Sends the recording to every subscribed client in a loop, re-stamping
+    `time`; while `down_until` is in the future it closes connections.
+    """
+
+    def __init__(self, recording: list[dict], port: int):
+        self.recording = recording
+        self.down_until = 0.0
+        self.sent = 0
+        self.connections = 0
+        self.server = serve(self.handle, "127.0.0.1", port)
+        self.active = set()
+
+    def handle(self, ws) -> None:
+        if time.time() < self.down_until:
+            ws.close()
+            return
+        self.connections += 1
+        self.active.add(ws)
+        try:
+            json.loads(ws.recv())  # {"subscribe": [...]}
+            period = self.recording[-1]["t"] + 1.0
+            start = time.time()
+            loop = 0
+            while True:
+                for rec in self.recording:
+                    delay = start + loop * period + rec["t"] - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    msg = PricingData.FromString(base64.b64decode(rec["message"]))
+                    # Nudge prices each loop so the replay isn't one repeated second
+                    msg.price = msg.price * (1 + 0.0001 * (loop % 7 - 3))
+                    msg.day_volume = msg.day_volume + loop * 100
+                    msg.time = int(time.time() * 1000)
+                    ws.send(json.dumps({"type": "pricing", "message": base64.b64encode(msg.SerializeToString()).decode()}))
+                    self.sent += 1
+                loop += 1
+        except Exception:
+            pass
+        finally:
+            self.active.discard(ws)
+
+    def outage(self, seconds: float) -> None:
+        self.down_until = time.time() + seconds
+        for ws in list(self.active):
+            ws.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=90)
+    parser.add_argument("--outage", default="30:45", help="start:end seconds into the run")
+    parser.add_argument("--recording", help="JSONL of {t, message}")
+    args = parser.parse_args()
+    outage_start, outage_end = (float(x) for x in args.outage.split(":"))
+
+    if args.recording:
+        with open(args.recording) as f:
+            recording = [json.loads(line) for line in f]
+    else:
+        recording = recording_from_captures()
+    symbols = sorted({PricingData.FromString(base64.b64decode(r["message"])).id for r in recording})
+
+    logging.getLogger("websockets").setLevel(logging.CRITICAL)
+    server = ReplayServer(recording, PORT)
+    threading.Thread(target=server.server.serve_forever, daemon=True).start()
+
+    os.environ.update(
+        AWS_DEFAULT_REGION="us-east-1",
+        AWS_ACCESS_KEY_ID="demo",
+        AWS_SECRET_ACCESS_KEY="demo",
+        S3_BUCKET=BUCKET,
+        DDB_INTRADAY_TABLE=TABLE,
+        DDB_ROLLUP_SECONDS="",
+        STOCK_LIST=",".join(symbols),
+        QUOTE_SOURCE="fake",
+        QUOTE_STREAM="1",
+        STREAM_URL=f"ws://127.0.0.1:{PORT}",
+    )
+    sys.path.insert(0, os.path.join(ROOT, "app", "worker"))
+
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        boto3.resource("dynamodb").create_table(
+            TableName=TABLE,
+            KeySchema=[
+                {"AttributeName": "symbol", "KeyType": "HASH"},
+                {"AttributeName": "ts", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "symbol", "AttributeType": "S"},
+                {"AttributeName": "ts", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        import main as worker
+
+        lines = []
+        worker.log = worker.STREAM.log = lines.append
+
+        # Age of each streamed quote when it reaches the minute bars
+        freshness = []
+        update = worker.update_intraday_cache
+
+        def timed_update(rows):
+            now = time.time()
+            freshness.extend(
+                now - datetime.fromisoformat(r["timestamp"]).timestamp()
+                for r in rows if r["source"] == "yfinance-ws"
+            )
+            update(rows)
+
+        worker.update_intraday_cache = timed_update
+
+        def control():
+            start = time.time()
+            time.sleep(outage_start)
+            server.outage(outage_end - outage_start)
+            print(f"{time.time() - start:5.1f}s: server dropped the stream")
+            time.sleep(args.seconds - outage_start)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        threading.Thread(target=control, daemon=True).start()
+        print(f"replaying {len(recording)} recorded messages for {len(symbols)} symbols, "
+              f"{args.seconds:.0f}s run, outage {outage_start:.0f}-{outage_end:.0f}s")
+        worker.main()
+        server.server.shutdown()
+
+        s3 = boto3.client("s3")
+        sources = Counter()
+        for obj in s3.list_objects_v2(Bucket=BUCKET, Prefix="year=").get("Contents", []):
+            body = s3.get_object(Bucket=BUCKET, Key=obj["Key"])["Body"].read()
+            sources.update(pq.read_table(io.BytesIO(body), columns=["source"])["source"].to_pylist())
+
+        minutes = defaultdict(set)
+        for item in boto3.resource("dynamodb").Table(TABLE).scan()["Items"]:
+            minutes[item["symbol"]].add(int(item["ts"]))
+        for symbol in symbols:
+            ts = sorted(minutes[symbol])
+            assert ts and all(b - a == 60 for a, b in zip(ts, ts[1:])), f"{symbol}: minutes {ts}"
+
+    stream = worker.STREAM
+    assert stream.connects >= 2 and stream.disconnects >= 1, stream.summary()
+    assert sources["fake"] > 0 and sources["yfinance-ws"] > 0, sources
+    fallback = [line for line in lines if "polling until reconnect" in line]
+    print(f"stream: {stream.summary()}; server sent {server.sent} messages over {server.connections} connections")
+    print(f"fell back to polling {len(fallback)} time(s) while down; ticks in S3 by source: {dict(sources)}")
+    print(f"streamed quote -> minute bar: median {statistics.median(freshness) * 1000:.0f} ms, "
+          f"p99 {statistics.quantiles(freshness, n=100)[-1] * 1000:.0f} ms, "
+          f"max {max(freshness) * 1000:.0f} ms ({len(freshness)} quotes)")
+    print(f"minute items: {sum(len(m) for m in minutes.values())} for {len(symbols)} symbols, no gaps")
+
+
+if __name__ == "__main__":
+    main()